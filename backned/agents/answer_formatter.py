@@ -0,0 +1,142 @@
+# agents/answer_formatter.py
+
+from datetime import date, datetime
+from decimal import Decimal
+from sqlglot import exp
+from typing import Any, Dict, Optional, Sequence, Set
+import re
+import sqlglot
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+NO_DATA_ANSWER = "No data found."
+CHART_HINTS = ("bar", "line", "pie", "table", "none")
+
+# Column names that hold rupee amounts, used when the SQL behind a result is not available
+_MONEY_COLUMN = re.compile(r"amount|invest|total|sum|value|price|aum", re.IGNORECASE)
+_COUNT_COLUMN = re.compile(r"count|number|num_|qty|quantity|transactions|clients", re.IGNORECASE)
+# Source columns holding rupee amounts; expressions over them are money unless they COUNT
+_MONEY_SOURCE = re.compile(r"amount|invest|price|value|aum", re.IGNORECASE)
+# Placeholders an answer template may use besides the first row's column names
+_TEMPLATE_FIELD = re.compile(r"{(\w+)}")
+# Longest list rendered inline in an answer
+MAX_LISTED_ROWS = 20
+
+
+def money_columns(sql_query: Optional[str]) -> Optional[Set[str]]:
+    """Output columns of a query that hold rupee amounts, or None when the SQL can't tell.
+
+    A projection is money when it aggregates or passes through an amount column
+    (SUM(amount_invested), amount_invested); COUNTs never are, whatever their alias.
+    """
+    if not sql_query:
+        return None
+    try:
+        statement = sqlglot.parse_one(sql_query, read="mysql")
+    except Exception:
+        return None
+    projections = getattr(statement, "selects", None)
+    if not projections:
+        return None
+
+    money = set()
+    for projection in projections:
+        node = projection.unalias()
+        if isinstance(node, exp.Star):
+            return None
+        if isinstance(node, exp.Column):
+            # Pass-through columns may come from a subquery alias; judge them by name
+            if _is_money_name(node.name):
+                money.add(projection.alias_or_name)
+            continue
+        if isinstance(node, exp.Count):
+            continue
+        if any(_MONEY_SOURCE.search(column.name) for column in node.find_all(exp.Column)):
+            money.add(projection.alias_or_name)
+    return money
+
+
+def _is_money_name(column: str) -> bool:
+    return not _COUNT_COLUMN.search(column) and bool(_MONEY_COLUMN.search(column))
+
+
+def format_value(column: str, value: Any, money: Optional[Set[str]] = None) -> str:
+    """Render one cell: rupees for amount columns, thousands separators, ISO dates"""
+    if value is None:
+        return "N/A"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (int, float, Decimal)):
+        # Amounts are DECIMAL, so a Python int is a COUNT (or an id), never rupees
+        is_money = column in money if money is not None else _is_money_name(column)
+        if is_money and not isinstance(value, int):
+            return f"₹{value:,.2f}"
+        if isinstance(value, int) or (isinstance(value, Decimal) and value == value.to_integral_value()):
+            return f"{int(value):,}"
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def format_rows(rows: Sequence[Dict[str, Any]], money: Optional[Set[str]] = None) -> str:
+    """Deterministic answer for a result set: a value, a record, or a numbered list"""
+    if not rows:
+        return NO_DATA_ANSWER
+
+    columns = list(rows[0].keys())
+    if len(rows) == 1 and len(columns) == 1:
+        return format_value(columns[0], rows[0][columns[0]], money)
+    if len(rows) == 1:
+        return ", ".join(f"{column}: {format_value(column, rows[0][column], money)}" for column in columns)
+
+    lines = []
+    for index, row in enumerate(rows[:MAX_LISTED_ROWS], 1):
+        label, *rest = [format_value(column, row[column], money) for column in columns]
+        lines.append(f"{index}. {label}" + (f" - {', '.join(rest)}" if rest else ""))
+    if len(rows) > MAX_LISTED_ROWS:
+        lines.append(f"... and {len(rows) - MAX_LISTED_ROWS} more")
+    return "\n".join(lines)
+
+
+def render_answer(template: Optional[str], rows: Sequence[Dict[str, Any]], sql_query: Optional[str] = None) -> str:
+    """Fill an LLM-provided answer template from the rows, falling back to format_rows.
+
+    Templates may use {value} (first cell), {count} (row count), {rows} (the
+    formatted list) and the first row's column names. The SQL that produced the
+    rows decides which columns are rupee amounts.
+    """
+    if not rows:
+        return NO_DATA_ANSWER
+    money = money_columns(sql_query)
+    if not template:
+        return format_rows(rows, money)
+
+    first = rows[0]
+    fields: Dict[str, str] = {column: format_value(column, value, money) for column, value in first.items()}
+    first_column = next(iter(first))
+    fields["value"] = format_value(first_column, first[first_column], money)
+    fields["count"] = f"{len(rows):,}"
+    fields["rows"] = format_rows(rows, money)
+
+    # A template written for one row cannot describe several unless it lists {rows}
+    if len(rows) > 1 and "{rows}" not in template:
+        return fields["rows"]
+
+    missing = [name for name in _TEMPLATE_FIELD.findall(template) if name not in fields]
+    if missing:
+        logger.info(f"Answer template uses unknown fields {missing}; using the default formatter")
+        return format_rows(rows, money)
+    try:
+        return template.format_map(fields)
+    except (ValueError, IndexError, KeyError) as e:
+        logger.info(f"Unusable answer template ({str(e)}); using the default formatter")
+        return format_rows(rows, money)
+
+
+def normalize_chart_hint(hint: Any) -> str:
+    """Clamp the LLM's chart suggestion to the kinds the frontend can draw"""
+    hint = str(hint or "none").strip().lower()
+    return hint if hint in CHART_HINTS else "table"
@@ -0,0 +1,214 @@
+# agents/fast_path.py
+
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+import logging
+
+from agents import mongo_agent, sql_agent
+from agents.federated import answer_federated, client_filter
+from agents.mongo_agent import ANSWER_FIELDS, ANSWER_PROJECTION, MONGO_RESULT_LIMIT, format_clients
+from core.executor import run_blocking
+from core.result_set import ResultSet
+from db.rollups import rollup_store
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Precompiled SQL for router intents; {where} is filled from bound slot filters only
+FAST_PATH_SQL = {
+    "transaction_count": "SELECT COUNT(*) AS transactions FROM transactions {where}",
+    "total_invested": "SELECT SUM(amount_invested) AS total_invested FROM transactions {where}",
+    "investor_count": "SELECT COUNT(DISTINCT client_id) AS clients FROM transactions {where}",
+    "top_clients": (
+        "SELECT client_id, SUM(amount_invested) AS total FROM transactions {where} "
+        "GROUP BY client_id ORDER BY total DESC LIMIT :limit"
+    ),
+    "top_stocks": (
+        "SELECT stock_name, SUM(amount_invested) AS total FROM transactions {where} "
+        "GROUP BY stock_name ORDER BY total DESC LIMIT :limit"
+    ),
+    "monthly_invested": (
+        "SELECT DATE_FORMAT(date_, '%Y-%m') AS month, COUNT(*) AS transactions, SUM(amount_invested) AS total "
+        "FROM transactions {where} GROUP BY month ORDER BY month"
+    ),
+}
+
+# Rollup grouping that answers each SQL intent without touching the table
+ROLLUP_GROUPS = {
+    "transaction_count": (),
+    "total_invested": (),
+    "investor_count": ("client_id",),
+    "top_clients": ("client_id",),
+    "top_stocks": ("stock_name",),
+    "monthly_invested": ("month",),
+}
+
+SQL_SLOT_COLUMNS = ("client_id", "stock_name", "rm_name")
+
+# Single-value intents that a batch can answer together in one scan of transactions
+SCALAR_INTENTS = {
+    "transaction_count": ("transactions", "SUM(CASE WHEN {cond} THEN 1 ELSE 0 END)"),
+    "total_invested": ("total_invested", "SUM(CASE WHEN {cond} THEN amount_invested END)"),
+    "investor_count": ("clients", "COUNT(DISTINCT CASE WHEN {cond} THEN client_id END)"),
+}
+
+def _answer(answer: str, result: Optional[Dict[str, Any]], chart_hint: str) -> Dict[str, Any]:
+    return {"answer": answer, "result": result, "chart_hint": chart_hint, "ok": True}
+
+
+def _describe(slots: Dict[str, Any]) -> str:
+    """Human readable suffix describing the filters applied"""
+    parts = []
+    if "client_id" in slots:
+        parts.append(f"client {slots['client_id']}")
+    if "stock_name" in slots:
+        parts.append(slots["stock_name"])
+    if "rm_name" in slots:
+        parts.append(f"RM {slots['rm_name']}")
+    return f" for {', '.join(parts)}" if parts else ""
+
+
+def _rollup_rows(intent: str, slots: Dict[str, Any]) -> Optional[Tuple[List[str], List[tuple]]]:
+    """Rows an intent's SQL would return, computed from the in-memory rollups; None when they are stale"""
+    filters = {column: slots[column] for column in SQL_SLOT_COLUMNS if column in slots}
+    groups = rollup_store.aggregate(filters, ROLLUP_GROUPS[intent])
+    if groups is None:
+        return None
+
+    if intent == "transaction_count":
+        return ["transactions"], [(groups[()][0],)]
+    if intent == "total_invested":
+        count, total = groups[()]
+        return ["total_invested"], [(total if count else None,)]
+    if intent == "investor_count":
+        return ["clients"], [(sum(1 for key in groups if key[0] is not None),)]
+    if intent == "monthly_invested":
+        return ["month", "transactions", "total"], sorted((key[0], count, total) for key, (count, total) in groups.items())
+
+    top = sorted(((key[0], total) for key, (_, total) in groups.items()), key=lambda row: row[1], reverse=True)
+    return [ROLLUP_GROUPS[intent][0], "total"], top[:slots.get("limit", 5)]
+
+
+def _run_sql(intent: str, slots: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Execute a precompiled SQL intent with bound parameters, from the rollups when they are fresh"""
+    answered = _rollup_rows(intent, slots)
+    if answered is not None:
+        columns, rows = answered
+    else:
+        agent = sql_agent.get_sql_agent()
+        if not agent.db:
+            return None
+
+        params = {column: slots[column] for column in SQL_SLOT_COLUMNS if column in slots}
+        where = " AND ".join(f"{column} = :{column}" for column in params)
+        query = FAST_PATH_SQL[intent].format(where=f"WHERE {where}" if where else "")
+        params["limit"] = slots.get("limit", 5)
+
+        with agent.db._engine.connect() as conn:
+            result = conn.execute(text(query), params)
+            columns = list(result.keys())
+            rows = result.fetchall()
+    result_set = ResultSet.from_rows([dict(zip(columns, row)) for row in rows], columns=columns).to_json()
+
+    suffix = _describe(slots)
+    if intent in SCALAR_INTENTS:
+        return _scalar_answer(intent, slots, rows[0][0])
+    if not rows:
+        return _answer("No data found.", result_set, "none")
+
+    if intent == "monthly_invested":
+        lines = [f"{month}: ₹{total or 0:,.2f} ({count:,} transactions)" for month, count, total in rows]
+        return _answer(f"Monthly investment{suffix}:\n" + "\n".join(lines), result_set, "line")
+
+    label = "clients" if intent == "top_clients" else "stocks"
+    lines = [f"{i}. {name}: ₹{total:,.2f}" for i, (name, total) in enumerate(rows, 1)]
+    return _answer(f"Top {len(rows)} {label} by amount invested{suffix}:\n" + "\n".join(lines), result_set, "bar")
+
+
+def _scalar_answer(intent: str, slots: Dict[str, Any], value: Any) -> Dict[str, Any]:
+    """Answer for a single-value SQL intent"""
+    column = SCALAR_INTENTS[intent][0]
+    value = value or 0
+    result_set = ResultSet.from_rows([{column: value}]).to_json()
+    suffix = _describe(slots)
+    if intent == "transaction_count":
+        return _answer(f"Total transactions{suffix}: {int(value):,}", result_set, "none")
+    if intent == "investor_count":
+        return _answer(f"Clients with transactions{suffix}: {int(value):,}", result_set, "none")
+    return _answer(f"Total amount invested{suffix}: ₹{value:,.2f}", result_set, "none")
+
+
+def _run_sql_scalars(routes: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Answer several scalar intents with one scan using conditional aggregates"""
+    agent = sql_agent.get_sql_agent()
+    if not agent.db:
+        return {}
+
+    keys = list(routes)
+    params: Dict[str, Any] = {}
+    selects = []
+    for index, key in enumerate(keys):
+        slots = routes[key]["slots"]
+        conditions = []
+        for column in SQL_SLOT_COLUMNS:
+            if column in slots:
+                params[f"p{index}_{column}"] = slots[column]
+                conditions.append(f"{column} = :p{index}_{column}")
+        aggregate = SCALAR_INTENTS[routes[key]["intent"]][1]
+        selects.append(f"{aggregate.format(cond=' AND '.join(conditions) or '1 = 1')} AS v{index}")
+
+    with agent.db._engine.connect() as conn:
+        row = conn.execute(text(f"SELECT {', '.join(selects)} FROM transactions"), params).fetchone()
+
+    return {
+        key: _scalar_answer(routes[key]["intent"], routes[key]["slots"], row[index])
+        for index, key in enumerate(keys)
+    }
+
+
+async def _run_mongo(intent: str, slots: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Execute a precompiled MongoDB intent"""
+    if not mongo_agent.MONGODB_AVAILABLE:
+        return None
+
+    collection = mongo_agent.get_async_mongo_collection()
+    query = client_filter(slots)
+
+    if intent == "client_count":
+        count = await collection.count_documents(query)
+        result_set = ResultSet.from_rows([{"clients": count}]).to_json()
+        return _answer(f"There are {count} client(s) matching your query.", result_set, "none")
+
+    cursor = collection.find(query, projection=ANSWER_PROJECTION, limit=MONGO_RESULT_LIMIT)
+    results = [doc async for doc in cursor]
+    result_set = ResultSet.from_rows(results, columns=list(ANSWER_FIELDS)).to_json()
+    return _answer(format_clients(results, limit=MONGO_RESULT_LIMIT), result_set, "table")
+
+
+async def answer_fast_path_batch(routes: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Answer every scalar SQL intent in a batch with one shared scan; other routes are left out"""
+    scalars = {key: route for key, route in routes.items()
+               if route["fast_path"] and route["store"] == "sql" and route["intent"] in SCALAR_INTENTS}
+    # Fresh rollups answer each of them in memory already
+    if len(scalars) < 2 or rollup_store.is_fresh():
+        return {}
+    try:
+        return await run_blocking(_run_sql_scalars, scalars)
+    except Exception as e:
+        logger.error(f"Merged fast path failed for {len(scalars)} questions: {str(e)}")
+        return {}
+
+
+async def answer_fast_path(route: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Answer a routed question from precompiled queries as {"answer", "result", "chart_hint"}; None means fall back"""
+    intent, slots = route["intent"], route["slots"]
+    try:
+        if route["store"] == "federated":
+            return await answer_federated(route)
+        if intent in FAST_PATH_SQL:
+            return await run_blocking(_run_sql, intent, slots)
+        if intent in ("client_count", "filter_clients"):
+            return await _run_mongo(intent, slots)
+    except Exception as e:
+        logger.error(f"Fast path failed for {intent}: {str(e)}")
+    return None
@@ -0,0 +1,235 @@
+# agents/federated.py
+
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from sqlalchemy import text
+from typing import Any, Dict, Iterator, List, Optional
+import os
+import time
+import asyncio
+import logging
+
+from agents import mongo_agent, sql_agent
+from agents.mongo_agent import MONGO_BATCH_SIZE
+from core.executor import run_blocking
+from core.result_set import ResultSet
+from db.rollups import rollup_store
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Most transactions listed for a client_transactions question
+FEDERATED_ROW_LIMIT = int(os.getenv("FEDERATED_ROW_LIMIT", "50"))
+# Rows pulled per round trip while streaming the transactions side
+FEDERATED_FETCH_ROWS = int(os.getenv("FEDERATED_FETCH_ROWS", "1000"))
+# Longest the transactions side waits for the clients (seconds), holding its MySQL connection
+FEDERATED_CLIENTS_TIMEOUT = float(os.getenv("FEDERATED_CLIENTS_TIMEOUT", "30"))
+
+CLIENT_PROJECTION = {"_id": 0, "client_id": 1, "name": 1}
+SQL_SLOT_COLUMNS = ("client_id", "stock_name", "rm_name")
+
+# Transactions side per intent, pre-aggregated per client where the answer allows it
+FEDERATED_SQL = {
+    "per_client": (
+        "SELECT client_id, COUNT(*) AS transactions, SUM(amount_invested) AS total "
+        "FROM transactions {where} GROUP BY client_id"
+    ),
+    "per_client_stock": (
+        "SELECT client_id, stock_name, COUNT(*) AS transactions, SUM(amount_invested) AS total "
+        "FROM transactions {where} GROUP BY client_id, stock_name"
+    ),
+    "rows": (
+        "SELECT transaction_id, client_id, stock_name, amount_invested, date_, rm_name "
+        "FROM transactions {where} ORDER BY date_ DESC"
+    ),
+}
+SQL_SHAPES = {
+    "transaction_count": "per_client",
+    "total_invested": "per_client",
+    "top_clients": "per_client",
+    "client_count": "per_client",
+    "top_stocks": "per_client_stock",
+    "client_transactions": "rows",
+}
+
+
+def client_filter(slots: Dict[str, Any]) -> Dict[str, Any]:
+    """MongoDB filter for the client attributes in the router slots"""
+    query: Dict[str, Any] = {}
+    if "risk" in slots:
+        query["risk_appetite"] = slots["risk"]
+    if "preference" in slots:
+        query["investment_preferences"] = slots["preference"]
+    if "rm_id" in slots:
+        query["rm_id"] = slots["rm_id"]
+    if "client_id" in slots:
+        query["client_id"] = slots["client_id"]
+    return query
+
+
+def _describe(slots: Dict[str, Any]) -> str:
+    """'High risk clients preferring Bonds of RM 101' style label for the client side"""
+    label = f"{slots['risk']} risk clients" if "risk" in slots else "clients"
+    if "preference" in slots:
+        label += f" preferring {slots['preference']}"
+    if "rm_id" in slots:
+        label += f" of RM {slots['rm_id']}"
+    if "stock_name" in slots:
+        label += f" in {slots['stock_name']}"
+    if "rm_name" in slots:
+        label += f" (RM {slots['rm_name']})"
+    return label
+
+
+def _answer(answer: str, rows: List[Dict[str, Any]], columns: List[str], chart_hint: str) -> Dict[str, Any]:
+    result = ResultSet.from_rows(rows, columns=columns).to_json()
+    return {"answer": answer, "result": result, "chart_hint": chart_hint, "ok": True}
+
+
+async def _load_clients(slots: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Build side: matching clients keyed by client_id (the smaller input)"""
+    collection = mongo_agent.get_async_mongo_collection()
+    cursor = collection.find(client_filter(slots), projection=CLIENT_PROJECTION, batch_size=MONGO_BATCH_SIZE)
+    return {doc["client_id"]: doc async for doc in cursor if doc.get("client_id")}
+
+
+def _sql_filters(slots: Dict[str, Any]) -> Dict[str, Any]:
+    return {column: slots[column] for column in SQL_SLOT_COLUMNS if column in slots}
+
+
+def _rollup_rows(shape: str, filters: Dict[str, Any]) -> Optional[List[tuple]]:
+    """Pre-aggregated transactions side from the in-memory rollups, when they are fresh"""
+    if shape == "rows":
+        return None
+    group_by = ("client_id",) if shape == "per_client" else ("client_id", "stock_name")
+    groups = rollup_store.aggregate(filters, group_by)
+    if groups is None:
+        return None
+    return [(*key, count, total) for key, (count, total) in groups.items()]
+
+
+def _probe(rows: Iterator[tuple], clients: Dict[str, Dict[str, Any]], key: int, limit: Optional[int] = None) -> List[tuple]:
+    """Keep the streamed rows whose client_id (at position key) is in the build side"""
+    matched = []
+    for row in rows:
+        if row[key] in clients:
+            matched.append(row)
+            if limit is not None and len(matched) >= limit:
+                break
+    return matched
+
+
+def _stream_transactions(shape: str, filters: Dict[str, Any], clients_future: "Future[Dict[str, Any]]") -> List[tuple]:
+    """Probe side: start the MySQL query at once, then stream it through the client hash table"""
+    key = 1 if shape == "rows" else 0
+    rows = _rollup_rows(shape, filters)
+    if rows is not None:
+        return _probe(iter(rows), clients_future.result(FEDERATED_CLIENTS_TIMEOUT), key)
+
+    agent = sql_agent.get_sql_agent()
+    where = " AND ".join(f"{column} = :{column}" for column in filters)
+    query = FEDERATED_SQL[shape].format(where=f"WHERE {where}" if where else "")
+    limit = FEDERATED_ROW_LIMIT if shape == "rows" else None
+
+    with agent.db._engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(text(query), filters)
+        # MySQL works on the query while MongoDB is still returning clients
+        clients = clients_future.result(FEDERATED_CLIENTS_TIMEOUT)
+
+        def batches():
+            while True:
+                batch = result.fetchmany(FEDERATED_FETCH_ROWS)
+                if not batch:
+                    return
+                yield from (tuple(row) for row in batch)
+
+        return _probe(batches(), clients, key, limit)
+
+
+def _format(intent: str, slots: Dict[str, Any], clients: Dict[str, Dict[str, Any]], rows: List[tuple]) -> Dict[str, Any]:
+    """Final aggregation over the joined rows"""
+    label = _describe(slots)
+    limit = slots.get("limit", 5)
+
+    if intent == "client_transactions":
+        records = [{"transaction_id": row[0], "client_id": row[1], "name": clients[row[1]].get("name"),
+                    "stock_name": row[2], "amount_invested": row[3], "date_": row[4]} for row in rows]
+        columns = ["transaction_id", "client_id", "name", "stock_name", "amount_invested", "date_"]
+        if not records:
+            return _answer(f"No transactions found for {label}.", records, columns, "none")
+        lines = [f"{i}. {r['transaction_id']}: {r['name'] or r['client_id']} ({r['client_id']}) - "
+                 f"{r['stock_name']} ₹{float(r['amount_invested'] or 0):,.2f} on {r['date_']}"
+                 for i, r in enumerate(records, 1)]
+        more = f" (first {FEDERATED_ROW_LIMIT})" if len(records) >= FEDERATED_ROW_LIMIT else ""
+        return _answer(f"Transactions of {label}{more}:\n" + "\n".join(lines), records, columns, "table")
+
+    if intent == "top_stocks":
+        by_stock: Dict[str, float] = {}
+        for _, stock_name, _, total in rows:
+            by_stock[stock_name] = by_stock.get(stock_name, 0.0) + float(total or 0)
+        top = sorted(by_stock.items(), key=lambda item: item[1], reverse=True)[:limit]
+        records = [{"stock_name": stock, "total": total} for stock, total in top]
+        if not records:
+            return _answer(f"No transactions found for {label}.", records, ["stock_name", "total"], "none")
+        lines = [f"{i}. {stock}: ₹{total:,.2f}" for i, (stock, total) in enumerate(top, 1)]
+        return _answer(f"Top {len(top)} stocks among {label}:\n" + "\n".join(lines),
+                       records, ["stock_name", "total"], "bar")
+
+    if intent == "top_clients":
+        top = sorted(rows, key=lambda row: float(row[2] or 0), reverse=True)[:limit]
+        records = [{"client_id": client_id, "name": clients[client_id].get("name"), "total": float(total or 0)}
+                   for client_id, _, total in top]
+        if not records:
+            return _answer(f"No transactions found for {label}.", records, ["client_id", "name", "total"], "none")
+        lines = [f"{i}. {r['name'] or r['client_id']} ({r['client_id']}): ₹{r['total']:,.2f}"
+                 for i, r in enumerate(records, 1)]
+        return _answer(f"Top {len(records)} {label} by amount invested:\n" + "\n".join(lines),
+                       records, ["client_id", "name", "total"], "bar")
+
+    transactions = sum(int(row[1]) for row in rows)
+    total = sum(float(row[2] or 0) for row in rows)
+    if intent == "client_count":
+        records = [{"clients": len(rows)}]
+        return _answer(f"{len(rows)} {label} have transactions.", records, ["clients"], "none")
+    if intent == "transaction_count":
+        records = [{"transactions": transactions, "clients": len(rows)}]
+        return _answer(f"Total transactions for {label}: {transactions:,} across {len(rows)} client(s)",
+                       records, ["transactions", "clients"], "none")
+    records = [{"total_invested": total, "clients": len(rows)}]
+    return _answer(f"Total amount invested by {label}: ₹{total:,.2f} across {len(rows)} client(s)",
+                   records, ["total_invested", "clients"], "none")
+
+
+async def answer_federated(route: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Answer a question spanning clients (MongoDB) and transactions (MySQL); None means fall back"""
+    intent, slots = route["intent"], route["slots"]
+    if intent not in SQL_SHAPES or not mongo_agent.MONGODB_AVAILABLE:
+        return None
+    agent = await run_blocking(sql_agent.get_sql_agent)
+    if not agent.db:
+        return None
+
+    start = time.time()
+    shape = SQL_SHAPES[intent]
+    clients_future: "Future[Dict[str, Any]]" = Future()
+    transactions = asyncio.ensure_future(run_blocking(_stream_transactions, shape, _sql_filters(slots), clients_future))
+    try:
+        clients = await _load_clients(slots)
+        clients_future.set_result(clients)
+    except Exception as e:
+        # Unblock the transactions side before giving up
+        clients_future.set_exception(e)
+        await asyncio.gather(transactions, return_exceptions=True)
+        raise
+    finally:
+        # Cancelled (client disconnected, shutdown): the worker thread must not wait on MongoDB forever
+        if not clients_future.done():
+            clients_future.cancel()
+            transactions.add_done_callback(lambda task: task.cancelled() or task.exception())
+    rows = await transactions
+
+    logger.info(f"Federated {intent}: {len(clients)} clients x {len(rows)} joined rows "
+                f"in {(time.time() - start) * 1000:.1f}ms")
+    return _format(intent, slots, clients, rows)
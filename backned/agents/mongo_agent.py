@@ -1,57 +1,167 @@
 # agents/mongo_agent.py
 
-from db.mongo_conn import get_mongo_collection
+from db.mongo_conn import get_mongo_collection, get_async_mongo_collection
+from db.schema_snapshot import load_mongo_snapshot, render_mongo_schema
+from agents.mongo_pipeline import validate_pipeline, validate_filter, check_plan, acheck_plan, format_aggregate
+from core.executor import run_blocking
+from core.result_set import ResultSet
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
+from typing import Optional
 import os
+import re
 import ast
 import json
 import time
 
 load_dotenv()
 
-# Try to get MongoDB collection, but don't fail if it's not available
-try:
-    if os.getenv("MONGODB_URI"):
-        collection = get_mongo_collection()
-        MONGODB_AVAILABLE = True
-    else:
-        print("⚠️ MongoDB URI not provided - using mock data")
-        collection = None
-        MONGODB_AVAILABLE = False
-except Exception as e:
-    print(f"⚠️ MongoDB not available: {str(e)}")
-    collection = None
-    MONGODB_AVAILABLE = False
-
-# Setup LLM
-llm = ChatOpenAI(
-    model="gpt-3.5-turbo",
-    temperature=0,
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# MongoDB is optional; the shared client connects lazily on the first query
+MONGODB_AVAILABLE = bool(os.getenv("MONGODB_URI"))
+if not MONGODB_AVAILABLE:
+    print("⚠️ MongoDB URI not provided - using mock data")
+
+# Setup LLM (built on first use: importing LangChain's OpenAI client is the slowest part of startup)
+_llm = None
+
+def get_llm():
+    """Return the shared query-generation LLM, creating it on first use"""
+    global _llm
+    if _llm is None:
+        from core.llm_client import GatewayChatOpenAI
+        _llm = GatewayChatOpenAI(
+            model="gpt-3.5-turbo",
+            temperature=0,
+            api_key=os.getenv("OPENAI_API_KEY")
+        )
+    return _llm
 
 template = """
 You are a MongoDB query generator.
-The MongoDB collection is called `clients`. Each document looks like this:
-{{
-  "client_id": "C001",
-  "name": "Virat Kohli",
-  "risk_appetite": "High",
-  "investment_preferences": ["Stocks", "Real Estate"],
-  "rm_id": 101
-}}
-
-Convert the user's question into a MongoDB query **filter** in JSON format.
-ONLY return the valid JSON object with the query. No explanation, no markdown formatting.
+Collection schema (field type, {{allowed values}}, [min..max]):
+{schema}
+
+Convert the user's question into a MongoDB query in JSON format:
+- To list clients, return a **filter** object, e.g. {{"risk_appetite": "High"}}
+- To count, sum, average or rank per group, return an **aggregation pipeline** (a JSON array) using only
+  $match, $group, $sort, $limit and $project stages, e.g.
+  [{{"$group": {{"_id": "$risk_appetite", "clients": {{"$sum": 1}}}}}}, {{"$sort": {{"clients": -1}}}}]
+ONLY return the valid JSON. No explanation, no markdown formatting.
 
 User Question:
 "{question}"
 """
 
+# Used until a sampled snapshot is available (e.g. in mock mode)
+DEFAULT_SCHEMA = (
+    "clients: client_id str, name str, risk_appetite str {High|Medium|Low}, "
+    "investment_preferences [str] {Stocks|Bonds|Real Estate|Crypto|Mutual Funds|Fixed Deposits}, rm_id int"
+)
+
+_schema_text = None
+
+def get_mongo_schema_text() -> str:
+    """Compact collection description for the prompt, sampled once and persisted"""
+    global _schema_text
+    if _schema_text is None:
+        _schema_text = DEFAULT_SCHEMA
+        if MONGODB_AVAILABLE:
+            try:
+                _schema_text = render_mongo_schema(load_mongo_snapshot(get_mongo_collection()))
+            except Exception as e:
+                print(f"⚠️ Could not sample MongoDB schema: {str(e)}")
+    return _schema_text
+
 prompt = PromptTemplate.from_template(template)
 
+def _parse_filter(llm_response: str, question: str):
+    """Turn the LLM output into a filter dict or pipeline list, falling back to keyword rules"""
+    # Clean the response - remove any markdown formatting
+    llm_response = llm_response.replace('```python', '').replace('```json', '').replace('```', '').strip()
+
+    try:
+        # Try to parse as JSON first (for MongoDB queries with operators)
+        return json.loads(llm_response), None
+    except json.JSONDecodeError:
+        try:
+            # Fallback to ast.literal_eval for simple Python dicts
+            return ast.literal_eval(llm_response), None
+        except Exception as parse_error:
+            # Try to create a simple query based on keywords
+            query_dict = create_simple_query(question)
+            if not query_dict:
+                return None, f"Could not parse LLM output: {llm_response}. Error: {str(parse_error)}"
+            return query_dict, None
+
+# Fields the answer formatter prints; nothing else is fetched from the server
+ANSWER_FIELDS = ("name", "client_id", "risk_appetite")
+ANSWER_PROJECTION = {"_id": 0, **{field: 1 for field in ANSWER_FIELDS}}
+
+# Listings stop after this many clients; counts are only computed when asked for
+MONGO_RESULT_LIMIT = int(os.getenv("MONGO_RESULT_LIMIT", "50"))
+MONGO_BATCH_SIZE = int(os.getenv("MONGO_BATCH_SIZE", "100"))
+# A collection seen non-empty is not re-checked for this many seconds
+MONGO_EMPTY_CHECK_TTL = float(os.getenv("MONGO_EMPTY_CHECK_TTL", "60"))
+
+_COUNT_QUESTION = re.compile(r"\b(how many|count|number of|total number)\b", re.IGNORECASE)
+_nonempty_seen_at = 0.0
+
+def wants_count(question: str) -> bool:
+    """True when the question asks how many clients match"""
+    return bool(_COUNT_QUESTION.search(question))
+
+def _known_nonempty() -> bool:
+    return time.time() - _nonempty_seen_at < MONGO_EMPTY_CHECK_TTL
+
+def _record_count(count: int) -> bool:
+    """Remember a non-empty collection; returns True when it is empty"""
+    global _nonempty_seen_at
+    if count:
+        _nonempty_seen_at = time.time()
+    return count == 0
+
+def collection_is_empty(collection) -> bool:
+    """Emptiness check from collection metadata, cached while the collection has data"""
+    if _known_nonempty():
+        return False
+    return _record_count(collection.estimated_document_count())
+
+async def acollection_is_empty(async_collection) -> bool:
+    """Async variant of collection_is_empty"""
+    if _known_nonempty():
+        return False
+    return _record_count(await async_collection.estimated_document_count())
+
+def format_clients(results, total: Optional[int] = None, limit: Optional[int] = None) -> str:
+    """Render matched client documents as the answer string"""
+    if not results:
+        return "No matching clients found for your query."
+
+    # Format the results nicely
+    client_info = []
+    for doc in results:
+        client_info.append(f"{doc.get('name', 'Unknown')} (ID: {doc.get('client_id', 'N/A')}, Risk: {doc.get('risk_appetite', 'N/A')})")
+
+    if total is not None and total > len(results):
+        return f"Found {total} client(s), showing the first {len(results)}: {', '.join(client_info)}"
+    if total is None and limit and len(results) >= limit:
+        return f"Showing the first {len(results)} matching client(s): {', '.join(client_info)}"
+    return f"Found {len(results)} client(s): {', '.join(client_info)}"
+
+def _response(answer: str, question: str, start: float, result: Optional[dict] = None, chart_hint: Optional[str] = None,
+              ok: bool = False):
+    """Build the standard response dict returned to main.py; ok marks an answer that is safe to cache"""
+    return {
+        "answer": answer,
+        "query": question,
+        "processing_time": f"{time.time() - start:.2f}s",
+        "result": result,
+        "chart_hint": chart_hint,
+        "ok": ok,
+    }
+
+EMPTY_COLLECTION_ANSWER = "No client data found in the database. Please add some sample client data first."
+
 def query_mongo(question: str):
     start = time.time()
 
@@ -60,66 +170,147 @@ def query_mongo(question: str):
         if not MONGODB_AVAILABLE:
             return get_mock_response(question, start)
         
+        collection = get_mongo_collection()
+
         # First, let's check if we have any data in the collection
-        total_clients = collection.count_documents({})
-        if total_clients == 0:
-            return {
-                "answer": "No client data found in the database. Please add some sample client data first.",
-                "query": question,
-                "processing_time": f"{time.time() - start:.2f}s"
-            }
+        if collection_is_empty(collection):
+            return _response(EMPTY_COLLECTION_ANSWER, question, start)
 
         # Format the prompt with user question
-        final_prompt = prompt.format(question=question)
+        final_prompt = prompt.format(question=question, schema=get_mongo_schema_text())
 
         # Get response from OpenAI LLM
-        llm_response = llm.invoke(final_prompt).content.strip()
-        
-        # Clean the response - remove any markdown formatting
-        llm_response = llm_response.replace('```python', '').replace('```', '').strip()
+        llm_response = get_llm().invoke(final_prompt).content.strip()
+        query_dict, error = _parse_filter(llm_response, question)
+        if error:
+            return _response(error, question, start)
 
-        try:
-            # Try to parse as JSON first (for MongoDB queries with operators)
-            query_dict = json.loads(llm_response)
-        except json.JSONDecodeError:
-            try:
-                # Fallback to ast.literal_eval for simple Python dicts
-                query_dict = ast.literal_eval(llm_response)
-            except Exception as parse_error:
-                # Try to create a simple query based on keywords
-                query_dict = create_simple_query(question)
-                if not query_dict:
-                    return {
-                        "answer": f"Could not parse LLM output: {llm_response}. Error: {str(parse_error)}",
-                        "query": question,
-                        "processing_time": f"{time.time() - start:.2f}s"
-                    }
-
-        # Query MongoDB
-        results = list(collection.find(query_dict))
-        
-        if not results:
-            answer = "No matching clients found for your query."
-        else:
-            # Format the results nicely
-            client_info = []
-            for doc in results:
-                client_info.append(f"{doc.get('name', 'Unknown')} (ID: {doc.get('client_id', 'N/A')}, Risk: {doc.get('risk_appetite', 'N/A')})")
-            
-            answer = f"Found {len(results)} client(s): {', '.join(client_info)}"
-
-        return {
-            "answer": answer,
-            "query": question,
-            "processing_time": f"{time.time() - start:.2f}s"
-        }
+        # Grouped questions run as a validated aggregation pipeline on the server
+        if isinstance(query_dict, list):
+            pipeline, error = validate_pipeline(query_dict)
+            if not error:
+                _, error = check_plan(collection, pipeline)
+            if error:
+                return _response(error, question, start)
+            rows = list(collection.aggregate(pipeline, batchSize=MONGO_BATCH_SIZE))
+            return _response(format_aggregate(rows), question, start, ResultSet.from_rows(rows).to_json(), "bar", ok=True)
+
+        query_dict, error = validate_filter(query_dict)
+        if error:
+            return _response(error, question, start)
+
+        # Query MongoDB, fetching only the printed fields and at most MONGO_RESULT_LIMIT documents
+        cursor = collection.find(query_dict, projection=ANSWER_PROJECTION, limit=MONGO_RESULT_LIMIT, batch_size=MONGO_BATCH_SIZE)
+        results = [doc for doc in cursor]
+        total = collection.count_documents(query_dict) if wants_count(question) else None
+        result = ResultSet.from_rows(results, columns=list(ANSWER_FIELDS)).to_json()
+        return _response(format_clients(results, total, MONGO_RESULT_LIMIT), question, start, result, "table", ok=True)
+
+    except Exception as e:
+        return _response(f"Error querying MongoDB: {str(e)}", question, start)
+
+async def astream_mongo(question: str):
+    """Yield progress events (filter, rows, token) while answering a question"""
+    try:
+        if not MONGODB_AVAILABLE:
+            yield {"event": "token", "data": get_mock_response(question, time.time())["answer"]}
+            return
+
+        async_collection = get_async_mongo_collection()
+
+        if await acollection_is_empty(async_collection):
+            yield {"event": "token", "data": EMPTY_COLLECTION_ANSWER}
+            return
+
+        schema = await run_blocking(get_mongo_schema_text)
+        llm_response = (await get_llm().ainvoke(prompt.format(question=question, schema=schema))).content.strip()
+        query_dict, error = _parse_filter(llm_response, question)
+        if error:
+            yield {"event": "token", "data": error}
+            return
+
+        if isinstance(query_dict, list):
+            pipeline, error = validate_pipeline(query_dict)
+            if not error:
+                plan, error = await acheck_plan(async_collection, pipeline)
+            if error:
+                yield {"event": "token", "data": error}
+                return
+            yield {"event": "pipeline", "data": pipeline}
+            yield {"event": "plan", "data": plan}
+            rows = [doc async for doc in async_collection.aggregate(pipeline, batchSize=MONGO_BATCH_SIZE)]
+            yield {"event": "rows", "data": len(rows)}
+            yield {"event": "result", "data": ResultSet.from_rows(rows).to_json()}
+            yield {"event": "chart", "data": "bar"}
+            yield {"event": "token", "data": format_aggregate(rows)}
+            yield {"event": "ok", "data": True}
+            return
+
+        query_dict, error = validate_filter(query_dict)
+        if error:
+            yield {"event": "token", "data": error}
+            return
+        yield {"event": "filter", "data": query_dict}
+
+        cursor = async_collection.find(query_dict, projection=ANSWER_PROJECTION, limit=MONGO_RESULT_LIMIT, batch_size=MONGO_BATCH_SIZE)
+        results = []
+        async for doc in cursor:
+            results.append(doc)
+        total = await async_collection.count_documents(query_dict) if wants_count(question) else None
+        yield {"event": "rows", "data": total if total is not None else len(results)}
+        yield {"event": "result", "data": ResultSet.from_rows(results, columns=list(ANSWER_FIELDS)).to_json()}
+        yield {"event": "chart", "data": "table"}
+        yield {"event": "token", "data": format_clients(results, total, MONGO_RESULT_LIMIT)}
+        yield {"event": "ok", "data": True}
 
     except Exception as e:
-        return {
-            "answer": f"Error querying MongoDB: {str(e)}",
-            "query": question,
-            "processing_time": f"{time.time() - start:.2f}s"
-        }
+        yield {"event": "token", "data": f"Error querying MongoDB: {str(e)}"}
+
+async def aquery_mongo(question: str):
+    """Async variant of query_mongo using motor and llm.ainvoke"""
+    start = time.time()
+    tokens, result, chart_hint, ok = [], None, None, False
+    async for event in astream_mongo(question):
+        if event["event"] == "token":
+            tokens.append(event["data"])
+        elif event["event"] == "result":
+            result = event["data"]
+        elif event["event"] == "chart":
+            chart_hint = event["data"]
+        elif event["event"] == "ok":
+            ok = True
+    return _response("".join(tokens), question, start, result, chart_hint, ok)
+
+# None until the indexes have been looked at; the created_at index comes from setup_mongodb.js
+_created_at_indexed = None
+
+async def _has_created_at_index(async_collection) -> bool:
+    """Whether clients.created_at is indexed, read once per process (no DDL on the request path)"""
+    global _created_at_indexed
+    if _created_at_indexed is None:
+        try:
+            indexes = await async_collection.index_information()
+            _created_at_indexed = any(index["key"][0][0] == "created_at" for index in indexes.values())
+        except Exception as e:
+            # Looked at again on the next probe
+            print(f"⚠️ Could not list the clients indexes: {str(e)}")
+            return False
+        if not _created_at_indexed:
+            print("⚠️ clients.created_at is not indexed (see setup_mongodb.js); watermark uses the document count only")
+    return _created_at_indexed
+
+async def aget_clients_watermark():
+    """Return the clients document count (from metadata) and newest created_at (from the index), or None in mock mode"""
+    if not MONGODB_AVAILABLE:
+        return None
+
+    async_collection = get_async_mongo_collection()
+    count = await async_collection.estimated_document_count()
+    if not await _has_created_at_index(async_collection):
+        # Without the index the sort would scan and sort the whole collection every few seconds
+        return (count, None)
+    latest = await async_collection.find_one({}, projection={"_id": 0, "created_at": 1}, sort=[("created_at", -1)])
+    return (count, str(latest.get("created_at")) if latest else None)
 
 def get_mock_response(question: str, start_time: float):
     """Provide mock responses when MongoDB is not available"""
@@ -0,0 +1,194 @@
+# agents/mongo_pipeline.py
+
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import json
+import threading
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Stages the LLM may use; anything that writes, joins or runs code is rejected
+ALLOWED_STAGES = {"$match", "$group", "$sort", "$limit", "$project"}
+# Operators that run JavaScript or reach outside the collection, at any depth
+FORBIDDEN_OPERATORS = {"$where", "$function", "$accumulator", "$lookup", "$graphLookup",
+                       "$unionWith", "$out", "$merge"}
+MAX_PIPELINE_STAGES = int(os.getenv("MONGO_MAX_PIPELINE_STAGES", "6"))
+MONGO_PIPELINE_LIMIT = int(os.getenv("MONGO_PIPELINE_LIMIT", "100"))
+# Reject pipelines whose $match could use an index but the planner chose a collection scan
+MONGO_REQUIRE_INDEX = os.getenv("MONGO_REQUIRE_INDEX", "0") == "1"
+
+# Indexes created by setup_mongodb.js
+INDEXED_FIELDS = {"client_id", "risk_appetite", "investment_preferences", "rm_id", "total_investment"}
+
+_plan_lock = threading.Lock()
+_checked_plans: Dict[str, Dict[str, Any]] = {}
+
+
+def _walk_keys(value: Any):
+    """Yield every dict key in a nested pipeline expression"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield key
+            yield from _walk_keys(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _walk_keys(item)
+
+
+def validate_pipeline(pipeline: Any) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+    """Check stages against the allow-list and cap the output; returns (pipeline, error)"""
+    if not isinstance(pipeline, list) or not pipeline:
+        return None, "Aggregation pipeline must be a non-empty list of stages"
+    if len(pipeline) > MAX_PIPELINE_STAGES:
+        return None, f"Aggregation pipeline has {len(pipeline)} stages (max {MAX_PIPELINE_STAGES})"
+
+    for stage in pipeline:
+        if not isinstance(stage, dict) or len(stage) != 1:
+            return None, f"Invalid pipeline stage: {stage}"
+        name = next(iter(stage))
+        if name not in ALLOWED_STAGES:
+            return None, f"Pipeline stage {name} is not allowed"
+        forbidden = FORBIDDEN_OPERATORS.intersection(_walk_keys(stage[name]))
+        if forbidden:
+            return None, f"Pipeline operator {sorted(forbidden)[0]} is not allowed"
+
+    # Always bound what comes back to the server-side limit
+    validated = list(pipeline)
+    last = validated[-1]
+    if "$limit" in last:
+        if not isinstance(last["$limit"], int) or last["$limit"] <= 0:
+            return None, f"Invalid $limit: {last['$limit']}"
+        validated[-1] = {"$limit": min(last["$limit"], MONGO_PIPELINE_LIMIT)}
+    else:
+        validated.append({"$limit": MONGO_PIPELINE_LIMIT})
+    return validated, None
+
+
+def validate_filter(query: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Check a find() filter for the same forbidden operators as pipelines; returns (filter, error)"""
+    if not isinstance(query, dict):
+        return None, f"MongoDB filter must be a JSON object, got {type(query).__name__}"
+    forbidden = FORBIDDEN_OPERATORS.intersection(_walk_keys(query))
+    if forbidden:
+        return None, f"Filter operator {sorted(forbidden)[0]} is not allowed"
+    return query, None
+
+
+def _match_fields(pipeline: List[Dict[str, Any]]) -> List[str]:
+    """Top-level fields filtered by a leading $match (the only part that can use an index)"""
+    if not pipeline or "$match" not in pipeline[0]:
+        return []
+    return sorted(key for key in pipeline[0]["$match"] if not key.startswith("$"))
+
+
+def _plan_shape(pipeline: List[Dict[str, Any]]) -> str:
+    """Plans depend on stage order and filtered fields, not on the literal values"""
+    return json.dumps([next(iter(stage)) for stage in pipeline] + _match_fields(pipeline))
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Collect the scan stages and index names from explain output"""
+    stages, indexes = set(), set()
+
+    def visit(node: Any):
+        if isinstance(node, dict):
+            if node.get("stage") in ("IXSCAN", "COLLSCAN", "COUNT_SCAN", "DISTINCT_SCAN", "EOF"):
+                stages.add(node["stage"])
+                if node.get("indexName"):
+                    indexes.add(node["indexName"])
+            for key, item in node.items():
+                # Rejected plans say nothing about what will run
+                if key != "rejectedPlans":
+                    visit(item)
+        elif isinstance(node, list):
+            for item in node:
+                visit(item)
+
+    visit(explain)
+    return {"stages": sorted(stages), "indexes": sorted(indexes), "collscan": "COLLSCAN" in stages}
+
+
+def _explain_command(collection, pipeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"explain": {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+            "verbosity": "queryPlanner"}
+
+
+def _review_plan(pipeline: List[Dict[str, Any]], summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach the index verdict for a plan and remember it for the pipeline shape"""
+    indexable = INDEXED_FIELDS.intersection(_match_fields(pipeline))
+    summary["indexable_fields"] = sorted(indexable)
+    summary["index_missing"] = bool(indexable) and summary["collscan"]
+    if summary["index_missing"]:
+        logger.warning(f"Pipeline filters on indexed fields {sorted(indexable)} but runs a COLLSCAN; "
+                       f"check the indexes from setup_mongodb.js")
+    with _plan_lock:
+        _checked_plans[_plan_shape(pipeline)] = summary
+    return summary
+
+
+def _cached_plan(pipeline: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    with _plan_lock:
+        return _checked_plans.get(_plan_shape(pipeline))
+
+
+def _plan_error(summary: Dict[str, Any]) -> Optional[str]:
+    if MONGO_REQUIRE_INDEX and summary["index_missing"]:
+        return f"Pipeline rejected: no index used for {', '.join(summary['indexable_fields'])}"
+    return None
+
+
+def check_plan(collection, pipeline: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Explain a pipeline once per shape; returns (plan summary, error)"""
+    summary = _cached_plan(pipeline)
+    if summary is None:
+        try:
+            explain = collection.database.command(_explain_command(collection, pipeline))
+            summary = _review_plan(pipeline, summarize_explain(explain))
+        except Exception as e:
+            logger.error(f"Could not explain pipeline: {str(e)}")
+            return {"stages": [], "indexes": [], "collscan": None}, None
+    return summary, _plan_error(summary)
+
+
+async def acheck_plan(async_collection, pipeline: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Async variant of check_plan for motor collections"""
+    summary = _cached_plan(pipeline)
+    if summary is None:
+        try:
+            explain = await async_collection.database.command(_explain_command(async_collection, pipeline))
+            summary = _review_plan(pipeline, summarize_explain(explain))
+        except Exception as e:
+            logger.error(f"Could not explain pipeline: {str(e)}")
+            return {"stages": [], "indexes": [], "collscan": None}, None
+    return summary, _plan_error(summary)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int) and not isinstance(value, bool):
+        return f"{value:,}"
+    if isinstance(value, list):
+        return ", ".join(_format_value(item) for item in value)
+    return str(value)
+
+
+def format_aggregate(rows: List[Dict[str, Any]]) -> str:
+    """Render aggregation output, one line per group"""
+    if not rows:
+        return "No matching clients found for your query."
+
+    lines = []
+    for row in rows:
+        label = row.get("_id")
+        if isinstance(label, dict):
+            label = ", ".join(f"{key}={_format_value(value)}" for key, value in label.items())
+        label = "All" if label is None else _format_value(label)
+        fields = [f"{key}: {_format_value(value)}" for key, value in row.items() if key != "_id"]
+        lines.append(f"{label} - {', '.join(fields)}" if fields else label)
+    return f"Results ({len(rows)} group(s)):\n" + "\n".join(lines)
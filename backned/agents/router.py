@@ -0,0 +1,294 @@
+# agents/router.py
+
+from dotenv import load_dotenv
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import os
+import re
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Fast-path answers are only used when at least this share of the question is understood
+ROUTER_CONFIDENCE = float(os.getenv("ROUTER_CONFIDENCE", "0.8"))
+
+# Phrase -> feature. Multi-word phrases are matched as token sequences by the automaton.
+KEYWORDS = {
+    # operations
+    "how many": "op_count", "count": "op_count", "number of": "op_count",
+    "total": "op_total", "sum": "op_total", "overall": "op_total",
+    "top": "op_top", "highest": "op_top", "largest": "op_top", "biggest": "op_top", "most": "op_top",
+    # entities
+    "client": "ent_client", "clients": "ent_client", "investor": "ent_client", "investors": "ent_client",
+    "customer": "ent_client", "customers": "ent_client",
+    "transaction": "ent_transaction", "transactions": "ent_transaction", "trade": "ent_transaction", "trades": "ent_transaction",
+    "stock": "ent_stock", "stocks": "ent_stock", "share": "ent_stock", "shares": "ent_stock",
+    # measures
+    "amount": "measure_amount", "invested": "measure_amount", "investment": "measure_amount",
+    "investments": "measure_amount", "value": "measure_amount", "money": "measure_amount",
+    # client attributes (MongoDB)
+    "risk": "attr_risk", "risk appetite": "attr_risk", "appetite": "attr_risk",
+    "prefer": "attr_preference", "prefers": "attr_preference", "preference": "attr_preference",
+    "preferences": "attr_preference", "interested in": "attr_preference",
+    "investment preference": "attr_preference", "investment preferences": "attr_preference",
+    "portfolio": "attr_client", "profile": "attr_client", "email": "attr_client", "phone": "attr_client",
+    "manager": "attr_manager", "relationship manager": "attr_manager", "rm": "attr_manager",
+    # transaction attributes (MySQL)
+    "date": "attr_time", "month": "attr_time", "year": "attr_time", "january": "attr_time",
+    "february": "attr_time", "march": "attr_time", "april": "attr_time", "may": "attr_time",
+    "june": "attr_time", "july": "attr_time", "august": "attr_time", "september": "attr_time",
+    "october": "attr_time", "november": "attr_time", "december": "attr_time", "recent": "attr_time",
+    "bought": "ent_transaction", "purchased": "ent_transaction",
+    # per-month breakdowns (whole phrases, so they win over the "month" time filter)
+    "per month": "group_month", "by month": "group_month", "each month": "group_month",
+    "every month": "group_month", "monthly": "group_month", "month wise": "group_month",
+    "month on month": "group_month", "month by month": "group_month",
+}
+
+RISK_LEVELS = {"high": "High", "medium": "Medium", "moderate": "Medium", "low": "Low"}
+PREFERENCES = {
+    "stocks": "Stocks", "bonds": "Bonds", "real estate": "Real Estate", "crypto": "Crypto",
+    "mutual funds": "Mutual Funds", "fixed deposits": "Fixed Deposits",
+}
+
+STOPWORDS = {
+    "what", "is", "are", "the", "a", "an", "of", "all", "me", "show", "list", "find", "get", "give",
+    "display", "tell", "which", "who", "whose", "in", "by", "for", "with", "do", "does", "did", "have",
+    "has", "there", "much", "to", "i", "my", "our", "we", "please", "across", "and", "their", "them",
+    "each", "per", "any", "that", "this", "on", "from", "at", "be", "been", "made", "was", "were", "s",
+    "level", "levels", "where", "than",
+}
+
+# Words that introduce a per-group breakdown ("per client", "by stock", "for each RM")
+GROUP_WORDS = {"per", "by", "each", "every"}
+# Features that name a dimension a question can be broken down by
+GROUP_DIMENSIONS = {
+    "ent_client": "client", "ent_stock": "stock", "attr_manager": "rm",
+    "attr_risk": "risk", "attr_preference": "preference",
+}
+
+_CLIENT_ID = re.compile(r"\bc\d{2,}\b")
+# Relationship manager ids are numeric in MongoDB (rm_id: 101)
+_RM_ID = re.compile(r"\b(?:rm|rm_id|manager)\s+(?:id\s+)?(?:is\s+|of\s+|=\s*)?(\d+)\b")
+_TOKEN = re.compile(r"[a-z0-9_]+")
+
+
+class KeywordAutomaton:
+    """Token-level phrase trie: finds every known phrase in one left-to-right pass"""
+
+    def __init__(self, phrases: Dict[str, Tuple[str, Any]]):
+        self._root: Dict[str, Any] = {}
+        for phrase, payload in phrases.items():
+            node = self._root
+            for token in phrase.split():
+                node = node.setdefault(token, {})
+            node["$"] = payload
+
+    def scan(self, tokens: List[str]) -> List[Tuple[int, int, Tuple[str, Any]]]:
+        """Return (start, end, payload) for the longest phrase starting at each position"""
+        matches = []
+        i = 0
+        while i < len(tokens):
+            node, best = self._root, None
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if "$" in node:
+                    best = (i, j + 1, node["$"])
+            if best:
+                matches.append(best)
+                i = best[1]
+            else:
+                i += 1
+        return matches
+
+
+class QuestionRouter:
+    """Deterministic intent classifier returning an intent, target store, confidence and slots"""
+
+    def __init__(self):
+        self._vocabulary: Dict[str, Tuple[str, Any]] = {}
+        self._build()
+
+    def _build(self):
+        phrases: Dict[str, Tuple[str, Any]] = {phrase: ("feature", feature) for phrase, feature in KEYWORDS.items()}
+        for word, level in RISK_LEVELS.items():
+            phrases[word] = ("risk", level)
+        for phrase, preference in PREFERENCES.items():
+            phrases.setdefault(phrase, ("preference", preference))
+        phrases.update(self._vocabulary)
+        self._automaton = KeywordAutomaton(phrases)
+
+    def set_vocabulary(self, vocabulary: Dict[str, Iterable[str]]):
+        """Register known column values (stock and RM names) as slot phrases"""
+        self._vocabulary = {}
+        for kind, values in vocabulary.items():
+            for value in values:
+                tokens = _TOKEN.findall(str(value).lower())
+                if tokens:
+                    self._vocabulary[" ".join(tokens)] = (kind, value)
+        self._build()
+
+    def classify(self, question: str) -> Dict[str, Any]:
+        """Return {"intent", "store", "confidence", "slots", "fast_path"} for a question"""
+        text = question.lower()
+        slots: Dict[str, Any] = {}
+
+        client_ids = _CLIENT_ID.findall(text)
+        if client_ids:
+            slots["client_id"] = client_ids[0].upper()
+        text = _CLIENT_ID.sub(" ", text)
+
+        rm_ids = _RM_ID.findall(text)
+        if rm_ids:
+            slots["rm_id"] = int(rm_ids[0])
+            text = _RM_ID.sub(" rm ", text)
+
+        tokens = _TOKEN.findall(text)
+        features = set()
+        explained = set()
+        pending: Dict[str, Any] = {}
+
+        matches = self._automaton.scan(tokens)
+        for start, end, (kind, value) in matches:
+            explained.update(range(start, end))
+            if kind == "feature":
+                features.add(value)
+            else:
+                pending.setdefault(kind, value)
+
+        # Numbers right after "top" are the N in top-N
+        for i, token in enumerate(tokens):
+            if token.isdigit() and i > 0 and tokens[i - 1] in ("top", "first"):
+                slots["limit"] = min(int(token), 100)
+                explained.add(i)
+
+        # "stocks" is a preference only when the question talks about preferences
+        if "attr_preference" in features and "ent_stock" in features and "preference" not in pending:
+            features.discard("ent_stock")
+            pending["preference"] = "Stocks"
+        if "preference" in pending and "attr_preference" not in features:
+            pending.pop("preference")
+        if "risk" in pending and "attr_risk" not in features:
+            pending.pop("risk")
+        slots.update(pending)
+
+        group_by = self._group_by(tokens, matches, slots)
+        if group_by:
+            features.add("group_other")
+
+        content = [i for i, token in enumerate(tokens) if token not in STOPWORDS]
+        understood = [i for i in content if i in explained]
+        confidence = len(understood) / len(content) if content else 0.0
+
+        client_side, transaction_side = self._sides(features, slots)
+        intent = self._intent(features, slots, client_side, transaction_side)
+        store = self._store(features, slots, intent, client_side and transaction_side)
+
+        return {
+            "intent": intent,
+            "store": store,
+            "confidence": round(confidence, 2),
+            "slots": slots,
+            "fast_path": intent is not None and confidence >= ROUTER_CONFIDENCE,
+        }
+
+    def _group_by(self, tokens: List[str], matches: List[Tuple[int, int, Tuple[str, Any]]],
+                  slots: Dict[str, Any]) -> Optional[str]:
+        """The dimension named after per/by/each, e.g. "stock" in "total invested by stock" """
+        starts = {start: payload for start, _, payload in matches}
+        covered = {i for start, end, _ in matches for i in range(start, end)}
+        for i, token in enumerate(tokens):
+            # "per month" and friends are matched as whole phrases
+            if token not in GROUP_WORDS or i in covered:
+                continue
+            j = i + 1
+            while j < len(tokens) and tokens[j] in ("each", "every", "the", "a"):
+                j += 1
+            if j not in starts:
+                continue
+            kind, value = starts[j]
+            dimension = GROUP_DIMENSIONS.get(value) if kind == "feature" else None
+            # "transactions by client C001" and "clients managed by rm 101" filter on one value
+            if dimension == "client" and "client_id" in slots or dimension == "rm" and "rm_id" in slots:
+                continue
+            if dimension:
+                return dimension
+        return None
+
+    def _sides(self, features: set, slots: Dict[str, Any]) -> Tuple[bool, bool]:
+        """Whether the question filters on client attributes (MongoDB) and on transactions (MySQL)"""
+        client_side = "risk" in slots or "preference" in slots or "rm_id" in slots
+        transaction_side = bool(features & {"ent_transaction", "measure_amount", "ent_stock"}) or \
+            "stock_name" in slots or "rm_name" in slots
+        return client_side, transaction_side
+
+    def _intent(self, features: set, slots: Dict[str, Any], client_side: bool, transaction_side: bool) -> Optional[str]:
+        """Map features to one of the precompiled intents, or None when nothing fits"""
+        if "attr_time" in features:
+            return None
+        # A numeric RM id is a client attribute; RM names are transaction slots
+        if "attr_manager" in features and "rm_id" not in slots:
+            return None
+
+        if "group_month" in features:
+            return "monthly_invested" if transaction_side and not client_side else None
+        if "group_other" in features:
+            # Per-client, per-stock, per-RM or per-attribute breakdowns have no precompiled answer
+            return None
+
+        if client_side and not transaction_side:
+            if "op_top" in features:
+                # Nothing on the client side ranks clients; leave "top N high-risk clients" to the agents
+                return None
+            return "client_count" if "op_count" in features else "filter_clients"
+        if "op_top" in features and "ent_stock" in features:
+            return "top_stocks"
+        if "op_top" in features and "ent_client" in features:
+            return "top_clients"
+        if "op_count" in features and "ent_transaction" in features:
+            return "transaction_count"
+        if "op_total" in features and "measure_amount" in features:
+            return "total_invested"
+        if "op_count" in features and "ent_client" in features:
+            # Clients narrowed by stock or RM name are counted from their transactions
+            return "investor_count" if transaction_side and not client_side else "client_count"
+        if client_side:
+            # Client attributes plus transaction detail without an aggregate: list the transactions
+            return "client_transactions"
+        return None
+
+    def _store(self, features: set, slots: Dict[str, Any], intent: Optional[str], cross_store: bool = False) -> str:
+        """Pick the store that answers the question"""
+        if intent is not None and cross_store:
+            # Client attributes from MongoDB joined with transactions from MySQL
+            return "federated"
+        if intent in ("client_count", "filter_clients"):
+            return "mongo"
+        if intent is not None:
+            return "sql"
+
+        # Anything about transactions lives in MySQL, even when client attributes are mentioned
+        if "ent_transaction" in features:
+            return "sql"
+
+        mongo_score = len(features & {"attr_risk", "attr_preference", "attr_client"})
+        sql_score = len(features & {"measure_amount", "ent_stock", "attr_time"}) + \
+            ("stock_name" in slots) + ("rm_name" in slots)
+        if mongo_score > sql_score:
+            return "mongo"
+        if mongo_score == sql_score and mongo_score == 0 and \
+                features & {"ent_client", "attr_manager"}:
+            return "mongo"
+        return "sql"
+
+
+router = QuestionRouter()
+
+
+def classify_question(question: str) -> Dict[str, Any]:
+    """Classify a question with the shared router"""
+    return router.classify(question)
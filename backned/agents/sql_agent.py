@@ -1,16 +1,25 @@
-from langchain_openai import ChatOpenAI
-from langchain_community.utilities import SQLDatabase
-from langchain.agents import AgentExecutor, create_react_agent
-from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
-from langchain import hub
-from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
 import os
 import warnings
 import re
 import logging
 import traceback
-from typing import Optional, Dict, Any
+import threading
+import hashlib
+import time
+from typing import Optional, Dict, Any, AsyncIterator, Tuple
+import json
+from core.executor import run_blocking
+from core.llm_client import GatewayChatOpenAI
+from core.plan_cache import PlanCache
+from core.result_set import ResultSet
+from agents.sql_guard import GuardedSQLDatabase, QueryRejected
+from agents.sql_repair import SQLRepairer, SQL_REPAIR_ATTEMPTS
+from agents.answer_formatter import render_answer, normalize_chart_hint
+from db.mysql_conn import get_engine
+from db.rollups import rollup_store
+from db.schema_snapshot import load_mysql_snapshot, render_mysql_tables, snapshot_expired
+from sqlalchemy import text
 
 # Suppress LangSmith warnings
 warnings.filterwarnings('ignore', category=UserWarning, module='langsmith')
@@ -23,9 +32,17 @@ load_dotenv()
 openai_api_key = os.getenv("OPENAI_API_KEY")
 mysql_uri = os.getenv("MYSQL_URI")
 
+# Checked when the agent is built, so the server still starts (and serves fast-path answers) without it
 if not openai_api_key:
     logger.error("OPENAI_API_KEY missing in .env")
-    raise ValueError("OPENAI_API_KEY missing in .env")
+
+# "single_shot" asks the LLM once for {sql, answer_template, chart_hint}; "react" runs the tool-using agent first
+SQL_AGENT_MODE = os.getenv("SQL_AGENT_MODE", "single_shot")
+# Word the final answer with a second LLM call instead of the local formatter
+SQL_LLM_FORMATTING = os.getenv("SQL_LLM_FORMATTING", "0") == "1"
+
+# Read every DATA_VERSION_TTL seconds: one lookup on the created_at index instead of a COUNT(*) scan
+DATA_VERSION_SQL = "SELECT MAX(created_at) FROM transactions"
 
 # MySQL is optional for deployment
 if not mysql_uri:
@@ -40,39 +57,104 @@ class SQLQueryAgent:
     
     def __init__(self):
         try:
+            if not openai_api_key:
+                raise ValueError("OPENAI_API_KEY missing in .env")
+            # The LLM must exist before the ReAct agent is built on top of it
+            self.llm = GatewayChatOpenAI(
+                model="gpt-3.5-turbo", 
+                temperature=0, 
+                api_key=openai_api_key,
+                max_tokens=1500,
+                timeout=30  # Add timeout
+            )
+            
+            # Generated SQL templates; a rebuilt agent starts with a fresh cache
+            self.plan_cache = PlanCache()
+            self.vocabulary: Dict[str, list] = {}
+            self.repairer = SQLRepairer()
+            
             if not MYSQL_AVAILABLE:
                 logger.warning("MySQL not available - using mock mode")
                 self.db = None
                 self.agent = None
                 self.schema_info = None
+                self.schema_hash = None
+                self.snapshot = None
             else:
-                self.db = SQLDatabase.from_uri(mysql_uri)
+                # Borrow from the process-wide pool; reflection is deferred because
+                # the schema comes from the persisted snapshot instead
+                self.db = GuardedSQLDatabase(get_engine(), lazy_table_reflection=True)
                 self.schema_info = None
+                self.snapshot = None
+                self.schema_hash = self._schema_fingerprint()
                 self._init_schema_info()
-                self._init_agent()
-            
-            self.llm = ChatOpenAI(
-                model="gpt-3.5-turbo", 
-                temperature=0, 
-                api_key=openai_api_key,
-                max_tokens=1500,
-                timeout=30  # Add timeout
-            )
+                self._init_vocabulary()
+                self.agent = None
+                if SQL_AGENT_MODE == "react":
+                    self._init_agent()
         except Exception as e:
             logger.error(f"Failed to initialize SQLQueryAgent: {str(e)}")
             raise Exception(f"Failed to initialize SQL agent: {str(e)}")
     
     def _init_schema_info(self):
-        """Initialize and cache schema information"""
+        """Load the compact schema from the snapshot cache (introspecting once per schema hash)"""
         try:
-            self.schema_info = self.db.get_table_info()
+            # Only the tables the agent may use are profiled and described
+            snapshot = load_mysql_snapshot(self.db._engine, self.schema_hash, self.db.get_usable_table_names())
+            self.snapshot = snapshot
+            tables = render_mysql_tables(snapshot)
+            self.repairer = SQLRepairer({
+                table_name: [column["name"] for column in table["columns"]]
+                for table_name, table in snapshot["tables"].items()
+            })
+            self.schema_info = "\n".join(tables.values())
+            # Serve the same compact descriptions from the agent's sql_db_schema tool
+            self.db = GuardedSQLDatabase(self.db._engine, custom_table_info=tables, lazy_table_reflection=True)
             logger.info("✅ Schema information loaded successfully!")
         except Exception as e:
-            logger.error(f"⚠️ Failed to load schema: {str(e)}")
-            self.schema_info = None
+            logger.error(f"⚠️ Failed to load schema snapshot, falling back to reflection: {str(e)}")
+            try:
+                self.schema_info = self.db.get_table_info()
+            except Exception as reflect_error:
+                logger.error(f"⚠️ Failed to load schema: {str(reflect_error)}")
+                self.schema_info = None
+    
+    def _init_vocabulary(self):
+        """Load stock and RM names so the plan cache can recognise them in questions"""
+        try:
+            vocabulary = {}
+            with self.db._engine.connect() as conn:
+                for column in ("stock_name", "rm_name"):
+                    rows = conn.execute(text(f"SELECT DISTINCT {column} FROM transactions LIMIT 1000"))
+                    vocabulary[column] = [row[0] for row in rows]
+            self.vocabulary = vocabulary
+            self.plan_cache.set_vocabulary(vocabulary)
+        except Exception as e:
+            logger.error(f"Failed to load plan cache vocabulary: {str(e)}")
+    
+    def _schema_fingerprint(self) -> Optional[str]:
+        """Hash the live column layout so schema changes can be detected cheaply"""
+        if not self.db:
+            return None
+        
+        try:
+            # Trusted internal query: read on the engine so the generated-SQL guard does not cap it
+            with self.db._engine.connect() as conn:
+                columns = conn.execute(text(
+                    "SELECT table_name, column_name, column_type FROM information_schema.columns "
+                    "WHERE table_schema = DATABASE() ORDER BY table_name, ordinal_position"
+                )).fetchall()
+            return hashlib.sha256(str([tuple(row) for row in columns]).encode("utf-8")).hexdigest()
+        except Exception as e:
+            logger.error(f"Failed to fingerprint schema: {str(e)}")
+            return None
     
     def _init_agent(self):
         """Initialize the SQL agent with proper error handling"""
+        # The agent toolkit is only needed in react mode, so it is not imported with this module
+        from langchain.agents import AgentExecutor, create_react_agent
+        from langchain.prompts import PromptTemplate
+        from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
         try:
             toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
             tools = toolkit.get_tools()
@@ -147,6 +229,12 @@ Thought:{agent_scratchpad}""",
         if not MYSQL_AVAILABLE or not self.db:
             return self._get_mock_sql_response(question)
         
+        # A cached plan for this question shape skips SQL generation entirely
+        cached_plan = self.plan_cache.lookup_plan(question)
+        if cached_plan:
+            logger.info(f"Plan cache hit: {cached_plan['sql']}")
+            return self._direct_sql_query(question, cached_plan)
+        
         # Try agent first
         if self.agent:
             try:
@@ -155,6 +243,7 @@ Thought:{agent_scratchpad}""",
                 
                 # Check if the response is meaningful
                 if output and len(output.strip()) > 10 and "Agent stopped" not in output:
+                    self._remember_agent_plan(question, response)
                     return output
                 else:
                     logger.info("Agent response insufficient, trying fallback...")
@@ -166,6 +255,133 @@ Thought:{agent_scratchpad}""",
         # Fallback to direct SQL generation
         return self._direct_sql_query(question)
     
+    async def aquery(self, question: str) -> str:
+        """Async variant of query: LLM calls use ainvoke, DB calls run on the bounded executor"""
+        logger.info(f"🔍 Processing question: {question}")
+        
+        if not question or not question.strip():
+            return "Please provide a valid question."
+        
+        if not MYSQL_AVAILABLE or not self.db:
+            return self._get_mock_sql_response(question)
+        
+        cached_plan = self.plan_cache.lookup_plan(question)
+        if cached_plan:
+            logger.info(f"Plan cache hit: {cached_plan['sql']}")
+            return await self._adirect_sql_query(question, cached_plan)
+        
+        if self.agent:
+            try:
+                response = await self.agent.ainvoke({"input": question})
+                output = response.get('output', 'No output found')
+                
+                if output and len(output.strip()) > 10 and "Agent stopped" not in output:
+                    self._remember_agent_plan(question, response)
+                    return output
+                else:
+                    logger.info("Agent response insufficient, trying fallback...")
+                    
+            except Exception as e:
+                logger.error(f"Agent failed: {str(e)}")
+                logger.info("Falling back to direct SQL generation...")
+        
+        return await self._adirect_sql_query(question)
+    
+    async def astream(self, question: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield progress events (step, sql, rows, result, chart, token) while answering a question"""
+        if not question or not question.strip():
+            yield {"event": "token", "data": "Please provide a valid question."}
+            return
+        
+        if not MYSQL_AVAILABLE or not self.db:
+            yield {"event": "token", "data": self._get_mock_sql_response(question)}
+            return
+        
+        cached_plan = self.plan_cache.lookup_plan(question)
+        if not cached_plan and self.agent:
+            steps = []
+            try:
+                async for chunk in self.agent.astream({"input": question}):
+                    for action in chunk.get("actions", []):
+                        yield {"event": "step", "data": {"tool": action.tool, "input": str(action.tool_input)}}
+                        if action.tool == "sql_db_query":
+                            yield {"event": "sql", "data": str(action.tool_input)}
+                    for step in chunk.get("steps", []):
+                        steps.append((step.action, step.observation))
+                        yield {"event": "observation", "data": str(step.observation)[:500]}
+                    output = chunk.get("output")
+                    if output and len(output.strip()) > 10 and "Agent stopped" not in output:
+                        self._remember_agent_plan(question, {"intermediate_steps": steps})
+                        yield {"event": "token", "data": output}
+                        yield {"event": "ok", "data": True}
+                        return
+                logger.info("Agent response insufficient, trying fallback...")
+            except Exception as e:
+                logger.error(f"Agent failed: {str(e)}")
+                logger.info("Falling back to direct SQL generation...")
+        
+        plan = cached_plan or await self._agenerate_plan(question)
+        if not plan:
+            yield {"event": "token", "data": "Could not generate SQL query"}
+            return
+        sql_query = plan["sql"]
+        yield {"event": "sql", "data": sql_query}
+        
+        result, result_set, executed_sql = await run_blocking(self._execute_query_with_retry, sql_query, question)
+        if executed_sql != sql_query:
+            yield {"event": "sql", "data": executed_sql}
+        yield {"event": "rows", "data": result_set.row_count if result_set is not None else None}
+        if result_set is None:
+            yield {"event": "token", "data": result}
+            return
+        if not cached_plan or executed_sql != sql_query:
+            self.plan_cache.store(question, executed_sql, plan.get("answer_template"))
+        sql_query = executed_sql
+        yield {"event": "result", "data": result_set.to_json()}
+        yield {"event": "chart", "data": plan.get("chart_hint", "table")}
+        
+        if not SQL_LLM_FORMATTING:
+            yield {"event": "token", "data": render_answer(plan.get("answer_template"), result_set.rows(), sql_query)}
+            yield {"event": "ok", "data": True}
+            return
+        
+        try:
+            async for chunk in self.llm.astream(self._format_prompt(question, sql_query, result)):
+                if chunk.content:
+                    yield {"event": "token", "data": chunk.content}
+            yield {"event": "ok", "data": True}
+        except Exception as e:
+            logger.error(f"Formatting error: {str(e)}")
+            yield {"event": "token", "data": f"Result: {result}\n(Formatting error: {str(e)})"}
+    
+    async def aanswer(self, question: str) -> Dict[str, Any]:
+        """Answer text together with the typed result, chart hint and success flag, for /ask"""
+        tokens, result, chart_hint, ok = [], None, None, False
+        async for event in self.astream(question):
+            if event["event"] == "token":
+                tokens.append(event["data"])
+            elif event["event"] == "result":
+                result = event["data"]
+            elif event["event"] == "chart":
+                chart_hint = event["data"]
+            elif event["event"] == "ok":
+                ok = True
+        return {"answer": "".join(tokens), "result": result, "chart_hint": chart_hint, "ok": ok}
+    
+    def _remember_agent_plan(self, question: str, response: Dict[str, Any]):
+        """Cache the last successful SQL the ReAct agent ran for this question"""
+        for action, observation in reversed(response.get("intermediate_steps", [])):
+            if getattr(action, "tool", None) != "sql_db_query":
+                continue
+            if isinstance(observation, str) and observation.startswith("Error"):
+                continue
+            tool_input = action.tool_input
+            if isinstance(tool_input, dict):
+                tool_input = tool_input.get("query", "")
+            if tool_input:
+                self.plan_cache.store(question, self._clean_sql_query(str(tool_input)))
+            return
+    
     def _get_mock_sql_response(self, question: str) -> str:
         """Provide mock SQL responses when MySQL is not available"""
         question_lower = question.lower()
@@ -203,30 +419,90 @@ Thought:{agent_scratchpad}""",
                 result += f"- {t['client_id']}: {t['stock_name']} (₹{t['amount_invested']:,}) on {t['date_']}\n"
             return result + "[Note: Using mock data - MySQL not available]"
     
-    def _direct_sql_query(self, question: str) -> str:
-        """Enhanced direct SQL query generation and execution"""
+    def _direct_sql_query(self, question: str, cached_plan: Optional[Dict[str, Any]] = None) -> str:
+        """Single-shot path: one LLM call for the plan, then execution and local formatting"""
         try:
-            # Generate SQL query
-            sql_query = self._generate_sql_query(question)
-            if not sql_query:
+            # Generate a plan unless a cached one was supplied
+            generated = cached_plan is None
+            plan = self._generate_plan(question) if generated else cached_plan
+            if not plan:
                 return "Could not generate SQL query"
+            sql_query = plan["sql"]
             
             logger.info(f"Generated SQL: {sql_query}")
             
             # Execute query with retry logic
-            result = self._execute_query_with_retry(sql_query, question)
+            result, result_set, executed_sql = self._execute_query_with_retry(sql_query, question)
+            if result_set is not None and (generated or executed_sql != sql_query):
+                self.plan_cache.store(question, executed_sql, plan.get("answer_template"))
             
             # Format and return response
-            return self._format_response(question, sql_query, result)
+            return self._format_response(question, executed_sql, result, result_set, plan.get("answer_template"))
+                
+        except Exception as e:
+            logger.error(f"Error in SQL handler: {str(e)}")
+            return f"Error in SQL handler: {str(e)}"
+    
+    async def _adirect_sql_query(self, question: str, cached_plan: Optional[Dict[str, Any]] = None) -> str:
+        """Async single-shot path"""
+        try:
+            generated = cached_plan is None
+            plan = await self._agenerate_plan(question) if generated else cached_plan
+            if not plan:
+                return "Could not generate SQL query"
+            sql_query = plan["sql"]
+            
+            logger.info(f"Generated SQL: {sql_query}")
+            
+            result, result_set, executed_sql = await run_blocking(self._execute_query_with_retry, sql_query, question)
+            if result_set is not None and (generated or executed_sql != sql_query):
+                self.plan_cache.store(question, executed_sql, plan.get("answer_template"))
+            
+            return await self._aformat_response(question, executed_sql, result, result_set, plan.get("answer_template"))
                 
         except Exception as e:
             logger.error(f"Error in SQL handler: {str(e)}")
             return f"Error in SQL handler: {str(e)}"
     
-    def _generate_sql_query(self, question: str) -> Optional[str]:
-        """Generate SQL query using LLM"""
+    def _generate_plan(self, question: str) -> Optional[Dict[str, Any]]:
+        """Ask the LLM once for {sql, answer_template, chart_hint}"""
         try:
-            sql_prompt = f"""
+            response = self.llm.invoke(self._sql_prompt(question), response_format={"type": "json_object"})
+            return self._parse_plan(response.content)
+            
+        except Exception as e:
+            logger.error(f"SQL generation error: {str(e)}")
+            return None
+    
+    async def _agenerate_plan(self, question: str) -> Optional[Dict[str, Any]]:
+        """Generate the structured plan without blocking the event loop"""
+        try:
+            response = await self.llm.ainvoke(self._sql_prompt(question), response_format={"type": "json_object"})
+            return self._parse_plan(response.content)
+            
+        except Exception as e:
+            logger.error(f"SQL generation error: {str(e)}")
+            return None
+    
+    def _parse_plan(self, content: str) -> Optional[Dict[str, Any]]:
+        """Read the structured plan; bare SQL (no JSON) is accepted as a plan without a template"""
+        try:
+            plan = json.loads(content)
+        except json.JSONDecodeError:
+            plan = {"sql": content}
+        if not isinstance(plan, dict) or not plan.get("sql"):
+            logger.error(f"LLM returned no SQL: {content[:200]}")
+            return None
+        
+        return {
+            "sql": self._clean_sql_query(str(plan["sql"])),
+            "answer_template": plan.get("answer_template") or None,
+            "chart_hint": normalize_chart_hint(plan.get("chart_hint")),
+        }
+    
+    def _sql_prompt(self, question: str) -> str:
+        """Build the prompt used for single-shot SQL generation"""
+        return f"""
 Based on this MySQL database schema:
 {self.schema_info}
 
@@ -238,18 +514,15 @@ CRITICAL RULES:
 3. Use proper MySQL syntax
 4. For date filtering, use date_ column with format 'YYYY-MM-DD'
 5. Use LIMIT 10 for large result sets
-6. Return ONLY the SQL query, no explanation
+6. Give every computed column a short alias (e.g. SUM(amount_invested) AS total_invested)
 
-SQL Query:"""
-            
-            response = self.llm.invoke(sql_prompt)
-            sql_query = self._clean_sql_query(response.content)
-            
-            return sql_query
-            
-        except Exception as e:
-            logger.error(f"SQL generation error: {str(e)}")
-            return None
+Return ONLY a JSON object with these keys:
+- "sql": the SQL query
+- "answer_template": one sentence answering the question, with placeholders filled in from the results:
+  {{value}} (first value), {{count}} (number of rows), {{rows}} (formatted list of rows) or any column alias in braces
+- "chart_hint": one of "bar", "line", "pie", "table", "none"
+
+Example: {{"sql": "SELECT SUM(amount_invested) AS total_invested FROM transactions", "answer_template": "The total amount invested is {{total_invested}}.", "chart_hint": "none"}}"""
     
     def _clean_sql_query(self, sql_query: str) -> str:
         """Clean and format SQL query"""
@@ -266,57 +539,53 @@ SQL Query:"""
             
         return sql_query
     
-    def _execute_query_with_retry(self, sql_query: str, question: str) -> str:
-        """Execute query with error handling and retry logic"""
+    def _run_query(self, sql_query: str) -> Tuple[str, ResultSet]:
+        """Execute SQL and return the typed result with a compact text rendering"""
+        # Plain COUNT/SUM/AVG questions are answered from the in-memory rollups
+        answered = rollup_store.answer_sql(sql_query)
+        if answered is not None:
+            columns, rows = answered
+            result_set = ResultSet.from_rows([dict(zip(columns, row)) for row in rows], columns=columns)
+        else:
+            result_set = ResultSet.from_rows(self.db._execute(sql_query))
+        return result_set.to_text(), result_set
+    
+    def _execute_query_with_retry(self, sql_query: str, question: str) -> Tuple[str, Optional[ResultSet], str]:
+        """Execute query, repairing failures locally; returns (result text, ResultSet or None on failure, SQL run)"""
         try:
-            result = self.db.run(sql_query)
+            result, result_set = self._run_query(sql_query)
             logger.info(f"Raw Result: {result}")
-            return result
+            return result, result_set, sql_query
+            
+        except QueryRejected as rejected:
+            return f"Query execution failed: rejected by cost guard ({rejected.reason})", None, sql_query
             
         except Exception as query_error:
             error_msg = str(query_error)
             logger.error(f"Query error: {error_msg}")
-            
-            # Try to fix common errors
-            if "Unknown column" in error_msg:
-                # Try to fix column name issues
-                corrected_query = self._fix_column_names(sql_query)
-                if corrected_query != sql_query:
-                    logger.info(f"Retrying with corrected query: {corrected_query}")
-                    try:
-                        result = self.db.run(corrected_query)
-                        logger.info(f"Retry Result: {result}")
-                        return result
-                    except Exception as retry_error:
-                        logger.error(f"Retry failed: {str(retry_error)}")
-            
-            return f"Query execution failed: {error_msg}"
-    
-    def _fix_column_names(self, sql_query: str) -> str:
-        """Fix common column name issues"""
-        # Common column name fixes
-        replacements = {
-            'transactoin_id': 'transaction_id',  # Fix the typo in the database
-            'amount': 'amount_invested',
-            'transaction_date': 'date_',
-            'date': 'date_',
-            'rm': 'rm_name',
-            'relationship_manager': 'rm_name'
-        }
         
-        corrected_query = sql_query
-        for wrong, correct in replacements.items():
-            corrected_query = re.sub(rf'\b{wrong}\b', correct, corrected_query, flags=re.IGNORECASE)
+        # Fix unknown identifiers and dialect slips against the cached schema, without the LLM
+        attempt_query, attempt_error = sql_query, error_msg
+        for attempt in range(SQL_REPAIR_ATTEMPTS):
+            corrected_query = self.repairer.repair(attempt_query, attempt_error)
+            if not corrected_query:
+                break
+            logger.info(f"Retrying with corrected query: {corrected_query}")
+            try:
+                result, result_set = self._run_query(corrected_query)
+                logger.info(f"Retry Result: {result}")
+                return result, result_set, corrected_query
+            except QueryRejected as rejected:
+                return f"Query execution failed: rejected by cost guard ({rejected.reason})", None, corrected_query
+            except Exception as retry_error:
+                attempt_query, attempt_error = corrected_query, str(retry_error)
+                logger.error(f"Retry {attempt + 1} failed: {attempt_error}")
         
-        return corrected_query
+        return f"Query execution failed: {error_msg}", None, sql_query
     
-    def _format_response(self, question: str, sql_query: str, result: str) -> str:
-        """Format the final response"""
-        if "Query execution failed" in result:
-            return result
-        
-        try:
-            format_prompt = f"""
+    def _format_prompt(self, question: str, sql_query: str, result: str) -> str:
+        """Build the prompt that turns raw rows into a natural language answer"""
+        return f"""
 Question: {question}
 SQL Query: {sql_query}
 Query Result: {result}
@@ -332,8 +601,33 @@ Guidelines:
 6. Don't include technical SQL details in the answer
 
 Answer:"""
+    
+    def _format_response(self, question: str, sql_query: str, result: str,
+                         result_set: Optional[ResultSet] = None, answer_template: Optional[str] = None) -> str:
+        """Format the final response locally, or with the LLM when SQL_LLM_FORMATTING is set"""
+        if "Query execution failed" in result:
+            return result
+        if result_set is not None and not SQL_LLM_FORMATTING:
+            return render_answer(answer_template, result_set.rows(), sql_query)
+        
+        try:
+            formatted_response = self.llm.invoke(self._format_prompt(question, sql_query, result))
+            return formatted_response.content
             
-            formatted_response = self.llm.invoke(format_prompt)
+        except Exception as e:
+            logger.error(f"Formatting error: {str(e)}")
+            return f"Result: {result}\n(Formatting error: {str(e)})"
+    
+    async def _aformat_response(self, question: str, sql_query: str, result: str,
+                                result_set: Optional[ResultSet] = None, answer_template: Optional[str] = None) -> str:
+        """Format the final response without blocking the event loop"""
+        if "Query execution failed" in result:
+            return result
+        if result_set is not None and not SQL_LLM_FORMATTING:
+            return render_answer(answer_template, result_set.rows(), sql_query)
+        
+        try:
+            formatted_response = await self.llm.ainvoke(self._format_prompt(question, sql_query, result))
             return formatted_response.content
             
         except Exception as e:
@@ -380,8 +674,9 @@ def test_agent():
 
 def debug_database():
     """Debug database connection and structure"""
+    from langchain_community.utilities import SQLDatabase
     try:
-        db = SQLDatabase.from_uri(mysql_uri)
+        db = SQLDatabase(get_engine())
         logger.info("🔍 Database Debug Info:")
         logger.info(f"Tables: {db.get_usable_table_names()}")
         logger.info(f"Schema:\n{db.get_table_info()}")
@@ -393,21 +688,133 @@ def debug_database():
     except Exception as e:
         logger.error(f"Database debug error: {str(e)}")
 
+# Process-wide shared agent, built once at startup and swapped atomically on reload
+_shared_agent: Optional[SQLQueryAgent] = None
+_agent_lock = threading.Lock()
+_build_lock = threading.Lock()
+_agent_stats: Dict[str, Any] = {
+    "warmup_time": None,
+    "built_at": None,
+    "reloads": 0,
+    "schema_hash": None,
+}
+
+
+def _build_shared_agent() -> SQLQueryAgent:
+    """Build a new agent and record how long the warm-up took"""
+    start = time.time()
+    agent = SQLQueryAgent()
+    warmup_time = time.time() - start
+    
+    with _agent_lock:
+        global _shared_agent
+        replaced = _shared_agent is not None
+        _shared_agent = agent
+        _agent_stats["warmup_time"] = f"{warmup_time:.2f}s"
+        _agent_stats["built_at"] = time.time()
+        _agent_stats["schema_hash"] = agent.schema_hash
+        if replaced:
+            _agent_stats["reloads"] += 1
+    
+    logger.info(f"SQL agent warmed up in {warmup_time:.2f}s")
+    return agent
+
+
+def init_sql_agent() -> SQLQueryAgent:
+    """Build the shared SQL agent once (called from the FastAPI lifespan hook)"""
+    with _build_lock:
+        if _shared_agent is not None:
+            return _shared_agent
+        return _build_shared_agent()
+
+
+def reload_sql_agent(force: bool = False) -> Dict[str, Any]:
+    """Rebuild the shared agent if the schema changed, its snapshot expired (or if forced).
+    
+    The replacement is built while the current agent keeps serving; requests
+    already holding the old instance finish on it undisturbed.
+    """
+    with _build_lock:
+        current = _shared_agent
+        if current is not None and not force:
+            schema_hash = current._schema_fingerprint()
+            if schema_hash is not None and schema_hash != current.schema_hash:
+                logger.info("Schema change detected - rebuilding SQL agent")
+            elif current.snapshot is not None and snapshot_expired(current.snapshot):
+                # Same layout, but new stocks, RMs and dates must reach the prompt and the vocabulary
+                logger.info("Schema snapshot expired - rebuilding SQL agent")
+            else:
+                return {"reloaded": False, "reason": "schema unchanged", **get_sql_agent_stats()}
+        
+        _build_shared_agent()
+        return {"reloaded": True, **get_sql_agent_stats()}
+
+
+def get_sql_agent_stats() -> Dict[str, Any]:
+    """Return warm-up, reload and plan cache statistics for the shared SQL agent"""
+    with _agent_lock:
+        stats = {"initialized": _shared_agent is not None, **_agent_stats}
+        if _shared_agent is not None:
+            stats["plan_cache"] = _shared_agent.plan_cache.stats()
+        return stats
+
+
+def get_transactions_watermark():
+    """Return the newest transactions created_at, or None in mock mode"""
+    agent = _shared_agent
+    if agent is None or not agent.db:
+        return None
+    # Always from MySQL, never the replica, so cached answers see new rows immediately
+    with agent.db._engine.connect() as conn:
+        return str(conn.execute(text(DATA_VERSION_SQL)).scalar())
+
+
 # Main query function for external use
 def query_sql_database(question: str) -> str:
     """Main function to query the SQL database"""
     try:
-        agent = SQLQueryAgent()
+        agent = get_sql_agent()
         return agent.query(question)
     except Exception as e:
         logger.error(f"Error in query_sql_database: {str(e)}")
         return f"Error: {str(e)}"
 
 
+async def aquery_sql_database(question: str) -> str:
+    """Async entry point used by the /ask endpoint"""
+    try:
+        agent = _shared_agent or await run_blocking(get_sql_agent)
+        return await agent.aquery(question)
+    except Exception as e:
+        logger.error(f"Error in aquery_sql_database: {str(e)}")
+        return f"Error: {str(e)}"
+
+
+async def aanswer_sql_database(question: str) -> Dict[str, Any]:
+    """Async entry point returning {"answer", "result", "chart_hint", "ok"}"""
+    try:
+        agent = _shared_agent or await run_blocking(get_sql_agent)
+        return await agent.aanswer(question)
+    except Exception as e:
+        logger.error(f"Error in aanswer_sql_database: {str(e)}")
+        return {"answer": f"Error: {str(e)}", "result": None, "chart_hint": None, "ok": False}
+
+
+async def astream_sql_database(question: str) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming entry point used by the /ask/stream endpoint"""
+    agent = _shared_agent or await run_blocking(get_sql_agent)
+    async for event in agent.astream(question):
+        yield event
+
+
 def get_sql_agent():
-    """Get SQL agent instance for external use"""
+    """Get the shared SQL agent instance, building it on first use"""
+    agent = _shared_agent
+    if agent is not None:
+        return agent
+    
     try:
-        return SQLQueryAgent()
+        return init_sql_agent()
     except Exception as e:
         logger.error(f"Failed to initialize SQL agent: {str(e)}")
         raise Exception(f"Failed to initialize SQL agent: {str(e)}")
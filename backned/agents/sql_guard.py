@@ -0,0 +1,161 @@
+# agents/sql_guard.py
+
+from dotenv import load_dotenv
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlglot import exp
+from typing import Any, Dict, List, Optional
+import os
+import sqlglot
+import logging
+
+from db.replica import SQL_EXECUTION_ENGINE, transactions_replica
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Row cap injected into (or enforced on) every generated query
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "1000"))
+# Server-side timeout added as a MAX_EXECUTION_TIME optimizer hint
+SQL_MAX_EXECUTION_MS = int(os.getenv("SQL_MAX_EXECUTION_MS", "10000"))
+# EXPLAIN budgets: estimated rows examined, and rows for a scan that uses no index
+SQL_EXPLAIN_CHECK = os.getenv("SQL_EXPLAIN_CHECK", "1") == "1"
+SQL_MAX_EXPLAIN_ROWS = int(os.getenv("SQL_MAX_EXPLAIN_ROWS", "1000000"))
+SQL_FULL_SCAN_ROWS = int(os.getenv("SQL_FULL_SCAN_ROWS", "200000"))
+
+# Statements and clauses that write, lock or leave the database
+WRITE_NODES = (exp.Insert, exp.Update, exp.Delete, exp.Drop, exp.Create, exp.Alter, exp.Command,
+               exp.Into, exp.Merge, exp.Set, exp.TruncateTable)
+# Functions that stall the server or touch the filesystem
+FORBIDDEN_FUNCTIONS = {"SLEEP", "BENCHMARK", "LOAD_FILE", "GET_LOCK", "RELEASE_LOCK"}
+
+
+class QueryRejected(SQLAlchemyError):
+    """Raised when generated SQL fails the guard.
+
+    Subclasses SQLAlchemyError so LangChain's sql_db_query tool reports the
+    reason back to the agent instead of aborting the whole run.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _reject(sql_query: str, reason: str):
+    logger.warning(f"Rejected SQL ({reason}): {sql_query}")
+    raise QueryRejected(reason)
+
+
+def _first_select(node: exp.Expression) -> Optional[exp.Select]:
+    """The query block MySQL reads optimizer hints from (left-most SELECT of a UNION)"""
+    while isinstance(node, exp.SetOperation):
+        node = node.left
+    return node if isinstance(node, exp.Select) else None
+
+
+def parse_read_only(sql_query: str) -> exp.Query:
+    """Parse one MySQL statement and make sure it can only read"""
+    try:
+        statements = [statement for statement in sqlglot.parse(sql_query, read="mysql") if statement is not None]
+    except sqlglot.errors.ParseError as e:
+        _reject(sql_query, f"unparseable SQL: {str(e).splitlines()[0]}")
+
+    if len(statements) != 1:
+        _reject(sql_query, f"expected one statement, got {len(statements)}")
+    statement = statements[0]
+    if not isinstance(statement, exp.Query):
+        _reject(sql_query, f"{statement.key.upper()} statements are not allowed")
+
+    for node in statement.walk():
+        if isinstance(node, WRITE_NODES):
+            _reject(sql_query, f"{node.key.upper()} is not allowed")
+        if isinstance(node, exp.Select) and node.args.get("locks"):
+            _reject(sql_query, "locking reads are not allowed")
+        if isinstance(node, exp.Func):
+            name = node.name if isinstance(node, exp.Anonymous) else node.sql_name()
+            if name.upper() in FORBIDDEN_FUNCTIONS:
+                _reject(sql_query, f"{name.upper()}() is not allowed")
+    return statement
+
+
+def cap_rows(statement: exp.Query) -> exp.Query:
+    """Add a LIMIT, or lower one that exceeds SQL_MAX_ROWS"""
+    limit = statement.args.get("limit")
+    if limit is None:
+        return statement.limit(SQL_MAX_ROWS)
+    value = limit.expression
+    if isinstance(value, exp.Literal) and not value.is_string and int(value.this) > SQL_MAX_ROWS:
+        limit.set("expression", exp.Literal.number(SQL_MAX_ROWS))
+    return statement
+
+
+def apply_limits(statement: exp.Query) -> exp.Query:
+    """Cap the returned rows and add a MAX_EXECUTION_TIME hint"""
+    statement = cap_rows(statement)
+    select = _first_select(statement)
+    if select is not None and select.args.get("hint") is None:
+        select.set("hint", exp.Hint(expressions=[
+            exp.Anonymous(this="MAX_EXECUTION_TIME", expressions=[exp.Literal.number(SQL_MAX_EXECUTION_MS)])
+        ]))
+    return statement
+
+
+def explain_rows(conn, sql_query: str) -> List[Dict[str, Any]]:
+    """Tabular EXPLAIN output as dicts with lower-cased keys"""
+    result = conn.execute(text(f"EXPLAIN {sql_query}"))
+    return [{key.lower(): value for key, value in row.items()} for row in result.mappings()]
+
+
+def check_plan(plan: List[Dict[str, Any]]) -> Optional[str]:
+    """Return why a plan is over budget, or None when it is acceptable"""
+    examined_by_block: Dict[Any, int] = {}
+    for row in plan:
+        rows = int(row.get("rows") or 0)
+        if row.get("type") == "ALL" and rows >= SQL_FULL_SCAN_ROWS:
+            return f"full scan of {row.get('table')} (~{rows:,} rows) without an index"
+        # Tables joined in one query block multiply (nested loops); blocks add up
+        block = row.get("id")
+        examined_by_block[block] = examined_by_block.get(block, 1) * max(rows, 1)
+
+    examined = sum(examined_by_block.values())
+    if examined > SQL_MAX_EXPLAIN_ROWS:
+        return f"estimated {examined:,} rows examined (budget {SQL_MAX_EXPLAIN_ROWS:,})"
+    return None
+
+
+def guard_query(engine, sql_query: str) -> str:
+    """Validate and rewrite generated SQL; raises QueryRejected with the reason"""
+    statement = apply_limits(parse_read_only(sql_query))
+    guarded = statement.sql(dialect="mysql")
+
+    if SQL_EXPLAIN_CHECK and engine.dialect.name == "mysql":
+        with engine.connect() as conn:
+            reason = check_plan(explain_rows(conn, guarded))
+        if reason:
+            _reject(guarded, reason)
+    return guarded
+
+
+class GuardedSQLDatabase(SQLDatabase):
+    """SQLDatabase that passes every raw SQL string through guard_query first.
+
+    Covers the ReAct agent's sql_db_query tool as well as direct execution.
+    With SQL_EXECUTION_ENGINE=replica, queries over transactions run on the
+    in-process replica while it is fresh.
+    """
+
+    def _execute(self, command, fetch="all", **kwargs):
+        if isinstance(command, str) and SQL_EXECUTION_ENGINE == "replica" and fetch != "cursor":
+            rows = transactions_replica.query(cap_rows(parse_read_only(command)), SQL_MAX_EXECUTION_MS)
+            if rows is not None:
+                return rows[:1] if fetch == "one" else rows
+        if isinstance(command, str):
+            guarded = guard_query(self._engine, command)
+            if guarded != command.strip().rstrip(";"):
+                logger.info(f"Guarded SQL: {guarded}")
+            command = guarded
+        return super()._execute(command, fetch, **kwargs)
@@ -0,0 +1,156 @@
+# agents/sql_repair.py
+
+from dotenv import load_dotenv
+from sqlglot import exp
+from sqlglot.tokens import TokenType
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import os
+import time
+import sqlglot
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Local repair attempts before giving up (each is a parse + rewrite, no LLM call)
+SQL_REPAIR_ATTEMPTS = int(os.getenv("SQL_REPAIR_ATTEMPTS", "2"))
+
+# Names the LLM tends to use for the real columns and tables
+SYNONYMS = {
+    "amount": "amount_invested",
+    "investment": "amount_invested",
+    "invested_amount": "amount_invested",
+    "amount_investment": "amount_invested",
+    "date": "date_",
+    "transaction_date": "date_",
+    "trade_date": "date_",
+    "rm": "rm_name",
+    "relationship_manager": "rm_name",
+    "manager": "rm_name",
+    "stock": "stock_name",
+    "stock_symbol": "stock_name",
+    "transactoin_id": "transaction_id",
+    "client": "client_id",
+    "transaction": "transactions",
+    "trades": "transactions",
+}
+
+# Dialects whose syntax the LLM most often mixes into MySQL (TOP, strftime, DATE_TRUNC, ...)
+FOREIGN_DIALECTS = ("tsql", "sqlite", "postgres")
+
+# MySQL errors worth re-reading the query in another dialect for (1064 syntax, 1305 unknown function)
+DIALECT_ERRORS = ("1064", "1305", "syntax", "FUNCTION")
+
+
+def _tokens(sql_query: str) -> List[Tuple[Any, str]]:
+    """Token stream used to tell real rewrites from cosmetic ones (case, spacing, AS, quotes)"""
+    try:
+        tokens = sqlglot.tokenize(sql_query, read="mysql")
+    except Exception:
+        return []
+    return [(token.token_type, token.text.lower()) for token in tokens
+            if token.token_type not in (TokenType.ALIAS, TokenType.SEMICOLON)]
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance between two identifiers"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def closest_name(name: str, candidates: Iterable[str]) -> Optional[str]:
+    """Resolve an unknown identifier through the synonym table, then edit distance"""
+    candidates = list(candidates)
+    lowered = {candidate.lower(): candidate for candidate in candidates}
+    key = name.lower()
+    if key in lowered:
+        return lowered[key]
+
+    synonym = SYNONYMS.get(key)
+    if synonym and synonym in lowered:
+        return lowered[synonym]
+
+    best, best_distance = None, None
+    for candidate in candidates:
+        distance = edit_distance(key, candidate.lower())
+        if best_distance is None or distance < best_distance:
+            best, best_distance = candidate, distance
+    # Allow roughly one typo per four characters
+    if best is not None and best_distance <= max(1, len(key) // 4):
+        return best
+    return None
+
+
+class SQLRepairer:
+    """Rewrites failing SQL locally: identifiers by AST against the schema, syntax by dialect"""
+
+    def __init__(self, schema: Optional[Dict[str, List[str]]] = None):
+        self.schema = schema or {}
+
+    def _fix_tables(self, statement: exp.Expression) -> List[str]:
+        fixes = []
+        ctes = {cte.alias for cte in statement.find_all(exp.CTE)}
+        for table in statement.find_all(exp.Table):
+            name = table.name
+            if not name or name in self.schema or name in ctes:
+                continue
+            resolved = closest_name(name, self.schema)
+            if resolved:
+                table.set("this", exp.to_identifier(resolved))
+                fixes.append(f"{name}->{resolved}")
+        return fixes
+
+    def _fix_columns(self, statement: exp.Expression) -> List[str]:
+        fixes = []
+        tables = {table.name for table in statement.find_all(exp.Table)}
+        known = [column for table in tables for column in self.schema.get(table, [])]
+        # Output aliases and derived-table columns are valid references too
+        aliases = {alias.alias for alias in statement.find_all(exp.Alias)}
+        if not known:
+            return fixes
+
+        for column in statement.find_all(exp.Column):
+            name = column.name
+            if not name or name in known or name in aliases:
+                continue
+            resolved = closest_name(name, known)
+            if resolved:
+                column.set("this", exp.to_identifier(resolved))
+                fixes.append(f"{name}->{resolved}")
+        return fixes
+
+    def repair(self, sql_query: str, error: str = "") -> Optional[str]:
+        """Return a corrected MySQL query, or None when nothing could be fixed"""
+        start = time.perf_counter()
+        original = _tokens(sql_query)
+
+        # MySQL first; syntax errors also re-read the query in the dialect it was written in
+        dialects = ("mysql",)
+        if any(marker in error for marker in DIALECT_ERRORS):
+            dialects += FOREIGN_DIALECTS
+        for dialect in dialects:
+            try:
+                statement = sqlglot.parse_one(sql_query, read=dialect)
+            except sqlglot.errors.ParseError:
+                continue
+            if statement is None:
+                continue
+
+            fixes = self._fix_tables(statement) + self._fix_columns(statement)
+            repaired = statement.sql(dialect="mysql")
+            if fixes or _tokens(repaired) != original:
+                if dialect != "mysql":
+                    fixes.append(f"read as {dialect}")
+                logger.info(f"SQL repaired locally in {(time.perf_counter() - start) * 1000:.1f}ms "
+                            f"({', '.join(fixes) or 'mysql dialect'}): {repaired}")
+                return repaired
+
+        logger.info(f"No local SQL repair found for: {error[:120]}")
+        return None
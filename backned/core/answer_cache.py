@@ -0,0 +1,195 @@
+# core/answer_cache.py
+
+from collections import OrderedDict
+from dotenv import load_dotenv
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import math
+import os
+import re
+import threading
+import time
+import logging
+
+from core.executor import run_state_io
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))
+# Embedding-similarity matching is opt-in: it costs one embedding call per miss
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "0") == "1"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+# How long a data-version watermark is trusted before it is re-read from the stores
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "5"))
+
+_PUNCTUATION = re.compile(r"[^\w\s₹]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace so trivial variants share a key"""
+    question = _PUNCTUATION.sub(" ", question.lower())
+    return _WHITESPACE.sub(" ", question).strip()
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class AnswerCache:
+    """LRU + TTL cache of /ask answers, invalidated when the underlying data changes"""
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        version_provider: Optional[Callable[[], Awaitable[Any]]] = None,
+        embedder: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+        shared: Optional[Any] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._version_provider = version_provider
+        self._embedder = embedder
+        # Cross-worker store (core.shared_state) consulted on local misses
+        self._shared = shared
+        # key -> (value, stored_at, embedding)
+        self._entries: "OrderedDict[str, Tuple[Any, float, Optional[List[float]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Any = None
+        self._version_checked = 0.0
+        self._stats = {
+            "hits": 0,
+            "shared_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    async def _check_version(self):
+        """Drop every entry when the data watermark moves"""
+        if not self._version_provider or time.time() - self._version_checked < DATA_VERSION_TTL:
+            return
+
+        self._version_checked = time.time()
+        try:
+            version = await self._version_provider()
+        except Exception as e:
+            logger.error(f"Failed to read data version: {str(e)}")
+            return
+
+        with self._lock:
+            if self._version is not None and version != self._version:
+                logger.info(f"Data version changed ({self._version} -> {version}) - clearing answer cache")
+                self._entries.clear()
+                self._stats["invalidations"] += 1
+            self._version = version
+
+    async def _embed(self, key: str) -> Optional[List[float]]:
+        if not self._embedder:
+            return None
+        try:
+            return await self._embedder(key)
+        except Exception as e:
+            logger.error(f"Embedding failed, skipping semantic match: {str(e)}")
+            return None
+
+    async def get(self, question: str) -> Tuple[Optional[Any], Optional[List[float]]]:
+        """Return (cached value or None, embedding computed for the lookup)"""
+        await self._check_version()
+        key = normalize_question(question)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0], entry[2]
+            if entry:
+                del self._entries[key]
+
+        if self._shared is not None:
+            # Another worker may already have answered it for the current data
+            value = await run_state_io(self._shared.get_answer, key, repr(self._version), self.ttl)
+            if value is not None:
+                with self._lock:
+                    self._entries[key] = (value, now, None)
+                    self._stats["shared_hits"] += 1
+                return value, None
+
+        embedding = await self._embed(key)
+        if embedding is not None:
+            with self._lock:
+                best_key, best_score = None, 0.0
+                for other_key, (_, stored_at, other_embedding) in self._entries.items():
+                    if other_embedding is None or now - stored_at > self.ttl:
+                        continue
+                    score = _cosine(embedding, other_embedding)
+                    if score > best_score:
+                        best_key, best_score = other_key, score
+                if best_key is not None and best_score >= self.similarity:
+                    self._entries.move_to_end(best_key)
+                    self._stats["semantic_hits"] += 1
+                    return self._entries[best_key][0], embedding
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, embedding
+
+    async def put(self, question: str, value: Any, embedding: Optional[List[float]] = None):
+        """Store an answer, evicting the least recently used entry when full"""
+        key = normalize_question(question)
+        evicted = False
+        with self._lock:
+            self._entries[key] = (value, time.time(), embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+                evicted = True
+        if self._shared is not None:
+            await run_state_io(self._shared.put_answer, key, repr(self._version), value)
+            if evicted:
+                await run_state_io(self._shared.trim_answers, self.max_entries, self.ttl)
+
+    async def clear(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._entries.clear()
+        if self._shared is not None:
+            await run_state_io(self._shared.clear_answers)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for /health"""
+        with self._lock:
+            hits = self._stats["hits"] + self._stats["shared_hits"] + self._stats["semantic_hits"]
+            lookups = hits + self._stats["misses"]
+            hit_rate = hits / lookups if lookups else 0.0
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": round(hit_rate, 3),
+                "semantic": self._embedder is not None,
+                "shared": self._shared is not None,
+                "data_version": self._version,
+            }
+
+
+def build_embedder() -> Optional[Callable[[str], Awaitable[List[float]]]]:
+    """Return an async embedding function when semantic matching is enabled"""
+    if not ANSWER_CACHE_SEMANTIC:
+        return None
+
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
+    return embeddings.aembed_query
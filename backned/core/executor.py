@@ -0,0 +1,54 @@
+# core/executor.py
+
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import asyncio
+import contextvars
+import functools
+import os
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Upper bound on threads running blocking driver/LLM calls for the event loop
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "16"))
+
+# Short calls to the cross-worker SQLite store run on their own threads, so they never queue behind
+# (or deadlock with) blocking threads that are themselves waiting on the event loop for an LLM slot
+SHARED_STATE_WORKERS = int(os.getenv("SHARED_STATE_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+_state_executor = ThreadPoolExecutor(max_workers=SHARED_STATE_WORKERS, thread_name_prefix="shared-state")
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared bounded executor for blocking work"""
+    return _executor
+
+
+def install_default_executor():
+    """Route loop.run_in_executor(None, ...) calls (e.g. LangChain sync tools) to the bounded executor"""
+    asyncio.get_running_loop().set_default_executor(_executor)
+    logger.info(f"Bounded executor installed with {BLOCKING_WORKERS} workers")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking callable on the bounded executor without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. the LLM priority class) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def run_state_io(func, *args, **kwargs):
+    """run_blocking for calls to the cross-worker store (core.shared_state), on its own small pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_state_executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor():
+    """Stop accepting blocking work and let queued calls finish"""
+    _executor.shutdown(wait=False)
@@ -0,0 +1,86 @@
+# core/health.py
+
+from dotenv import load_dotenv
+from typing import Any, Dict
+import asyncio
+import os
+import time
+import logging
+
+from core.executor import run_blocking
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Seconds between background database probes
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+
+
+def probe_databases() -> Dict[str, str]:
+    """Run blocking connectivity probes against MongoDB and MySQL"""
+    db_status = {}
+    
+    # Test MongoDB connection
+    try:
+        from db.mongo_conn import test_mongodb_connection
+        mongo_test = test_mongodb_connection()
+        if mongo_test["status"] == "connected":
+            db_status["mongodb"] = f"connected ({mongo_test['document_count']} docs)"
+        else:
+            db_status["mongodb"] = f"error: {mongo_test.get('error', 'Unknown error')[:100]}"
+    except Exception as e:
+        db_status["mongodb"] = f"error: {str(e)[:100]}"
+    
+    # Test MySQL connection
+    try:
+        from db.mysql_conn import connect_mysql
+        conn = connect_mysql()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        conn.close()
+        db_status["mysql"] = "connected"
+    except Exception as e:
+        db_status["mysql"] = f"error: {str(e)[:100]}"
+    
+    return db_status
+
+
+class HealthProber:
+    """Keeps the latest database probe result in memory so /health never touches the stores"""
+
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL):
+        self.interval = interval
+        self._snapshot: Dict[str, Any] = {"database_status": {}, "checked_at": None, "probe_time": None}
+        self._lock = asyncio.Lock()
+
+    async def probe(self) -> Dict[str, Any]:
+        """Run a live probe and publish it as the new snapshot"""
+        # Concurrent deep checks share one probe instead of stacking up
+        async with self._lock:
+            start = time.time()
+            db_status = await run_blocking(probe_databases)
+            self._snapshot = {
+                "database_status": db_status,
+                "checked_at": time.time(),
+                "probe_time": f"{(time.time() - start):.3f}s",
+            }
+            return self._snapshot
+
+    async def run(self):
+        """Probe forever on the configured interval (started from the lifespan hook)"""
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Background health probe failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest probe result with its age in seconds"""
+        snapshot = dict(self._snapshot)
+        checked_at = snapshot["checked_at"]
+        snapshot["age"] = round(time.time() - checked_at, 3) if checked_at else None
+        return snapshot
@@ -0,0 +1,52 @@
+# core/lazy_import.py
+
+from typing import Any, Optional
+from types import ModuleType
+import time
+import importlib
+import logging
+
+from core.executor import run_blocking
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    Keeps heavy imports (LangChain, OpenAI, database drivers) off the startup
+    path; the import itself runs once, under Python's import lock.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self.import_time: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            self.import_time = time.perf_counter() - start
+            self._module = module
+            logger.info(f"Imported {self._name} in {self.import_time:.2f}s")
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+async def ensure_loaded(*modules: LazyModule):
+    """Import whatever is still missing in a worker thread, so the event loop keeps serving meanwhile"""
+    missing = [module for module in modules if not module.loaded]
+    for module in missing:
+        await run_blocking(module.load)
@@ -0,0 +1,150 @@
+# core/llm_cache.py
+
+from dotenv import load_dotenv
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# off | readwrite | replay (read-only; a miss fails instead of calling OpenAI) | record (write, never read)
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "readwrite").lower()
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", Path(__file__).resolve().parent.parent / ".llm_cache" / "completions.sqlite3"))
+# Least recently used completions are evicted beyond this size
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "64"))
+# Check the size bound every this many writes
+LLM_CACHE_EVICT_EVERY = 50
+# A hit refreshes last_used at most this often, so reads rarely take the write lock
+LLM_CACHE_TOUCH_INTERVAL = 60.0
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS completions ("
+    "key TEXT PRIMARY KEY, llm TEXT NOT NULL, generations TEXT NOT NULL, size INTEGER NOT NULL, "
+    "created_at REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)",
+    "CREATE INDEX IF NOT EXISTS idx_completions_last_used ON completions (last_used)",
+)
+
+
+class LLMCacheMiss(Exception):
+    """Raised in replay mode when a prompt has no recorded completion"""
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """Hash of the model parameters (model, temperature, max_tokens, ...) and the serialized prompt"""
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+class PersistentLLMCache(BaseCache):
+    """Prompt -> completion cache in SQLite, shared by every worker on the host and kept across restarts.
+
+    WAL mode lets readers in other processes proceed while one process writes.
+    """
+
+    def __init__(self, path: Path = LLM_CACHE_PATH, max_mb: float = LLM_CACHE_MAX_MB, mode: str = LLM_CACHE_MODE):
+        self.path = Path(path)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.mode = mode
+        self._local = threading.local()
+        self._writes = 0
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0, "errors": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        # Per process as well as per thread: a connection must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Any]]:
+        if self.mode in ("off", "record"):
+            return None
+        key = cache_key(prompt, llm_string)
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT generations, last_used FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            now = time.time()
+            if now - row[1] > LLM_CACHE_TOUCH_INTERVAL and self.mode != "replay":
+                conn.execute("UPDATE completions SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._stats["hits"] += 1
+            return loads(row[0], allowed_objects="core")
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"LLM cache lookup failed: {str(e)}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Any]):
+        if self.mode in ("off", "replay"):
+            return
+        try:
+            payload = dumps(list(return_val))
+            now = time.time()
+            self._conn().execute(
+                "INSERT OR REPLACE INTO completions (key, llm, generations, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key(prompt, llm_string), llm_string, payload, len(payload) + len(llm_string), now, now),
+            )
+            self._stats["writes"] += 1
+            self._writes += 1
+            if self._writes % LLM_CACHE_EVICT_EVERY == 0:
+                self.evict()
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"LLM cache write failed: {str(e)}")
+
+    def evict(self) -> int:
+        """Drop least recently used completions until the cache is back under 90% of its bound"""
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        excess = total - int(self.max_bytes * 0.9)
+        keys, freed = [], 0
+        for key, size in conn.execute("SELECT key, size FROM completions ORDER BY last_used"):
+            keys.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM completions WHERE key = ?", keys)
+        self._stats["evicted"] += len(keys)
+        logger.info(f"LLM cache evicted {len(keys)} completions ({freed / 1024:.0f} KiB)")
+        return len(keys)
+
+    def clear(self, **kwargs: Any):
+        self._conn().execute("DELETE FROM completions")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus on-disk entry count and size for /health"""
+        stats: Dict[str, Any] = {"mode": self.mode, **self._stats}
+        try:
+            entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+            stats.update(entries=entries, size_kb=round(size / 1024, 1))
+        except Exception as e:
+            stats["error"] = str(e)
+        return stats
+
+
+llm_cache = PersistentLLMCache()
+
+
+def get_llm_cache() -> Optional[PersistentLLMCache]:
+    """The shared cache for temperature=0 models, or None when caching is off"""
+    return None if LLM_CACHE_MODE == "off" else llm_cache
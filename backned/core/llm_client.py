@@ -0,0 +1,90 @@
+# core/llm_client.py
+
+from langchain_core.callbacks.manager import AsyncCallbackManagerForLLMRun
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk
+from langchain_openai import ChatOpenAI
+from typing import Any, AsyncIterator, Optional
+from uuid import uuid4
+
+from core.llm_cache import LLMCacheMiss, PersistentLLMCache, get_llm_cache
+from core.llm_gateway import LLM_COMPLETION_TOKENS, llm_gateway
+
+
+def _hedge_run_manager(run_manager: Optional[AsyncCallbackManagerForLLMRun]) -> Optional[AsyncCallbackManagerForLLMRun]:
+    """A child run for the hedged duplicate: no handlers, so its tokens never mix into the caller's run"""
+    if run_manager is None:
+        return None
+    return AsyncCallbackManagerForLLMRun(
+        run_id=uuid4(),
+        handlers=[],
+        inheritable_handlers=[],
+        parent_run_id=run_manager.run_id,
+        tags=run_manager.tags,
+        metadata=run_manager.metadata,
+    )
+
+
+class GatewayChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose requests (including the ReAct agent's) go through the shared gateway.
+
+    The gateway owns retries, so the OpenAI client's own retries are off.
+    temperature=0 models answer repeated prompts from the persistent cache.
+    """
+
+    max_retries: int = 0
+
+    def __init__(self, **kwargs: Any):
+        # Only deterministic completions are worth keeping
+        if kwargs.get("temperature") == 0 and "cache" not in kwargs:
+            kwargs["cache"] = get_llm_cache()
+        super().__init__(**kwargs)
+
+    def _replay_miss(self, messages):
+        """LangChain checks the cache before generating, so reaching the API in replay mode is a miss"""
+        if isinstance(self.cache, PersistentLLMCache) and self.cache.mode == "replay":
+            preview = str(messages[-1].content)[:80] if messages else ""
+            raise LLMCacheMiss(f"No recorded completion for prompt: {preview}")
+
+    def _cost(self, messages) -> int:
+        """OpenAI counts prompt tokens plus the completion budget against tokens/min"""
+        prompt_chars = sum(len(str(message.content)) for message in messages)
+        return prompt_chars // 4 + (self.max_tokens or LLM_COMPLETION_TOKENS)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._replay_miss(messages)
+        generate = super()._generate
+        return llm_gateway.call_sync(lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                                     self._cost(messages))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._replay_miss(messages)
+        generate = super()._agenerate
+        hedge_manager = _hedge_run_manager(run_manager)
+        return await llm_gateway.call(lambda: generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                                      self._cost(messages),
+                                      hedge=lambda: generate(messages, stop=stop, run_manager=hedge_manager, **kwargs))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[Any]:
+        # LangChain does not consult the cache for streams, so do it here
+        cache = self.cache if isinstance(self.cache, PersistentLLMCache) else None
+        if cache is not None:
+            prompt, llm_string = dumps(messages), self._get_llm_string(stop=stop, **kwargs)
+            cached = await cache.alookup(prompt, llm_string)
+            if cached:
+                yield ChatGenerationChunk(message=AIMessageChunk(content=cached[0].text))
+                return
+            self._replay_miss(messages)
+
+        # Streams hold their slot until the last chunk; they are not hedged or retried mid-stream
+        pieces = []
+        await llm_gateway.acquire(self._cost(messages))
+        try:
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                pieces.append(chunk.text)
+                yield chunk
+        finally:
+            llm_gateway.release()
+        if cache is not None:
+            await cache.aupdate(prompt, llm_string, [ChatGeneration(message=AIMessage(content="".join(pieces)))])
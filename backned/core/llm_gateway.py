@@ -0,0 +1,370 @@
+# core/llm_gateway.py
+
+from contextvars import ContextVar
+from collections import deque
+from dotenv import load_dotenv
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import logging
+
+from core.executor import run_state_io
+from core.shared_state import get_shared_state
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Account limits the gateway keeps outbound calls under (0 disables a bucket)
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "160000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Load shedding: callers waiting longer than this, or beyond this queue depth, fail fast
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "200"))
+# Retries with full-jitter exponential backoff for 429s, timeouts and 5xx
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+# Send a duplicate request when the first has not answered after this many seconds (0 disables)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "6"))
+# Completion budget assumed for calls that do not set max_tokens
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "512"))
+
+PRIORITIES = {"interactive": 0, "batch": 1, "background": 2}
+
+# Priority class of the LLM calls made on behalf of the current request
+llm_priority: ContextVar[str] = ContextVar("llm_priority", default="interactive")
+
+
+class LLMOverloaded(Exception):
+    """Raised when a call is shed instead of queued past the latency budget"""
+
+
+def _retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, dropped connections and server errors are worth another attempt"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError", "TimeoutError")
+
+
+def _backoff(attempt: int) -> float:
+    """Full jitter: uniform over [0, min(max, base * 2^attempt)]"""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class TokenBucket:
+    """Refills continuously up to one minute's allowance"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, amount: float) -> float:
+        """Take amount and return 0.0, or return the seconds until it is available"""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill()
+        # A single request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            self.level -= amount
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def refund(self, amount: float):
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + min(amount, self.capacity))
+
+    def drain(self):
+        """Back off everyone after the provider returned a 429"""
+        if self.capacity > 0:
+            self._refill()
+            self.level = min(self.level, 0.0)
+
+    # The gateway awaits these, so a bucket kept outside the process never blocks the event loop
+
+    async def atry_take(self, amount: float) -> float:
+        return self.try_take(amount)
+
+    async def arefund(self, amount: float):
+        self.refund(amount)
+
+    async def adrain(self):
+        self.drain()
+
+
+class SharedTokenBucket(TokenBucket):
+    """TokenBucket kept in the cross-worker store, so all workers draw on one account allowance"""
+
+    def __init__(self, name: str, per_minute: int, shared):
+        super().__init__(per_minute)
+        self.name = name
+        self._shared = shared
+
+    async def atry_take(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        try:
+            return await run_state_io(self._shared.take_bucket, self.name, self.capacity, self.rate,
+                                      min(amount, self.capacity))
+        except Exception as e:
+            logger.error(f"Shared rate limit unavailable, using this worker's bucket: {str(e)}")
+            return self.try_take(amount)
+
+    async def arefund(self, amount: float):
+        if self.capacity <= 0:
+            return
+        try:
+            await run_state_io(self._shared.refund_bucket, self.name, self.capacity, min(amount, self.capacity))
+        except Exception as e:
+            logger.error(f"Shared rate limit unavailable, using this worker's bucket: {str(e)}")
+            self.refund(amount)
+
+    async def adrain(self):
+        if self.capacity <= 0:
+            return
+        try:
+            await run_state_io(self._shared.drain_bucket, self.name)
+        except Exception as e:
+            logger.error(f"Shared rate limit unavailable, using this worker's bucket: {str(e)}")
+            self.drain()
+
+
+class LLMGateway:
+    """Admits outbound LLM calls by priority under request and token budgets"""
+
+    def __init__(self):
+        shared = get_shared_state()
+        if shared is not None:
+            # Several workers: the account limits apply to their sum, not to each one
+            self._requests = SharedTokenBucket("llm_requests", LLM_REQUESTS_PER_MINUTE, shared)
+            self._tokens = SharedTokenBucket("llm_tokens", LLM_TOKENS_PER_MINUTE, shared)
+        else:
+            self._requests = TokenBucket(LLM_REQUESTS_PER_MINUTE)
+            self._tokens = TokenBucket(LLM_TOKENS_PER_MINUTE)
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._inflight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._admitting: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waits: deque = deque(maxlen=500)
+        self._stats = {
+            "admitted": 0, "shed": 0, "timed_out": 0, "retries": 0, "rate_limited": 0,
+            "hedges": 0, "hedge_wins": 0, "max_queue_depth": 0,
+        }
+
+    def bind_loop(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Remember the serving loop so calls from worker threads can queue on it"""
+        self._loop = loop or asyncio.get_running_loop()
+
+    async def _take(self, cost: int) -> float:
+        """Take one request and cost tokens from the buckets; 0.0 when both were taken, else seconds to wait"""
+        wait = await self._requests.atry_take(1)
+        if wait > 0:
+            return wait
+        wait = await self._tokens.atry_take(cost)
+        if wait > 0:
+            await self._requests.arefund(1)
+        return wait
+
+    def _dispatch(self):
+        """Start admitting waiting callers unless that is already under way"""
+        if self._admitting is None or self._admitting.done():
+            self._admitting = asyncio.ensure_future(self._admit())
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    async def _admit(self):
+        """Admit waiting callers in priority order while concurrency and both buckets allow"""
+        while self._queue and self._inflight < LLM_MAX_CONCURRENCY:
+            entry = self._queue[0]
+            cost, future = entry[2], entry[3]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = await self._take(cost)
+            if wait > 0:
+                # Head of line waits so lower classes cannot overtake it
+                self._timer = asyncio.get_running_loop().call_later(wait, self._on_timer)
+                return
+            if future.done():
+                # Timed out or cancelled while the buckets were consulted
+                await self._requests.arefund(1)
+                await self._tokens.arefund(cost)
+                continue
+            # The heap may have changed while the buckets were consulted
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self._inflight += 1
+            future.set_result(None)
+
+    async def acquire(self, cost: int, priority: Optional[str] = None, wait: bool = True) -> bool:
+        """Wait for a slot; with wait=False only take one that is free right now"""
+        priority = priority or llm_priority.get()
+        if not wait:
+            if self._queue or self._inflight >= LLM_MAX_CONCURRENCY or await self._take(cost) > 0:
+                return False
+            self._inflight += 1
+            return True
+
+        if len(self._queue) >= LLM_MAX_QUEUE:
+            self._stats["shed"] += 1
+            raise LLMOverloaded(f"LLM queue is full ({len(self._queue)} waiting)")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (PRIORITIES.get(priority, 0), next(self._sequence), cost, future, priority)
+        heapq.heappush(self._queue, entry)
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+        start = time.monotonic()
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), LLM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self._forget(entry)
+                self._stats["timed_out"] += 1
+                raise LLMOverloaded(f"waited {LLM_QUEUE_TIMEOUT:.0f}s for an LLM slot")
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+                self._forget(entry)
+            elif not future.cancelled():
+                self.release()
+            raise
+        self._waits.append(time.monotonic() - start)
+        self._stats["admitted"] += 1
+        return True
+
+    def _forget(self, entry: tuple):
+        """Drop a waiter that gave up, so it no longer counts against LLM_MAX_QUEUE"""
+        try:
+            self._queue.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._queue)
+
+    def release(self):
+        self._inflight -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    async def _attempt(self, call: Callable[[], Awaitable[Any]], cost: int, priority: Optional[str]) -> Any:
+        """One admitted call with retries; the slot is held only while the request is in flight"""
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self.acquire(cost, priority)
+            try:
+                return await call()
+            except Exception as e:
+                if attempt >= LLM_MAX_RETRIES or not _retryable(e):
+                    raise
+                if getattr(e, "status_code", None) == 429:
+                    self._stats["rate_limited"] += 1
+                    await self._requests.adrain()
+                self._stats["retries"] += 1
+                delay = _backoff(attempt)
+                logger.warning(f"LLM call failed ({type(e).__name__}); retry {attempt + 1} in {delay:.2f}s")
+            finally:
+                self.release()
+            await asyncio.sleep(delay)
+
+    async def call(self, call: Callable[[], Awaitable[Any]], cost: int, priority: Optional[str] = None,
+                   hedge: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """Run call under the gateway, hedging it with a duplicate (hedge, default call) when it is slow"""
+        primary = asyncio.ensure_future(self._attempt(call, cost, priority))
+        if LLM_HEDGE_AFTER <= 0:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=LLM_HEDGE_AFTER)
+        if done:
+            return primary.result()
+        # Hedge only with spare capacity, so duplicates never queue ahead of real work
+        if not await self.acquire(cost, priority, wait=False):
+            return await primary
+        self._stats["hedges"] += 1
+        duplicate = asyncio.ensure_future((hedge or call)())
+        duplicate.add_done_callback(lambda _: self.release())
+
+        # The first success wins; a failure leaves the other request running
+        pending = {primary, duplicate}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if not task.cancelled() and task.exception() is None), None)
+                if winner is not None:
+                    if winner is duplicate:
+                        self._stats["hedge_wins"] += 1
+                    return winner.result()
+            # Both failed: report the original request's error
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            # Mark the losing error as retrieved
+            for task in (primary, duplicate):
+                if task.done() and not task.cancelled():
+                    task.exception()
+
+    def call_sync(self, call: Callable[[], Any], cost: int, priority: Optional[str] = None) -> Any:
+        """Blocking variant for worker threads: queues on the serving loop, retries in the thread"""
+        loop = self._loop
+        if loop is None or not loop.is_running() or _on_loop(loop):
+            return call()
+        # Resolve the class here: the acquire coroutine runs in the loop's context, not this thread's
+        priority = priority or llm_priority.get()
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            asyncio.run_coroutine_threadsafe(self.acquire(cost, priority), loop).result()
+            try:
+                return call()
+            except Exception as e:
+                if attempt >= LLM_MAX_RETRIES or not _retryable(e):
+                    raise
+                self._stats["retries"] += 1
+                delay = _backoff(attempt)
+            finally:
+                loop.call_soon_threadsafe(self.release)
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, wait percentiles and retry/hedge counters for /health"""
+        waits = sorted(self._waits)
+        queued: Dict[str, int] = {}
+        for *_, future, priority in self._queue:
+            if not future.done():
+                queued[priority] = queued.get(priority, 0) + 1
+        return {
+            **self._stats,
+            "queued": queued,
+            "queue_depth": sum(queued.values()),
+            "inflight": self._inflight,
+            "wait_p50": round(waits[len(waits) // 2], 3) if waits else 0.0,
+            "wait_p95": round(waits[int(len(waits) * 0.95)], 3) if waits else 0.0,
+        }
+
+
+def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,148 @@
+# core/plan_cache.py
+
+from collections import OrderedDict
+from dotenv import load_dotenv
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import re
+import threading
+import logging
+
+from core.answer_cache import normalize_question
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "1024"))
+
+# Literal patterns recognised in questions, most specific first
+ENTITY_PATTERNS = [
+    ("client_id", re.compile(r"\bC\d{2,}\b", re.IGNORECASE)),
+    ("transaction_id", re.compile(r"\bT\d{2,}\b", re.IGNORECASE)),
+    ("date", re.compile(r"\b\d{4}-\d{2}-\d{2}\b")),
+    ("number", re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")),
+]
+
+# Kinds rendered inside SQL string literals (quotes must be escaped when binding)
+STRING_KINDS = {"client_id", "transaction_id", "date", "stock_name", "rm_name"}
+
+
+def _slot(index: int) -> str:
+    return f"__slot{index}__"
+
+
+class PlanCache:
+    """Cache of generated SQL stored as templates keyed by question shape.
+
+    Literals in the question (client ids, dates, stock and RM names, numbers)
+    are replaced with typed placeholders to form the shape. A template is only
+    stored when every literal appears exactly once in the SQL, so binding new
+    values can never touch unrelated parts of the query.
+    """
+
+    def __init__(self, max_entries: int = PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._templates: "OrderedDict[str, Tuple[str, Tuple[str, ...], Optional[str]]]" = OrderedDict()
+        self._vocabulary: List[Tuple[str, re.Pattern, str]] = []
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "uncacheable": 0}
+
+    def set_vocabulary(self, vocabulary: Dict[str, Iterable[str]]):
+        """Register known column values (e.g. stock and RM names) to recognise in questions"""
+        entries = []
+        for kind, values in vocabulary.items():
+            for value in values:
+                if value:
+                    pattern = re.compile(rf"(?<!\w){re.escape(value)}(?!\w)", re.IGNORECASE)
+                    entries.append((kind, pattern, value))
+        # Longest names first so "HDFC Bank" wins over "HDFC"
+        entries.sort(key=lambda entry: len(entry[2]), reverse=True)
+        self._vocabulary = entries
+
+    def extract_entities(self, question: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """Return the question shape and the (kind, canonical value) literals in order"""
+        spans = []
+
+        def free(start, end):
+            return all(end <= s or start >= e for s, e, _, _ in spans)
+
+        for kind, pattern, canonical in self._vocabulary:
+            for match in pattern.finditer(question):
+                if free(match.start(), match.end()):
+                    spans.append((match.start(), match.end(), kind, canonical))
+
+        for kind, pattern in ENTITY_PATTERNS:
+            for match in pattern.finditer(question):
+                if free(match.start(), match.end()):
+                    value = match.group(0).upper() if kind in ("client_id", "transaction_id") else match.group(0)
+                    spans.append((match.start(), match.end(), kind, value))
+
+        spans.sort()
+        shape, cursor, entities = [], 0, []
+        for start, end, kind, value in spans:
+            shape.append(question[cursor:start])
+            shape.append(f" __{kind}__ ")
+            cursor = end
+            entities.append((kind, value))
+        shape.append(question[cursor:])
+
+        return normalize_question("".join(shape)), entities
+
+    def lookup(self, question: str) -> Optional[str]:
+        """Return SQL bound to this question's literals, or None on a miss"""
+        plan = self.lookup_plan(question)
+        return plan["sql"] if plan else None
+
+    def lookup_plan(self, question: str) -> Optional[Dict[str, Optional[str]]]:
+        """Return {"sql", "answer_template"} for this question, or None on a miss"""
+        shape, entities = self.extract_entities(question)
+
+        with self._lock:
+            cached = self._templates.get(shape)
+            if cached is None or tuple(kind for kind, _ in entities) != cached[1]:
+                self._stats["misses"] += 1
+                return None
+            self._templates.move_to_end(shape)
+            self._stats["hits"] += 1
+            template, _, answer_template = cached
+
+        sql_query = template
+        for index, (kind, value) in enumerate(entities):
+            rendered = value.replace("'", "''") if kind in STRING_KINDS else value
+            sql_query = sql_query.replace(_slot(index), rendered)
+        return {"sql": sql_query, "answer_template": answer_template}
+
+    def store(self, question: str, sql_query: str, answer_template: Optional[str] = None) -> bool:
+        """Templatize SQL generated for this question; returns False if it is unsafe to reuse.
+
+        An answer template is kept only when it mentions none of the question's
+        literals, since those would be wrong for the next question of this shape.
+        """
+        shape, entities = self.extract_entities(question)
+
+        template = sql_query
+        for index, (kind, value) in enumerate(entities):
+            pattern = re.compile(rf"(?<![\w.]){re.escape(value)}(?![\w.])", re.IGNORECASE if kind in STRING_KINDS else 0)
+            if len(pattern.findall(template)) != 1:
+                with self._lock:
+                    self._stats["uncacheable"] += 1
+                return False
+            template = pattern.sub(_slot(index), template)
+
+        if answer_template and any(value.lower() in answer_template.lower() for _, value in entities):
+            answer_template = None
+
+        with self._lock:
+            self._templates[shape] = (template, tuple(kind for kind, _ in entities), answer_template)
+            self._templates.move_to_end(shape)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+            self._stats["stored"] += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for /health"""
+        with self._lock:
+            return {**self._stats, "templates": len(self._templates)}
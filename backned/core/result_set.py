@@ -0,0 +1,97 @@
+# core/result_set.py
+
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows included when a result is rendered as text for logs or LLM prompts
+TEXT_PREVIEW_ROWS = 50
+
+
+def _dtype(values: Sequence[Any]) -> str:
+    """Column type from its first non-null value"""
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return "bool"
+        if isinstance(value, int):
+            return "int64"
+        if isinstance(value, (float, Decimal)):
+            return "float64"
+        if isinstance(value, datetime):
+            return "datetime"
+        if isinstance(value, date):
+            return "date"
+        if isinstance(value, str):
+            return "string"
+        return "object"
+    return "null"
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _json_value(item) for key, item in value.items()}
+    return str(value)
+
+
+class ResultSet:
+    """Columnar query result: column names, dtypes and one value array per column"""
+
+    def __init__(self, columns: List[str], dtypes: List[str], data: List[List[Any]]):
+        self.columns = columns
+        self.dtypes = dtypes
+        self.data = data
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Mapping[str, Any]], columns: Optional[List[str]] = None) -> "ResultSet":
+        """Pivot row mappings (SQL rows, MongoDB documents) into columns"""
+        if columns is None:
+            columns = []
+            for row in rows:
+                for key in row:
+                    if key not in columns:
+                        columns.append(key)
+        data = [[row.get(column) for row in rows] for column in columns]
+        return cls(columns, [_dtype(values) for values in data], data)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Row dicts, for formatters that work a record at a time"""
+        return [dict(zip(self.columns, values)) for values in zip(*self.data)]
+
+    def to_json(self) -> Dict[str, Any]:
+        """JSON-ready columnar payload for the frontend"""
+        return {
+            "columns": self.columns,
+            "dtypes": self.dtypes,
+            "data": [[_json_value(value) for value in values] for values in self.data],
+            "row_count": self.row_count,
+        }
+
+    def to_text(self, max_rows: int = TEXT_PREVIEW_ROWS) -> str:
+        """Compact tab-separated rendering for logs and LLM prompts"""
+        if not self.row_count:
+            return ""
+        lines = ["\t".join(self.columns)]
+        for row in list(zip(*self.data))[:max_rows]:
+            lines.append("\t".join("" if value is None else str(_json_value(value)) for value in row))
+        if self.row_count > max_rows:
+            lines.append(f"... {self.row_count - max_rows} more rows")
+        return "\n".join(lines)
+
@@ -0,0 +1,230 @@
+# core/shared_state.py
+
+from dotenv import load_dotenv
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Number of server processes (the variable gunicorn and most PaaS launchers use); "auto" means one per core
+_web_concurrency = os.getenv("WEB_CONCURRENCY", "1").lower()
+WEB_CONCURRENCY = (os.cpu_count() or 1) if _web_concurrency == "auto" else int(_web_concurrency)
+# Cross-worker state for the answer cache, LLM rate limits and single-flight: 1, 0 or auto (on with >1 worker)
+SHARED_STATE = os.getenv("SHARED_STATE", "auto").lower()
+SHARED_STATE_ENABLED = SHARED_STATE == "1" or (SHARED_STATE == "auto" and WEB_CONCURRENCY > 1)
+# tmpfs when available, so the store lives in shared memory rather than on disk
+_default_dir = Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())
+SHARED_STATE_PATH = Path(os.getenv("SHARED_STATE_PATH", _default_dir / "valuefy-shared-state.sqlite3"))
+# A worker that dies mid-computation stops holding its followers after this long
+SHARED_FLIGHT_LEASE = float(os.getenv("SHARED_FLIGHT_LEASE", "120"))
+# Finished results stay readable this long for followers that poll just after completion
+SHARED_FLIGHT_RETENTION = 10.0
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, version TEXT NOT NULL, "
+    "value TEXT NOT NULL, stored_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS flights (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL, "
+    "result TEXT, finished_at REAL)",
+)
+
+
+class SharedState:
+    """Small SQLite store shared by every worker process on the host.
+
+    Holds the state that must not be multiplied by the worker count: cached
+    answers, the LLM token buckets and in-progress computations.
+    """
+
+    def __init__(self, path: Path = SHARED_STATE_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._stats = {"answer_hits": 0, "answer_writes": 0, "errors": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are per process as well as per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _transaction(self, work):
+        """Run work(conn) under the database write lock"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def reset(self):
+        """Forget answers and flights from a previous deployment (called once in the master)"""
+        conn = self._conn()
+        for table in ("answers", "flights", "buckets"):
+            conn.execute(f"DELETE FROM {table}")
+
+    # Answer cache
+
+    def get_answer(self, key: str, version: str, ttl: float) -> Optional[Any]:
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM answers WHERE key = ? AND version = ? AND stored_at >= ?",
+                (key, version, time.time() - ttl),
+            ).fetchone()
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Shared answer lookup failed: {str(e)}")
+            return None
+        if row is None:
+            return None
+        self._stats["answer_hits"] += 1
+        return json.loads(row[0])
+
+    def put_answer(self, key: str, version: str, value: Any):
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO answers (key, version, value, stored_at) VALUES (?, ?, ?, ?)",
+                (key, version, json.dumps(value, default=str), time.time()),
+            )
+            self._stats["answer_writes"] += 1
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Shared answer write failed: {str(e)}")
+
+    def trim_answers(self, max_entries: int, ttl: float):
+        """Drop expired answers and the oldest beyond max_entries"""
+        try:
+            self._conn().execute(
+                "DELETE FROM answers WHERE stored_at < ? OR key NOT IN "
+                "(SELECT key FROM answers ORDER BY stored_at DESC LIMIT ?)",
+                (time.time() - ttl, max_entries),
+            )
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Shared answer trim failed: {str(e)}")
+
+    def clear_answers(self):
+        self._conn().execute("DELETE FROM answers")
+
+    # Token buckets
+
+    def take_bucket(self, name: str, capacity: float, rate: float, amount: float) -> float:
+        """Refill the named bucket and take amount in one atomic UPDATE; 0.0 when taken, else seconds to wait"""
+        conn = self._conn()
+        params = {"name": name, "capacity": capacity, "rate": rate, "amount": amount, "now": time.time()}
+        conn.execute("INSERT OR IGNORE INTO buckets (name, level, updated) VALUES (:name, :capacity, :now)", params)
+        taken = conn.execute(
+            "UPDATE buckets SET level = MIN(:capacity, level + (:now - updated) * :rate) - :amount, updated = :now "
+            "WHERE name = :name AND MIN(:capacity, level + (:now - updated) * :rate) >= :amount",
+            params,
+        ).rowcount
+        if taken:
+            return 0.0
+        level = conn.execute(
+            "SELECT MIN(:capacity, level + (:now - updated) * :rate) FROM buckets WHERE name = :name", params
+        ).fetchone()[0]
+        # Another worker may have refilled it in between; look again shortly rather than never
+        return max((amount - level) / rate, 0.01)
+
+    def refund_bucket(self, name: str, capacity: float, amount: float):
+        """Give back tokens taken for a call that was not made"""
+        self._conn().execute("UPDATE buckets SET level = MIN(?, level + ?) WHERE name = ?", (capacity, amount, name))
+
+    def drain_bucket(self, name: str):
+        self._conn().execute("UPDATE buckets SET level = MIN(level, 0), updated = ? WHERE name = ?",
+                             (time.time(), name))
+
+    # Single-flight
+
+    def claim_flight(self, key: str, owner: str) -> Tuple[str, Optional[Any]]:
+        """("leader", None) for the first worker, ("follower", None) while another computes, ("done", result) after"""
+        def work(conn):
+            now = time.time()
+            conn.execute(
+                "DELETE FROM flights WHERE key = ? AND (expires < ? OR finished_at < ?)",
+                (key, now, now - SHARED_FLIGHT_RETENTION),
+            )
+            row = conn.execute("SELECT owner, result FROM flights WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO flights (key, owner, expires) VALUES (?, ?, ?)",
+                             (key, owner, now + SHARED_FLIGHT_LEASE))
+                return "leader", None
+            if row[1] is not None:
+                return "done", json.loads(row[1])
+            return "follower", None
+
+        try:
+            return self._transaction(work)
+        except Exception as e:
+            # Without the store every worker just computes on its own
+            self._stats["errors"] += 1
+            logger.error(f"Shared flight claim failed: {str(e)}")
+            return "leader", None
+
+    def flight_status(self, key: str) -> Tuple[str, Optional[Any]]:
+        """("running", None), ("done", result) or ("gone", None) when the leader failed or expired"""
+        try:
+            row = self._conn().execute("SELECT result, expires FROM flights WHERE key = ?", (key,)).fetchone()
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Shared flight lookup failed: {str(e)}")
+            return "gone", None
+        if row is None or (row[0] is None and row[1] < time.time()):
+            return "gone", None
+        if row[0] is None:
+            return "running", None
+        return "done", json.loads(row[0])
+
+    def finish_flight(self, key: str, owner: str, result: Optional[Any] = None):
+        """Publish the leader's result, or release the lease so followers compute themselves"""
+        try:
+            if result is None:
+                self._conn().execute("DELETE FROM flights WHERE key = ? AND owner = ?", (key, owner))
+            else:
+                self._conn().execute(
+                    "UPDATE flights SET result = ?, finished_at = ? WHERE key = ? AND owner = ?",
+                    (json.dumps(result, default=str), time.time(), key, owner),
+                )
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.error(f"Shared flight update failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and table sizes for /health"""
+        stats: Dict[str, Any] = {"enabled": SHARED_STATE_ENABLED, "workers": WEB_CONCURRENCY, **self._stats}
+        if not SHARED_STATE_ENABLED:
+            return stats
+        try:
+            conn = self._conn()
+            stats["answers"] = conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            stats["flights"] = conn.execute("SELECT COUNT(*) FROM flights WHERE result IS NULL").fetchone()[0]
+        except Exception as e:
+            stats["error"] = str(e)
+        return stats
+
+
+shared_state = SharedState()
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """The cross-worker store, or None when running a single worker"""
+    return shared_state if SHARED_STATE_ENABLED else None
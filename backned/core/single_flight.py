@@ -0,0 +1,100 @@
+# core/single_flight.py
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+import os
+import asyncio
+import logging
+
+from core.executor import run_state_io
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How often a worker checks on a computation another worker is running (seconds)
+SHARED_FLIGHT_POLL = float(os.getenv("SHARED_FLIGHT_POLL", "0.05"))
+
+
+class SingleFlight:
+    """Share one in-progress computation between concurrent callers with the same key.
+
+    The computation runs as its own task, so a caller that disconnects does not
+    cancel the work the other waiters are sharing. With a shared store
+    (core.shared_state) the same holds across worker processes; only results
+    accepted by publish are handed to the other workers.
+    """
+
+    def __init__(self, shared: Optional[Any] = None, publish: Callable[[Any], bool] = lambda result: True):
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self._waiters: Dict[str, int] = {}
+        self._shared = shared
+        self._publish = publish
+        self._stats = {"leaders": 0, "collapsed": 0, "max_waiters": 0, "remote_collapsed": 0}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run func for the first caller of a key; later callers await the same result"""
+        shared = self.join(key)
+        if shared is not None:
+            return await shared
+
+        task = asyncio.ensure_future(func() if self._shared is None else self._lead(key, func))
+        self._inflight[key] = task
+        self._waiters[key] = 1
+        self._stats["leaders"] += 1
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    async def _lead(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Compute for this worker, unless another worker is already computing the same key"""
+        # Workers are forked from one master, so the pid tells them apart
+        owner = f"{os.getpid()}:{id(self)}"
+        state, result = await run_state_io(self._shared.claim_flight, key, owner)
+        if state == "follower":
+            state, result = await self._await_remote(key)
+        if state == "done":
+            self._stats["remote_collapsed"] += 1
+            logger.info(f"Used another worker's result for '{key}'")
+            return result
+
+        try:
+            result = await func()
+        except BaseException:
+            await run_state_io(self._shared.finish_flight, key, owner)
+            raise
+        # A failure only releases the lease, so the next caller computes afresh
+        await run_state_io(self._shared.finish_flight, key, owner, result if self._publish(result) else None)
+        return result
+
+    async def _await_remote(self, key: str):
+        """Poll the shared store until the other worker publishes its result or gives up"""
+        while True:
+            await asyncio.sleep(SHARED_FLIGHT_POLL)
+            state, result = await run_state_io(self._shared.flight_status, key)
+            if state != "running":
+                return state, result
+
+    def join(self, key: str) -> Optional[Awaitable[Any]]:
+        """Await an in-flight computation for key without starting one; None if nothing is running"""
+        task = self._inflight.get(key)
+        if task is None:
+            return None
+        self._waiters[key] += 1
+        self._stats["collapsed"] += 1
+        self._stats["max_waiters"] = max(self._stats["max_waiters"], self._waiters[key])
+        logger.info(f"Joined in-flight computation for '{key}' ({self._waiters[key]} waiters)")
+        return asyncio.shield(task)
+
+    def _finish(self, key: str, task: "asyncio.Task[Any]"):
+        self._inflight.pop(key, None)
+        self._waiters.pop(key, None)
+        # Mark the error as retrieved even if every waiter went away
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Shared computation for '{key}' failed: {str(task.exception())}")
+
+    def stats(self) -> Dict[str, int]:
+        """Collapsed-request counters for /health"""
+        total = self._stats["leaders"] + self._stats["collapsed"]
+        return {
+            **self._stats,
+            "inflight": len(self._inflight),
+            "collapse_ratio": round(self._stats["collapsed"] / total, 3) if total else 0.0,
+        }
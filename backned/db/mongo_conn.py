@@ -1,7 +1,9 @@
 # db/mongo_conn.py
 
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import threading
 from dotenv import load_dotenv
 import logging
 
@@ -10,55 +12,171 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Client options shared by the sync and async drivers
+CLIENT_OPTIONS = {
+    "serverSelectionTimeoutMS": 5000,  # 5 second timeout
+    "connectTimeoutMS": 10000,         # 10 second connection timeout
+    "socketTimeoutMS": 20000,          # 20 second socket timeout
+    "retryWrites": True,               # Enable retryable writes
+    "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "10")),  # Connection pool size
+    "minPoolSize": 0,                  # Open connections on demand, not at import
+}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts pool events so /health can report connection usage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checked_out": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+        }
+
+    def _bump(self, key, delta=1):
+        with self._lock:
+            self.stats[key] += delta
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump("connections_created")
+
+    def connection_closed(self, event):
+        self._bump("connections_closed")
+
+    def connection_check_out_failed(self, event):
+        self._bump("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._bump("checkouts")
+        self._bump("checked_out")
+
+    def connection_checked_in(self, event):
+        self._bump("checked_out", -1)
+
+    def snapshot(self):
+        """Current counters plus the number of open connections"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["open_connections"] = stats["connections_created"] - stats["connections_closed"]
+        return stats
+
+
+# Process-wide client registry: created on first use, one pool per driver
+_registry = {"sync": None, "async": None}
+_listeners = {"sync": PoolStatsListener(), "async": PoolStatsListener()}
+_registry_lock = threading.Lock()
+
+
+def _mongo_settings():
+    """Return (uri, database, collection) from the environment"""
+    uri = os.getenv("MONGODB_URI")
+    if not uri:
+        logger.warning("MONGODB_URI not provided - MongoDB not available")
+        raise Exception("MONGODB_URI not provided")
+    
+    # Parse database and collection names from URI or use defaults
+    db_name = os.getenv("MONGODB_DATABASE", "valuefy")
+    collection_name = os.getenv("MONGODB_COLLECTION", "clients")
+    return uri, db_name, collection_name
+
+
+def set_mongo_client(client, kind: str = "sync"):
+    """Install a client (e.g. mongomock.MongoClient() or one for a local mongod) in the registry"""
+    with _registry_lock:
+        _registry[kind] = client
+
+
+def get_mongo_client():
+    """Return the shared MongoClient, connecting lazily on first use"""
+    client = _registry["sync"]
+    if client is not None:
+        return client
+    
+    uri, _, _ = _mongo_settings()
+    with _registry_lock:
+        if _registry["sync"] is None:
+            logger.info("Creating shared MongoDB client")
+            _registry["sync"] = MongoClient(uri, event_listeners=[_listeners["sync"]], **CLIENT_OPTIONS)
+        return _registry["sync"]
+
+
+def get_async_mongo_client():
+    """Return the shared motor client, connecting lazily on first use"""
+    client = _registry["async"]
+    if client is not None:
+        return client
+    
+    uri, _, _ = _mongo_settings()
+    with _registry_lock:
+        if _registry["async"] is None:
+            logger.info("Creating shared async MongoDB client")
+            _registry["async"] = AsyncIOMotorClient(uri, event_listeners=[_listeners["async"]], **CLIENT_OPTIONS)
+        return _registry["async"]
+
+
 def get_mongo_collection():
-    """Get MongoDB collection with proper error handling and cloud support"""
+    """Get the clients collection from the shared client"""
     try:
-        # Get MongoDB URI from environment
-        uri = os.getenv("MONGODB_URI")
-        
-        if not uri:
-            logger.warning("MONGODB_URI not provided - MongoDB not available")
-            raise Exception("MONGODB_URI not provided")
-        
-        # Parse database and collection names from URI or use defaults
-        db_name = os.getenv("MONGODB_DATABASE", "valuefy")
-        collection_name = os.getenv("MONGODB_COLLECTION", "clients")
-        
-        logger.info(f"Connecting to MongoDB: {uri}")
-        logger.info(f"Database: {db_name}, Collection: {collection_name}")
-        
-        # Create MongoDB client with proper configuration
-        client = MongoClient(
-            uri,
-            serverSelectionTimeoutMS=5000,  # 5 second timeout
-            connectTimeoutMS=10000,        # 10 second connection timeout
-            socketTimeoutMS=20000,         # 20 second socket timeout
-            retryWrites=True,              # Enable retryable writes
-            maxPoolSize=10,                # Connection pool size
-            minPoolSize=1                  # Minimum connections
-        )
-        
-        # Test the connection
-        client.admin.command('ping')
-        logger.info("MongoDB connection successful")
-        
-        # Get database and collection
-        db = client[db_name]
-        collection = db[collection_name]
-        
-        return collection
+        _, db_name, collection_name = _mongo_settings()
+        return get_mongo_client()[db_name][collection_name]
         
     except Exception as e:
         logger.error(f"MongoDB connection failed: {str(e)}")
         raise Exception(f"Failed to connect to MongoDB: {str(e)}")
 
+
+def get_async_mongo_collection():
+    """Get the clients collection through the async (motor) driver"""
+    _, db_name, collection_name = _mongo_settings()
+    return get_async_mongo_client()[db_name][collection_name]
+
+
+def close_mongo_clients():
+    """Close every registered client (called on shutdown)"""
+    with _registry_lock:
+        for kind, client in _registry.items():
+            if client is not None:
+                client.close()
+                _registry[kind] = None
+    logger.info("MongoDB clients closed")
+
+
+def get_mongo_pool_stats():
+    """Connection pool statistics for each registered client"""
+    return {
+        kind: {"initialized": _registry[kind] is not None, **_listeners[kind].snapshot()}
+        for kind in _registry
+    }
+
 def test_mongodb_connection():
     """Test MongoDB connection and return status"""
     try:
         collection = get_mongo_collection()
+        collection.database.client.admin.command('ping')
         
-        # Test basic operations
-        count = collection.count_documents({})
+        # Metadata-based count: no collection scan on every probe
+        count = collection.estimated_document_count()
         logger.info(f"MongoDB test successful - {count} documents found")
         
         return {
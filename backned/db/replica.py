@@ -0,0 +1,232 @@
+# db/replica.py
+
+from collections import Counter
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlglot import exp
+from typing import Any, Dict, List, Optional, Sequence
+import os
+import time
+import threading
+import numpy as np
+import logging
+
+from db.rollups import WATERMARK_SQL
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Where generated SQL runs: "live" (MySQL) or "replica" (in-process DuckDB copy of transactions)
+SQL_EXECUTION_ENGINE = os.getenv("SQL_EXECUTION_ENGINE", "live").lower()
+REPLICA_REFRESH_INTERVAL = int(os.getenv("REPLICA_REFRESH_INTERVAL", "30"))
+# A replica not refreshed for this long is bypassed and queries go to MySQL
+REPLICA_MAX_STALENESS = float(os.getenv("REPLICA_MAX_STALENESS", "120"))
+# Periodic reload from scratch; created_at deltas cannot see updates and deletes
+REPLICA_FULL_RELOAD_INTERVAL = float(os.getenv("REPLICA_FULL_RELOAD_INTERVAL", "3600"))
+# Rows fetched from MySQL and appended to the replica per batch
+REPLICA_FETCH_ROWS = int(os.getenv("REPLICA_FETCH_ROWS", "50000"))
+
+REPLICA_TABLE = "transactions"
+# NOCASE text columns compare, group and LIKE-match case-insensitively, as MySQL's default collation does
+REPLICA_DDL = (
+    "CREATE TABLE transactions (transaction_id VARCHAR COLLATE NOCASE, client_id VARCHAR COLLATE NOCASE, "
+    "stock_name VARCHAR COLLATE NOCASE, amount_invested DOUBLE, date_ DATE, rm_name VARCHAR COLLATE NOCASE, "
+    "created_at TIMESTAMP)"
+)
+INSERT_SQL = (
+    "INSERT INTO transactions SELECT transaction_id, client_id, stock_name, amount_invested, "
+    "CAST(date_ AS DATE), rm_name, created_at FROM batch"
+)
+# Rows stamped with the previous high-water timestamp are already in the replica
+INSERT_NEW_SQL = INSERT_SQL + (
+    " WHERE transaction_id NOT IN (SELECT transaction_id FROM transactions WHERE created_at >= ?)"
+)
+
+SELECT_COLUMNS = "transaction_id, client_id, stock_name, amount_invested, date_, rm_name, created_at"
+FULL_LOAD_SQL = f"SELECT {SELECT_COLUMNS} FROM transactions WHERE created_at <= :until OR created_at IS NULL"
+DELTA_SQL = f"SELECT {SELECT_COLUMNS} FROM transactions WHERE created_at >= :since AND created_at <= :until"
+
+
+def _connect():
+    try:
+        import duckdb
+    except ImportError:
+        raise RuntimeError("duckdb is required for SQL_EXECUTION_ENGINE=replica (pip install duckdb)")
+    conn = duckdb.connect(":memory:")
+    conn.execute(REPLICA_DDL)
+    return conn
+
+
+def _pad_space(statement: exp.Query) -> exp.Query:
+    """MySQL ignores trailing spaces when comparing strings with = and IN; drop them from the literals"""
+    for literal in list(statement.find_all(exp.Literal)):
+        parent = literal.parent
+        if literal.is_string and isinstance(parent, (exp.EQ, exp.NEQ, exp.In)) and literal.this != literal.this.rstrip(" "):
+            literal.replace(exp.Literal.string(literal.this.rstrip(" ")))
+    return statement
+
+
+def _to_columns(rows: Sequence[Sequence[Any]]) -> Dict[str, np.ndarray]:
+    """Pivot fetched rows into the NumPy arrays DuckDB scans directly"""
+    transaction_id, client_id, stock_name, amount, date_, rm_name, created_at = zip(*rows)
+    return {
+        "transaction_id": np.array(transaction_id, dtype=object),
+        "client_id": np.array(client_id, dtype=object),
+        "stock_name": np.array(stock_name, dtype=object),
+        "amount_invested": np.array([np.nan if value is None else float(value) for value in amount], dtype="float64"),
+        "date_": np.array(date_, dtype="datetime64[us]"),
+        "rm_name": np.array(rm_name, dtype=object),
+        "created_at": np.array(created_at, dtype="datetime64[us]"),
+    }
+
+
+def _append(replica, rows: Sequence[Sequence[Any]], since: Any = None) -> int:
+    """Insert one fetched batch; returns how many rows were new"""
+    before = replica.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    replica.register("batch", _to_columns(rows))
+    try:
+        if since is None:
+            replica.execute(INSERT_SQL)
+        else:
+            replica.execute(INSERT_NEW_SQL, [since])
+    finally:
+        replica.unregister("batch")
+    return replica.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] - before
+
+
+class TransactionsReplica:
+    """Columnar in-process copy of transactions, refreshed on created_at and queried with DuckDB"""
+
+    def __init__(self):
+        self._replica = None
+        self._refresh_lock = threading.Lock()
+        self.row_count = 0
+        self.high_water = None
+        self.refreshed_at = 0.0
+        self.loaded_at = 0.0
+        self._stats = {"full_loads": 0, "incremental_refreshes": 0, "rows_applied": 0, "queries": 0, "fallbacks": 0,
+                       "interrupted": 0}
+
+    def is_fresh(self) -> bool:
+        return self._replica is not None and time.time() - self.refreshed_at <= REPLICA_MAX_STALENESS
+
+    def refresh(self, engine) -> Dict[str, Any]:
+        """Append rows created since the last refresh, reloading when counts no longer line up"""
+        with self._refresh_lock:
+            start = time.time()
+            with engine.connect() as conn:
+                count, until = conn.execute(text(WATERMARK_SQL)).fetchone()
+                if self._replica is None or time.time() - self.loaded_at > REPLICA_FULL_RELOAD_INTERVAL:
+                    mode = self._load(conn, until)
+                elif until == self.high_water and count == self.row_count:
+                    mode = "unchanged"
+                else:
+                    mode = self._apply_delta(conn, until)
+                    if self.row_count != count:
+                        # Deleted rows, or rows whose created_at went backwards
+                        logger.info(f"Replica drifted ({self.row_count} vs {count} rows); reloading")
+                        mode = self._load(conn, until)
+            self.refreshed_at = time.time()
+
+        elapsed = f"{(time.time() - start) * 1000:.1f}ms"
+        if mode != "unchanged":
+            logger.info(f"Transactions replica refreshed ({mode}) in {elapsed}: {self.row_count} rows")
+        return {"mode": mode, "refresh_time": elapsed, "rows": self.row_count}
+
+    def _load(self, conn, until) -> str:
+        # Build beside the current copy so queries keep running until the swap
+        replica = _connect()
+        row_count = 0
+        result = conn.execution_options(stream_results=True).execute(text(FULL_LOAD_SQL), {"until": until})
+        while True:
+            rows = result.fetchmany(REPLICA_FETCH_ROWS)
+            if not rows:
+                break
+            row_count += _append(replica, rows)
+
+        self._replica, self.row_count, self.high_water = replica, row_count, until
+        self.loaded_at = time.time()
+        self._stats["full_loads"] += 1
+        return "full"
+
+    def _apply_delta(self, conn, until) -> str:
+        applied = 0
+        result = conn.execution_options(stream_results=True).execute(
+            text(DELTA_SQL), {"since": self.high_water, "until": until}
+        )
+        while True:
+            rows = result.fetchmany(REPLICA_FETCH_ROWS)
+            if not rows:
+                break
+            applied += _append(self._replica, rows, since=self.high_water)
+
+        self.row_count += applied
+        self.high_water = until
+        self._stats["incremental_refreshes"] += 1
+        self._stats["rows_applied"] += applied
+        return "incremental"
+
+    def query(self, statement: exp.Query, timeout_ms: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Run a read-only query on the replica as row dicts; None sends it to MySQL instead.
+
+        Self-joins and joins without a condition are left to MySQL, whose EXPLAIN
+        budget applies there; anything still running after timeout_ms is interrupted.
+        """
+        replica = self._replica
+        if replica is None or not self.is_fresh():
+            return None
+        ctes = list(statement.find_all(exp.CTE))
+        references = Counter(table.name for table in statement.find_all(exp.Table))
+        if set(references) - {cte.alias for cte in ctes} != {REPLICA_TABLE}:
+            return None
+        # Each further reference to a CTE over transactions scans it again
+        scans = references[REPLICA_TABLE] + sum(
+            references[cte.alias] - 1 for cte in ctes
+            if any(table.name == REPLICA_TABLE for table in cte.find_all(exp.Table))
+        )
+        if scans > 1 or any(not join.args.get("on") and not join.args.get("using")
+                            for join in statement.find_all(exp.Join)):
+            logger.info("Replica does not run self-joins or joins without a condition; using MySQL")
+            return None
+
+        sql_query = _pad_space(statement.copy()).sql(dialect="duckdb")
+        # A cursor is a separate connection to the same in-memory database, safe to use per thread
+        cursor = replica.cursor()
+        # The replica runs inside the API worker, so it gets the same time bound as MAX_EXECUTION_TIME
+        timer = threading.Timer(timeout_ms / 1000, cursor.interrupt) if timeout_ms else None
+        try:
+            if timer is not None:
+                timer.start()
+            result = cursor.execute(sql_query)
+            columns = [column[0] for column in result.description]
+            rows = [dict(zip(columns, row)) for row in result.fetchall()]
+        except Exception as e:
+            if type(e).__name__ == "InterruptException":
+                self._stats["interrupted"] += 1
+                logger.warning(f"Replica query interrupted after {timeout_ms}ms: {sql_query}")
+            self._stats["fallbacks"] += 1
+            logger.info(f"Replica could not run query ({str(e).splitlines()[0]}); using MySQL")
+            return None
+        finally:
+            if timer is not None:
+                timer.cancel()
+            cursor.close()
+
+        self._stats["queries"] += 1
+        logger.info(f"Answered from transactions replica: {sql_query}")
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        """Replica freshness and usage counters for /health"""
+        return {
+            **self._stats,
+            "engine": SQL_EXECUTION_ENGINE,
+            "rows": self.row_count,
+            "fresh": self.is_fresh(),
+            "age": round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None,
+        }
+
+
+transactions_replica = TransactionsReplica()
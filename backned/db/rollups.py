@@ -0,0 +1,307 @@
+# db/rollups.py
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlglot import exp
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import time
+import sqlglot
+import threading
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# How often the rollups pick up new transactions (seconds, 0 disables them)
+ROLLUP_REFRESH_INTERVAL = int(os.getenv("ROLLUP_REFRESH_INTERVAL", "30"))
+# Rollups not refreshed for this long are ignored and questions go to MySQL
+ROLLUP_MAX_STALENESS = float(os.getenv("ROLLUP_MAX_STALENESS", "120"))
+# Periodic rebuild from scratch; created_at deltas cannot see updates and deletes
+ROLLUP_FULL_REBUILD_INTERVAL = float(os.getenv("ROLLUP_FULL_REBUILD_INTERVAL", "3600"))
+
+DIMENSIONS = ("client_id", "stock_name", "rm_name", "month")
+# Grouping sets kept in memory; a query reads the smallest one covering its filters and groups
+ROLLUPS = {
+    "client_month": ("client_id", "month"),
+    "rm_stock": ("rm_name", "stock_name"),
+    "client_stock": ("client_id", "stock_name"),
+    "base": DIMENSIONS,
+}
+# Columns generated SQL may filter or group on to be answerable from the rollups
+SQL_DIMENSIONS = ("client_id", "stock_name", "rm_name")
+
+WATERMARK_SQL = "SELECT COUNT(*), MAX(created_at) FROM transactions"
+FULL_LOAD_SQL = (
+    "SELECT client_id, stock_name, rm_name, date_, COUNT(*), SUM(amount_invested) FROM transactions "
+    "WHERE created_at <= :until OR created_at IS NULL GROUP BY client_id, stock_name, rm_name, date_"
+)
+DELTA_SQL = (
+    "SELECT transaction_id, client_id, stock_name, rm_name, date_, amount_invested, created_at "
+    "FROM transactions WHERE created_at >= :since AND created_at <= :until"
+)
+BOUNDARY_SQL = "SELECT transaction_id FROM transactions WHERE created_at = :until"
+
+
+def _month(value: Any) -> Optional[str]:
+    return str(value)[:7] if value is not None else None
+
+
+def _match_key(value: Any) -> str:
+    """MySQL's default collation compares case-insensitively and ignores trailing spaces"""
+    return str(value).strip().lower()
+
+
+def _empty_cubes() -> Dict[str, Dict[Tuple, List[float]]]:
+    return {name: {} for name in ROLLUPS}
+
+
+def _add(cubes: Dict[str, Dict[Tuple, List[float]]], values: Dict[str, Any], count: int, total: float):
+    for name, dims in ROLLUPS.items():
+        cell = cubes[name].setdefault(tuple(values[dim] for dim in dims), [0, 0.0])
+        cell[0] += count
+        cell[1] += total
+
+
+class RollupStore:
+    """In-memory count/sum rollups of transactions, refreshed incrementally on created_at"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._cubes = _empty_cubes()
+        self.row_count = 0
+        self.high_water = None
+        self._boundary_ids: set = set()
+        self.refreshed_at = 0.0
+        self.rebuilt_at = 0.0
+        self._stats = {"full_rebuilds": 0, "incremental_refreshes": 0, "rows_applied": 0, "hits": 0, "misses": 0}
+
+    def is_fresh(self) -> bool:
+        return self.refreshed_at > 0 and time.time() - self.refreshed_at <= ROLLUP_MAX_STALENESS
+
+    def refresh(self, engine) -> Dict[str, Any]:
+        """Apply rows created since the last refresh, rebuilding when counts no longer line up"""
+        with self._refresh_lock:
+            start = time.time()
+            with engine.connect() as conn:
+                count, until = conn.execute(text(WATERMARK_SQL)).fetchone()
+                if self.rebuilt_at == 0 or time.time() - self.rebuilt_at > ROLLUP_FULL_REBUILD_INTERVAL:
+                    mode = self._rebuild(conn, until)
+                elif until == self.high_water and count == self.row_count:
+                    mode = "unchanged"
+                else:
+                    mode = self._apply_delta(conn, until)
+                    if self.row_count != count:
+                        # Deleted rows, or rows whose created_at went backwards
+                        logger.info(f"Rollups drifted ({self.row_count} vs {count} rows); rebuilding")
+                        mode = self._rebuild(conn, until)
+            self.refreshed_at = time.time()
+
+        elapsed = f"{(time.time() - start) * 1000:.1f}ms"
+        if mode != "unchanged":
+            logger.info(f"Rollups refreshed ({mode}) in {elapsed}: {self.row_count} transactions")
+        return {"mode": mode, "refresh_time": elapsed, "rows": self.row_count}
+
+    def _rebuild(self, conn, until) -> str:
+        cubes = _empty_cubes()
+        row_count = 0
+        for client_id, stock_name, rm_name, date_, count, total in conn.execute(text(FULL_LOAD_SQL), {"until": until}):
+            values = {"client_id": client_id, "stock_name": stock_name, "rm_name": rm_name, "month": _month(date_)}
+            _add(cubes, values, count, float(total or 0))
+            row_count += count
+        boundary = {row[0] for row in conn.execute(text(BOUNDARY_SQL), {"until": until})} if until is not None else set()
+
+        with self._lock:
+            self._cubes = cubes
+            self.row_count = row_count
+            self.high_water = until
+            self._boundary_ids = boundary
+        self.rebuilt_at = time.time()
+        self._stats["full_rebuilds"] += 1
+        return "full"
+
+    def _apply_delta(self, conn, until) -> str:
+        rows = conn.execute(text(DELTA_SQL), {"since": self.high_water, "until": until}).fetchall()
+        with self._lock:
+            applied = 0
+            for transaction_id, client_id, stock_name, rm_name, date_, amount, created_at in rows:
+                # Rows stamped with the previous high-water second were loaded last time
+                if created_at == self.high_water and transaction_id in self._boundary_ids:
+                    continue
+                values = {"client_id": client_id, "stock_name": stock_name, "rm_name": rm_name, "month": _month(date_)}
+                _add(self._cubes, values, 1, float(amount or 0))
+                applied += 1
+            self.row_count += applied
+            if until != self.high_water:
+                self._boundary_ids = set()
+            self._boundary_ids.update(row[0] for row in rows if row[6] == until)
+            self.high_water = until
+        self._stats["incremental_refreshes"] += 1
+        self._stats["rows_applied"] += applied
+        return "incremental"
+
+    def aggregate(self, filters: Dict[str, Any], group_by: Tuple[str, ...] = ()) -> Optional[Dict[Tuple, List[float]]]:
+        """{group values: [count, total]} for matching transactions, or None when the rollups can't answer"""
+        needed = set(filters) | set(group_by)
+        if not self.is_fresh() or not needed <= set(DIMENSIONS):
+            self._stats["misses"] += 1
+            return None
+
+        wanted = {dim: _match_key(value) for dim, value in filters.items()}
+        groups: Dict[Tuple, List[float]] = {}
+        with self._lock:
+            name = min((name for name, dims in ROLLUPS.items() if needed <= set(dims)),
+                       key=lambda name: len(self._cubes[name]))
+            dims = ROLLUPS[name]
+            positions = {dim: dims.index(dim) for dim in needed}
+            for key, (count, total) in self._cubes[name].items():
+                if any(_match_key(key[positions[dim]]) != value for dim, value in wanted.items()):
+                    continue
+                cell = groups.setdefault(tuple(key[positions[dim]] for dim in group_by), [0, 0.0])
+                cell[0] += count
+                cell[1] += total
+
+        if not group_by and not groups:
+            groups[()] = [0, 0.0]
+        self._stats["hits"] += 1
+        return groups
+
+    def answer_sql(self, sql_query: str) -> Optional[Tuple[List[str], List[tuple]]]:
+        """Answer a simple COUNT/SUM/AVG over transactions from the rollups as (columns, rows)"""
+        if not self.is_fresh():
+            return None
+        plan = match_aggregate_sql(sql_query)
+        if plan is None:
+            return None
+        groups = self.aggregate(plan["filters"], plan["group_by"])
+        if groups is None:
+            return None
+
+        rows = []
+        for key, (count, total) in groups.items():
+            values = dict(zip(plan["group_by"], key))
+            row = []
+            for kind, column in plan["outputs"]:
+                if kind == "dim":
+                    row.append(values[column])
+                elif kind == "count":
+                    row.append(count)
+                elif kind == "sum":
+                    row.append(total if count else None)
+                else:
+                    row.append(total / count if count else None)
+            rows.append(tuple(row))
+
+        for index, descending in reversed(plan["order"]):
+            rows.sort(key=lambda row: (row[index] is None, row[index]), reverse=descending)
+        if plan["limit"] is not None:
+            rows = rows[:plan["limit"]]
+        logger.info(f"Answered from rollups: {sql_query}")
+        return [name for name, _ in plan["columns"]], rows
+
+    def stats(self) -> Dict[str, Any]:
+        """Rollup freshness and hit counters for /health"""
+        return {
+            **self._stats,
+            "rows": self.row_count,
+            "cells": {name: len(cube) for name, cube in self._cubes.items()},
+            "fresh": self.is_fresh(),
+            "age": round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None,
+        }
+
+
+def _aggregate_kind(node: exp.Expression) -> Optional[Tuple[str, Optional[str]]]:
+    """Classify one projection: a grouped column, COUNT(*), or SUM/AVG of amount_invested"""
+    if isinstance(node, exp.Column):
+        return ("dim", node.name) if node.name in SQL_DIMENSIONS else None
+    if isinstance(node, exp.Count):
+        argument = node.this
+        if isinstance(argument, exp.Star) or (isinstance(argument, exp.Literal) and not argument.is_string):
+            return ("count", None)
+        return None
+    if isinstance(node, (exp.Sum, exp.Avg)) and isinstance(node.this, exp.Column) \
+            and node.this.name == "amount_invested":
+        return ("sum" if isinstance(node, exp.Sum) else "avg", None)
+    return None
+
+
+def _equality_filters(condition: Optional[exp.Expression]) -> Optional[Dict[str, Any]]:
+    """column = 'literal' conditions joined by AND, or None for anything else"""
+    filters: Dict[str, Any] = {}
+    if condition is None:
+        return filters
+    for part in condition.flatten() if isinstance(condition, exp.And) else [condition]:
+        part = part.unnest()
+        if not isinstance(part, exp.EQ):
+            return None
+        column, literal = part.this, part.expression
+        if isinstance(column, exp.Literal):
+            column, literal = literal, column
+        if not isinstance(column, exp.Column) or column.name not in SQL_DIMENSIONS \
+                or not isinstance(literal, exp.Literal) or column.name in filters:
+            return None
+        filters[column.name] = literal.this
+    return filters
+
+
+def match_aggregate_sql(sql_query: str) -> Optional[Dict[str, Any]]:
+    """Describe a rollup-shaped aggregate query, or None when it needs the base table"""
+    try:
+        statement = sqlglot.parse_one(sql_query, read="mysql")
+    except Exception:
+        return None
+    if not isinstance(statement, exp.Select):
+        return None
+    if any(statement.args.get(arg) for arg in ("joins", "having", "with", "distinct", "laterals")):
+        return None
+    tables = list(statement.find_all(exp.Table))
+    if len(tables) != 1 or tables[0].name != "transactions" or statement.find(exp.Subquery):
+        return None
+
+    filters = _equality_filters(statement.args["where"].this if statement.args.get("where") else None)
+    if filters is None:
+        return None
+
+    group_by: List[str] = []
+    group = statement.args.get("group")
+    for node in group.expressions if group else []:
+        if not isinstance(node, exp.Column) or node.name not in SQL_DIMENSIONS:
+            return None
+        group_by.append(node.name)
+
+    outputs, columns = [], []
+    for projection in statement.expressions:
+        node = projection.unalias()
+        kind = _aggregate_kind(node)
+        if kind is None or (kind[0] == "dim" and kind[1] not in group_by):
+            return None
+        outputs.append(kind)
+        columns.append((projection.alias or node.sql(dialect="mysql"), node))
+    if not any(kind != "dim" for kind, _ in outputs):
+        return None
+
+    order = []
+    ordering = statement.args.get("order")
+    for ordered in ordering.expressions if ordering else []:
+        target = ordered.this
+        index = next((i for i, (name, node) in enumerate(columns)
+                      if target == node or (isinstance(target, exp.Column) and target.name == name)), None)
+        if index is None:
+            return None
+        order.append((index, bool(ordered.args.get("desc"))))
+
+    limit = None
+    if statement.args.get("limit") is not None:
+        value = statement.args["limit"].expression
+        if not isinstance(value, exp.Literal) or value.is_string or statement.args.get("offset"):
+            return None
+        limit = int(value.this)
+
+    return {"filters": filters, "group_by": tuple(group_by), "outputs": outputs,
+            "columns": columns, "order": order, "limit": limit}
+
+
+rollup_store = RollupStore()
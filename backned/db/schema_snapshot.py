@@ -0,0 +1,269 @@
+# db/schema_snapshot.py
+
+from dotenv import load_dotenv
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import text
+import hashlib
+import json
+import os
+import time
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+SCHEMA_SNAPSHOT_DIR = Path(os.getenv("SCHEMA_SNAPSHOT_DIR", Path(__file__).resolve().parent.parent / ".schema_cache"))
+# Columns/fields with at most this many (repeating) distinct values have them listed in prompts
+SCHEMA_ENUM_LIMIT = int(os.getenv("SCHEMA_ENUM_LIMIT", "12"))
+# Number of documents sampled to infer the MongoDB layout
+MONGO_SAMPLE_SIZE = int(os.getenv("MONGO_SAMPLE_SIZE", "200"))
+# A persisted MongoDB snapshot older than this (seconds) is resampled
+MONGO_SNAPSHOT_MAX_AGE = float(os.getenv("MONGO_SNAPSHOT_MAX_AGE", "86400"))
+# Listed values and MIN/MAX ranges go stale as data arrives, so MySQL snapshots are re-read after this long
+MYSQL_SNAPSHOT_MAX_AGE = float(os.getenv("MYSQL_SNAPSHOT_MAX_AGE", "3600"))
+# Rows read per MySQL table to profile its columns; whole-table COUNT/DISTINCT/MIN/MAX scans are never run
+SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", "10000"))
+
+# Fields never worth spending prompt tokens on
+MONGO_SKIP_FIELDS = {"_id"}
+TEXT_TYPES = ("char", "varchar", "enum", "text")
+RANGE_TYPES = ("date", "timestamp", "decimal", "int", "float", "double")
+
+
+def _snapshot_path(name: str) -> Path:
+    return SCHEMA_SNAPSHOT_DIR / f"{name}.json"
+
+
+def _save(name: str, snapshot: Dict[str, Any]):
+    """Persist a snapshot atomically so concurrent workers never read a partial file"""
+    try:
+        SCHEMA_SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        path = _snapshot_path(name)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(snapshot, default=str, indent=1))
+        tmp.replace(path)
+    except Exception as e:
+        logger.error(f"Failed to persist schema snapshot {name}: {str(e)}")
+
+
+def _load(name: str) -> Optional[Dict[str, Any]]:
+    path = _snapshot_path(name)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text())
+    except Exception as e:
+        logger.error(f"Ignoring unreadable schema snapshot {path}: {str(e)}")
+        return None
+
+
+def _is_categorical(distinct: int, occurrences: int) -> bool:
+    """Few values that repeat (unlike names or ids) are worth listing"""
+    return 0 < distinct <= SCHEMA_ENUM_LIMIT and distinct * 2 <= occurrences
+
+
+def _hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------- MySQL
+
+def introspect_mysql(engine, include_tables: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Read tables, column types and keys from information_schema and profile a sample of each table.
+
+    Row counts and distinct counts are information_schema estimates; listed values
+    and ranges come from the first SCHEMA_SAMPLE_ROWS rows, or from the index when
+    the column leads one (a loose index scan or a MIN/MAX lookup, never a table scan).
+    """
+    wanted = set(include_tables) if include_tables is not None else None
+    tables: Dict[str, Any] = {}
+    with engine.connect() as conn:
+        columns = conn.execute(text(
+            "SELECT table_name, column_name, column_type, column_key "
+            "FROM information_schema.columns WHERE table_schema = DATABASE() "
+            "ORDER BY table_name, ordinal_position"
+        )).fetchall()
+
+        for table_name, column_name, column_type, column_key in columns:
+            if wanted is not None and table_name not in wanted:
+                continue
+            table = tables.setdefault(table_name, {"columns": []})
+            table["columns"].append({
+                "name": column_name,
+                "type": str(column_type),
+                "key": column_key or "",
+            })
+
+        estimates = dict(conn.execute(text(
+            "SELECT table_name, table_rows FROM information_schema.tables WHERE table_schema = DATABASE()"
+        )).fetchall())
+        # Columns that lead an index, with the index's cardinality estimate
+        indexed = {(table_name, column_name): cardinality for table_name, column_name, cardinality in conn.execute(text(
+            "SELECT table_name, column_name, MAX(cardinality) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND seq_in_index = 1 GROUP BY table_name, column_name"
+        ))}
+
+        for table_name, table in tables.items():
+            names = ", ".join(f"`{column['name']}`" for column in table["columns"])
+            sample = conn.execute(text(f"SELECT {names} FROM `{table_name}` LIMIT :limit"),
+                                  {"limit": SCHEMA_SAMPLE_ROWS}).fetchall()
+            # A short sample is the whole table, which beats the estimate
+            complete = len(sample) < SCHEMA_SAMPLE_ROWS
+            table["rows"] = len(sample) if complete else int(estimates.get(table_name) or len(sample))
+
+            for position, column in enumerate(table["columns"]):
+                name = column["name"]
+                values = [row[position] for row in sample if row[position] is not None]
+                distinct = set(values)
+                cardinality = None if complete else indexed.get((table_name, name))
+                column["distinct"] = len(distinct) if cardinality is None else int(cardinality)
+                if column["key"] == "PRI":
+                    continue
+                if column["type"].startswith(TEXT_TYPES) and _is_categorical(len(distinct), len(values)):
+                    if cardinality is None:
+                        column["values"] = sorted(distinct)
+                        continue
+                    listed = [row[0] for row in conn.execute(
+                        text(f"SELECT DISTINCT `{name}` FROM `{table_name}` ORDER BY 1 LIMIT :limit"),
+                        {"limit": SCHEMA_ENUM_LIMIT + 1},
+                    )]
+                    if len(listed) <= SCHEMA_ENUM_LIMIT:
+                        column["values"] = listed
+                elif column["type"].startswith(RANGE_TYPES) and values:
+                    if cardinality is None:
+                        low, high = min(values), max(values)
+                    else:
+                        low, high = conn.execute(text(f"SELECT MIN(`{name}`), MAX(`{name}`) FROM `{table_name}`")).fetchone()
+                    column["range"] = [str(low), str(high)]
+
+    return {"tables": tables, "created_at": time.time()}
+
+
+def load_mysql_snapshot(engine, schema_hash: Optional[str], include_tables: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Return the snapshot for this schema hash, introspecting and persisting it when missing or stale"""
+    name = f"mysql_{schema_hash[:16]}" if schema_hash else None
+    if name:
+        snapshot = _load(name)
+        if snapshot and not snapshot_expired(snapshot):
+            logger.info(f"Loaded MySQL schema snapshot {name}")
+            return snapshot
+
+    snapshot = introspect_mysql(engine, include_tables)
+    if name:
+        _save(name, snapshot)
+    return snapshot
+
+
+def snapshot_expired(snapshot: Dict[str, Any], max_age: float = MYSQL_SNAPSHOT_MAX_AGE) -> bool:
+    """True when a snapshot's data-dependent values and ranges are too old to put in a prompt"""
+    return time.time() - snapshot.get("created_at", 0) >= max_age
+
+
+def render_mysql_tables(snapshot: Dict[str, Any]) -> Dict[str, str]:
+    """Token-minimal description per table: types, keys, listed values and ranges"""
+    rendered = {}
+    for table_name, table in snapshot["tables"].items():
+        parts = []
+        for column in table["columns"]:
+            part = f"{column['name']} {column['type']}"
+            if column.get("key") == "PRI":
+                part += " PK"
+            if "values" in column:
+                part += " {" + "|".join(str(value) for value in column["values"]) + "}"
+            elif "range" in column:
+                part += f" [{column['range'][0]}..{column['range'][1]}]"
+            elif column.get("distinct") is not None and column.get("key") != "PRI":
+                part += f" ~{column['distinct']} distinct"
+            parts.append(part)
+        rendered[table_name] = f"{table_name} (~{table.get('rows', '?')} rows): " + ", ".join(parts)
+    return rendered
+
+
+def render_mysql_schema(snapshot: Dict[str, Any]) -> str:
+    """Token-minimal description of every table, one line each"""
+    return "\n".join(render_mysql_tables(snapshot).values())
+
+
+# ---------------------------------------------------------------- MongoDB
+
+def _type_name(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, list):
+        inner = {_type_name(item) for item in value}
+        return f"[{inner.pop() if len(inner) == 1 else 'mixed'}]"
+    return type(value).__name__
+
+
+def sample_mongo(collection, sample_size: int = MONGO_SAMPLE_SIZE) -> Dict[str, Any]:
+    """Infer field types and low-cardinality values from a random sample of documents"""
+    docs: List[Dict[str, Any]] = list(collection.aggregate([{"$sample": {"size": sample_size}}]))
+    fields: Dict[str, Dict[str, Any]] = {}
+
+    for doc in docs:
+        for key, value in doc.items():
+            if key in MONGO_SKIP_FIELDS:
+                continue
+            field = fields.setdefault(key, {"types": set(), "values": set(), "numbers": [], "count": 0})
+            field["types"].add(_type_name(value))
+            items = value if isinstance(value, list) else [value]
+            field["count"] += len(items)
+            for item in items:
+                if isinstance(item, str):
+                    field["values"].add(item)
+                elif isinstance(item, (int, float)) and not isinstance(item, bool):
+                    field["values"].add(item)
+                    field["numbers"].append(item)
+
+    rendered: Dict[str, Any] = {}
+    for key, field in fields.items():
+        entry: Dict[str, Any] = {"type": "|".join(sorted(field["types"])), "distinct": len(field["values"])}
+        if _is_categorical(len(field["values"]), field["count"]):
+            entry["values"] = sorted(field["values"], key=str)
+        elif field["numbers"]:
+            entry["range"] = [min(field["numbers"]), max(field["numbers"])]
+        rendered[key] = entry
+
+    layout = {key: entry["type"] for key, entry in rendered.items()}
+    return {
+        "collection": collection.name,
+        "documents": collection.estimated_document_count(),
+        "fields": rendered,
+        "hash": _hash(layout),
+        "created_at": time.time(),
+    }
+
+
+def load_mongo_snapshot(collection) -> Dict[str, Any]:
+    """Return the persisted MongoDB snapshot, resampling when it is missing or stale"""
+    name = f"mongo_{collection.database.name}_{collection.name}"
+    snapshot = _load(name)
+    if snapshot and time.time() - snapshot.get("created_at", 0) < MONGO_SNAPSHOT_MAX_AGE:
+        logger.info(f"Loaded MongoDB schema snapshot {name}")
+        return snapshot
+
+    snapshot = sample_mongo(collection)
+    _save(name, snapshot)
+    return snapshot
+
+
+def render_mongo_schema(snapshot: Dict[str, Any]) -> str:
+    """Token-minimal description of the sampled collection"""
+    parts = []
+    for key, field in snapshot["fields"].items():
+        part = f"{key} {field['type']}"
+        if "values" in field:
+            part += " {" + "|".join(str(value) for value in field["values"]) + "}"
+        elif "range" in field:
+            part += f" [{field['range'][0]}..{field['range'][1]}]"
+        parts.append(part)
+    return f"{snapshot['collection']} (~{snapshot.get('documents', '?')} docs): " + ", ".join(parts)
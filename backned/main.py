@@ -1,17 +1,162 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
-import uvicorn
+from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import gc
+import hmac
+import json
+import logging
+import os
 import time
-from agents.mongo_agent import query_mongo
-from agents.sql_agent import query_sql_database
+from agents.router import classify_question, router
+from core.answer_cache import AnswerCache, build_embedder, normalize_question
+from core.executor import run_blocking, run_state_io, install_default_executor
+from core.health import HealthProber
+from core.lazy_import import ensure_loaded, lazy_import
+from core.llm_gateway import llm_gateway, llm_priority
+from core.shared_state import get_shared_state, shared_state
+from core.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# LangChain, OpenAI and the database drivers are imported in the background warm-up
+# (or by the first request that needs them), so the port is bound without waiting for them
+fast_path = lazy_import("agents.fast_path")
+mongo_agent = lazy_import("agents.mongo_agent")
+sql_agent = lazy_import("agents.sql_agent")
+llm_cache = lazy_import("core.llm_cache")
+rollups = lazy_import("db.rollups")
+replica = lazy_import("db.replica")
+mysql_conn = lazy_import("db.mysql_conn")
+mongo_conn = lazy_import("db.mongo_conn")
+AGENT_MODULES = (fast_path, mongo_agent, sql_agent, llm_cache, rollups, replica, mysql_conn, mongo_conn)
+
+# How often the background task checks whether the MySQL schema changed (seconds, 0 disables)
+SCHEMA_CHECK_INTERVAL = int(os.getenv("SQL_SCHEMA_CHECK_INTERVAL", "300"))
+# Largest batch accepted by /ask/batch and how many of its questions are computed at once
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "50"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "4"))
+# Token required by /admin endpoints (X-Admin-Token header); without one they only answer localhost
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+LOCAL_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+async def watch_sql_schema():
+    """Periodically rebuild the shared SQL agent when the schema changes"""
+    while True:
+        await asyncio.sleep(SCHEMA_CHECK_INTERVAL)
+        try:
+            result = await run_blocking(sql_agent.reload_sql_agent)
+            if result["reloaded"]:
+                router.set_vocabulary(sql_agent.get_sql_agent().vocabulary)
+                logger.info(f"SQL agent rebuilt after schema change (warm-up {result['warmup_time']})")
+        except Exception as e:
+            logger.error(f"Schema watch failed: {str(e)}")
+
+
+async def maintain_copy(store, interval: int):
+    """Keep an in-process copy of transactions (rollups, replica) current with new rows"""
+    while True:
+        try:
+            agent = await run_blocking(sql_agent.get_sql_agent)
+            if agent.db:
+                await run_blocking(store.refresh, agent.db._engine)
+        except Exception as e:
+            logger.error(f"{type(store).__name__} refresh failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+
+async def current_data_version():
+    """Watermark of both stores; any change invalidates cached answers"""
+    sql_version = await run_blocking(sql_agent.get_transactions_watermark)
+    mongo_version = await mongo_agent.aget_clients_watermark()
+    return (sql_version, mongo_version)
+
 
+answer_cache = AnswerCache(version_provider=current_data_version, embedder=build_embedder(), shared=get_shared_state())
+health_prober = HealthProber()
+# Other workers only reuse answers that succeeded, like the answer cache
+single_flight = SingleFlight(shared=get_shared_state(), publish=lambda payload: bool(payload.get("ok")))
+warmup_stats = {"done": False, "warmup_time": None, "started_at": time.time()}
+
+
+def preload_workers():
+    """Build the read-only state in the master process, before workers are forked.
+
+    The schema snapshot, SQL agent and router vocabulary are then shared
+    copy-on-write by every worker instead of being rebuilt in each one.
+    """
+    for module in AGENT_MODULES:
+        module.load()
+    try:
+        agent = sql_agent.init_sql_agent()
+        router.set_vocabulary(agent.vocabulary)
+    except Exception as e:
+        logger.error(f"SQL agent preload failed: {str(e)}")
+    mongo_agent.get_mongo_schema_text()
+    if get_shared_state() is not None:
+        shared_state.reset()
+    # Sockets must not be shared across fork; each worker opens its own connections
+    mysql_conn.release_connections()
+    mongo_conn.close_mongo_clients()
+    # Keep the preloaded objects out of the workers' garbage collections, which would touch their pages
+    gc.freeze()
 
-app = FastAPI(title="Valuefy AI Portfolio Assistant", version="1.0.0")
+
+async def warm_up(tasks: List[asyncio.Task]):
+    """Import and build the agents after the port is bound, then start the loops that need them"""
+    start = time.time()
+    try:
+        await ensure_loaded(*AGENT_MODULES)
+    except Exception as e:
+        logger.error(f"Agent modules failed to import: {str(e)}")
+        return
+    try:
+        agent = await run_blocking(sql_agent.init_sql_agent)
+        router.set_vocabulary(agent.vocabulary)
+    except Exception as e:
+        # Serve anyway; the agent is built lazily on the first SQL question
+        logger.error(f"SQL agent warm-up failed: {str(e)}")
+    try:
+        await run_blocking(mongo_agent.get_mongo_schema_text)
+        await run_blocking(mongo_agent.get_llm)
+    except Exception as e:
+        logger.error(f"MongoDB agent warm-up failed: {str(e)}")
+
+    if SCHEMA_CHECK_INTERVAL > 0:
+        tasks.append(asyncio.create_task(watch_sql_schema()))
+    if rollups.ROLLUP_REFRESH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(maintain_copy(rollups.rollup_store, rollups.ROLLUP_REFRESH_INTERVAL)))
+    if replica.SQL_EXECUTION_ENGINE == "replica" and replica.REPLICA_REFRESH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(
+            maintain_copy(replica.transactions_replica, replica.REPLICA_REFRESH_INTERVAL)
+        ))
+    warmup_stats.update(done=True, warmup_time=f"{(time.time() - start):.2f}s")
+    logger.info(f"Background warm-up finished in {warmup_stats['warmup_time']}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start serving at once, warm up agents in the background and stop background tasks on shutdown"""
+    install_default_executor()
+    llm_gateway.bind_loop()
+    tasks = [asyncio.create_task(health_prober.run())]
+    tasks.append(asyncio.create_task(warm_up(tasks)))
+    yield
+    for task in tasks:
+        task.cancel()
+    if mysql_conn.loaded:
+        mysql_conn.dispose_engine()
+    if mongo_conn.loaded:
+        mongo_conn.close_mongo_clients()
+
+
+app = FastAPI(title="Valuefy AI Portfolio Assistant", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware for frontend
-import os
 allowed_origins = [
     "http://localhost:3000",  # Local development
     "http://localhost:5173",  # Vite dev server
@@ -39,54 +184,66 @@ class QuestionResponse(BaseModel):
     processing_time: Optional[str] = None
     visualization_data: Optional[dict] = None
 
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+
+class BatchAnswer(BaseModel):
+    question: str
+    answer: str
+    source: str
+    processing_time: Optional[str] = None
+    visualization_data: Optional[dict] = None
+
+class BatchResponse(BaseModel):
+    answers: List[BatchAnswer]
+    unique_questions: int
+    merged_queries: int
+    processing_time: Optional[str] = None
+
 @app.get("/")
 async def root():
     return {"message": "Valuefy AI Portfolio Assistant API", "status": "running"}
 
 @app.get("/health")
-async def health_check():
-    """Health check endpoint to verify all components are working"""
+async def health_check(deep: bool = False):
+    """Health check answered from the background probe; ?deep=1 forces a live probe"""
     try:
         # Check if environment variables are set
-        import os
         openai_key = os.getenv("OPENAI_API_KEY")
         mongodb_uri = os.getenv("MONGODB_URI")
         mysql_uri = os.getenv("MYSQL_URI")
         
-        # Test database connections
-        db_status = {}
-        
-        # Test MongoDB connection
-        try:
-            from db.mongo_conn import test_mongodb_connection
-            mongo_test = test_mongodb_connection()
-            if mongo_test["status"] == "connected":
-                db_status["mongodb"] = f"connected ({mongo_test['document_count']} docs)"
-            else:
-                db_status["mongodb"] = f"error: {mongo_test.get('error', 'Unknown error')[:100]}"
-        except Exception as e:
-            db_status["mongodb"] = f"error: {str(e)[:100]}"
-        
-        # Test MySQL connection
-        try:
-            from db.mysql_conn import connect_mysql
-            conn = connect_mysql()
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1")
-            cursor.close()
-            conn.close()
-            db_status["mysql"] = "connected"
-        except Exception as e:
-            db_status["mysql"] = f"error: {str(e)[:100]}"
+        if deep:
+            await health_prober.probe()
+        probe = health_prober.snapshot()
         
         status = {
             "status": "healthy",
             "openai_configured": bool(openai_key),
             "mongodb_configured": bool(mongodb_uri),
             "mysql_configured": bool(mysql_uri),
-            "database_status": db_status,
+            "database_status": probe["database_status"],
+            "checked_at": probe["checked_at"],
+            "probe_age": probe["age"],
+            "probe_time": probe["probe_time"],
+            "warmup": warmup_stats,
+            "llm_gateway": llm_gateway.stats(),
+            "answer_cache": answer_cache.stats(),
+            "single_flight": single_flight.stats(),
+            "shared_state": await run_state_io(shared_state.stats),
+            "worker_pid": os.getpid(),
             "timestamp": time.time()
         }
+        # Never import from /health; these appear once the warm-up has loaded them
+        if all(module.loaded for module in AGENT_MODULES):
+            status.update({
+                "sql_agent": sql_agent.get_sql_agent_stats(),
+                "llm_cache": llm_cache.llm_cache.stats(),
+                "rollups": rollups.rollup_store.stats(),
+                "replica": replica.transactions_replica.stats(),
+                "mysql_pool": mysql_conn.get_pool_stats(),
+                "mongo_pool": mongo_conn.get_mongo_pool_stats(),
+            })
         
         return status
     except Exception as e:
@@ -96,7 +253,69 @@ async def health_check():
             "timestamp": time.time()
         }
 
+def require_admin(request: Request, token: Optional[str]):
+    """Reject /admin calls without the admin token, or from other hosts when no token is configured"""
+    if ADMIN_TOKEN:
+        if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+    elif request.client is None or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Admin endpoints are only available from localhost")
+
+@app.post("/admin/reload")
+async def reload_agents(request: Request, force: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Rebuild the shared SQL agent without interrupting in-flight requests; ?force=1 rebuilds even if the schema is unchanged"""
+    require_admin(request, x_admin_token)
+    try:
+        await ensure_loaded(*AGENT_MODULES)
+        result = await run_blocking(sql_agent.reload_sql_agent, force)
+        router.set_vocabulary(sql_agent.get_sql_agent().vocabulary)
+        return result
+    except Exception as e:
+        logger.error(f"SQL agent reload failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Reload failed: {str(e)}")
+
+def build_visualization_data(question: str, payload: dict) -> Optional[dict]:
+    """Chart payload for the frontend: the typed result rows when the answer came with them"""
+    result = payload.get("result")
+    if result and result.get("row_count"):
+        return {
+            "type": "query_result",
+            "chart": payload.get("chart_hint") or "table",
+            "query": question,
+            "result": result
+        }
+    if any(keyword in question.lower() for keyword in ['top', 'portfolio', 'investor', 'manager']):
+        return {
+            "type": "portfolio_analysis",
+            "query": question
+        }
+    return None
 
+async def compute_answer(question: str, route: dict, embedding=None) -> dict:
+    """Answer one question as {"answer", "result", "chart_hint", "ok"} and cache it when it succeeded"""
+    payload = await fast_path.answer_fast_path(route) if route["fast_path"] else None
+    
+    if payload is None and route["store"] == "mongo":
+        # Use MongoDB agent for client/portfolio queries
+        mongo_response = await mongo_agent.aquery_mongo(question)
+        # Handle both string and dictionary responses from MongoDB agent
+        if isinstance(mongo_response, dict):
+            payload = {
+                "answer": mongo_response.get('answer', 'No response from MongoDB agent'),
+                "result": mongo_response.get("result"),
+                "chart_hint": mongo_response.get("chart_hint"),
+                "ok": mongo_response.get("ok", False),
+            }
+        else:
+            payload = {"answer": str(mongo_response), "ok": False}
+    elif payload is None:
+        # Use SQL agent for transaction queries
+        payload = await sql_agent.aanswer_sql_database(question)
+    
+    # Failures (DB outages, rejected queries, unparsable LLM output) are retried, never cached
+    if payload.get("ok"):
+        await answer_cache.put(question, payload, embedding)
+    return payload
 
 @app.post("/ask", response_model=QuestionResponse)
 async def ask_question(request: QuestionRequest):
@@ -108,21 +327,23 @@ async def ask_question(request: QuestionRequest):
         if not request.question or not request.question.strip():
             raise HTTPException(status_code=400, detail="Question cannot be empty")
         
-        # Determine which agent to use based on the question
-        question = request.question.lower()
+        # A request arriving during the warm-up waits for the agents without blocking the loop
+        await ensure_loaded(*AGENT_MODULES)
+        cached_answer, embedding = await answer_cache.get(request.question)
+        
+        # Classify the question: common intents are answered without any LLM call
+        route = classify_question(request.question)
+        logger.info(f"Route: {route}")
         
         try:
-            if any(keyword in question for keyword in ['portfolio', 'client', 'investor', 'risk', 'manager']):
-                # Use MongoDB agent for client/portfolio queries
-                mongo_response = query_mongo(request.question)
-                # Handle both string and dictionary responses from MongoDB agent
-                if isinstance(mongo_response, dict):
-                    response = mongo_response.get('answer', 'No response from MongoDB agent')
-                else:
-                    response = str(mongo_response)
-            else:
-                # Use SQL agent for transaction queries
-                response = query_sql_database(request.question)
+            payload = cached_answer
+            if payload is None:
+                # Identical questions already being answered share that computation
+                payload = await single_flight.do(
+                    normalize_question(request.question),
+                    lambda: compute_answer(request.question, route, embedding)
+                )
+            response = payload["answer"]
         except Exception as agent_error:
             # Log the actual error for debugging
             import logging
@@ -131,16 +352,12 @@ async def ask_question(request: QuestionRequest):
             logging.error(f"Agent traceback: {traceback.format_exc()}")
             # If agent fails, provide a fallback response
             response = f"Sorry, I encountered an error while processing your question: {str(agent_error)}. Please try rephrasing your question."
+            payload = {"answer": response}
         
         processing_time = f"{(time.time() - start_time):.2f}s"
         
         # Add visualization data for certain queries
-        visualization_data = None
-        if any(keyword in question for keyword in ['top', 'portfolio', 'investor', 'manager']):
-            visualization_data = {
-                "type": "portfolio_analysis",
-                "query": request.question
-            }
+        visualization_data = build_visualization_data(request.question, payload)
         
         return QuestionResponse(
             answer=response,
@@ -159,7 +376,165 @@ async def ask_question(request: QuestionRequest):
         logging.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def sse(event: str, data) -> str:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_answer(question: str):
+    """Emit routing, query, progress and answer-token events for one question"""
+    start_time = time.time()
+    tokens = []
+    payload = {}
+    
+    # Routing is local and immediate, so the first byte goes out before any I/O
+    route = classify_question(question)
+    yield sse("route", route)
+    
+    try:
+        await ensure_loaded(*AGENT_MODULES)
+        cached_answer, embedding = await answer_cache.get(question)
+        shared = single_flight.join(normalize_question(question)) if cached_answer is None else None
+        if shared is not None:
+            # The same question is already being answered; stream its result instead of recomputing
+            yield sse("coalesced", True)
+            cached_answer = await shared
+        if cached_answer is not None:
+            payload = cached_answer
+            if shared is None:
+                yield sse("cached", True)
+            if payload.get("result"):
+                yield sse("result", payload["result"])
+            tokens.append(payload["answer"])
+            yield sse("token", payload["answer"])
+        else:
+            payload = await fast_path.answer_fast_path(route) if route["fast_path"] else None
+            if payload is not None:
+                yield sse("result", payload["result"])
+                yield sse("chart", payload["chart_hint"])
+                tokens.append(payload["answer"])
+                yield sse("token", payload["answer"])
+            else:
+                payload = {}
+                events = mongo_agent.astream_mongo(question) if route["store"] == "mongo" else sql_agent.astream_sql_database(question)
+                async for event in events:
+                    if event["event"] == "token":
+                        tokens.append(event["data"])
+                    elif event["event"] == "result":
+                        payload["result"] = event["data"]
+                    elif event["event"] == "chart":
+                        payload["chart_hint"] = event["data"]
+                    elif event["event"] == "ok":
+                        payload["ok"] = True
+                    yield sse(event["event"], event["data"])
+            
+            payload["answer"] = "".join(tokens)
+            if payload.get("ok"):
+                await answer_cache.put(question, payload, embedding)
+    except Exception as e:
+        logger.error(f"Streaming error: {str(e)}")
+        yield sse("error", str(e))
+    
+    yield sse("done", {
+        "answer": "".join(tokens),
+        "processing_time": f"{(time.time() - start_time):.2f}s",
+        "visualization_data": build_visualization_data(question, payload)
+    })
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """Server-sent events variant of /ask that reports progress as it happens"""
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    
+    return StreamingResponse(
+        stream_answer(request.question),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def answer_batch_question(question: str, route: dict, embedding, limiter: asyncio.Semaphore) -> dict:
+    """Compute one batch question under the batch's concurrency limit"""
+    async with limiter:
+        start_time = time.time()
+        try:
+            payload = await single_flight.do(
+                normalize_question(question),
+                lambda: compute_answer(question, route, embedding)
+            )
+        except Exception as e:
+            logger.error(f"Batch question failed ({question}): {str(e)}")
+            payload = {"answer": f"Sorry, I encountered an error while processing your question: {str(e)}. Please try rephrasing your question."}
+        return dict(payload, processing_time=f"{(time.time() - start_time):.2f}s")
+
+@app.post("/ask/batch", response_model=BatchResponse)
+async def ask_question_batch(request: BatchQuestionRequest):
+    """Answer many questions at once, sharing cache lookups, scans and in-flight work"""
+    start_time = time.time()
+    # Interactive /ask traffic gets LLM capacity first
+    llm_priority.set("batch")
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(request.questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch")
+    if any(not question or not question.strip() for question in request.questions):
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    # Repeated questions in the batch are answered once
+    unique = {}
+    for question in request.questions:
+        unique.setdefault(normalize_question(question), question)
+
+    await ensure_loaded(*AGENT_MODULES)
+    payloads, sources, embeddings = {}, {}, {}
+    for key, question in unique.items():
+        cached_answer, embeddings[key] = await answer_cache.get(question)
+        if cached_answer is not None:
+            payloads[key] = dict(cached_answer, processing_time="0.00s")
+            sources[key] = "cache"
+
+    routes = {key: classify_question(unique[key]) for key in unique if key not in payloads}
+
+    # Counts and totals over transactions share a single scan
+    merge_start = time.time()
+    merged = await fast_path.answer_fast_path_batch(routes)
+    for key, payload in merged.items():
+        if payload.get("ok"):
+            await answer_cache.put(unique[key], payload, embeddings[key])
+        payloads[key] = dict(payload, processing_time=f"{(time.time() - merge_start):.2f}s")
+        sources[key] = "merged"
+
+    limiter = asyncio.Semaphore(ASK_BATCH_CONCURRENCY)
+    pending = [key for key in routes if key not in merged]
+    computed = await asyncio.gather(*(
+        answer_batch_question(unique[key], routes[key], embeddings[key], limiter) for key in pending
+    ))
+    for key, payload in zip(pending, computed):
+        payloads[key] = payload
+        sources[key] = "fast_path" if routes[key]["fast_path"] else routes[key]["store"]
+
+    answers = []
+    for question in request.questions:
+        key = normalize_question(question)
+        payload = payloads[key]
+        answers.append(BatchAnswer(
+            question=question,
+            answer=payload["answer"],
+            source=sources[key],
+            processing_time=payload.get("processing_time"),
+            visualization_data=build_visualization_data(question, payload)
+        ))
+
+    logger.info(f"Batch of {len(request.questions)} questions: {len(unique)} unique, "
+                f"{len(merged)} merged, {len(pending)} computed")
+    return BatchResponse(
+        answers=answers,
+        unique_questions=len(unique),
+        merged_queries=len(merged),
+        processing_time=f"{(time.time() - start_time):.2f}s"
+    )
+
 if __name__ == "__main__":
     import os
+    import uvicorn
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -30,6 +30,8 @@ CREATE INDEX idx_client_id ON transactions(client_id);
 CREATE INDEX idx_date ON transactions(date_);
 CREATE INDEX idx_stock_name ON transactions(stock_name);
 CREATE INDEX idx_rm_name ON transactions(rm_name);
+-- Data-version watermark and incremental rollup/replica refreshes read created_at
+CREATE INDEX idx_created_at ON transactions(created_at);
 
 -- Verify the data
 SELECT COUNT(*) as total_transactions FROM transactions;
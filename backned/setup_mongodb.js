@@ -91,6 +91,7 @@ db.clients.createIndex({ "risk_appetite": 1 });
 db.clients.createIndex({ "investment_preferences": 1 });
 db.clients.createIndex({ "rm_id": 1 });
 db.clients.createIndex({ "total_investment": -1 });
+db.clients.createIndex({ "created_at": -1 });
 
 // Verify the data
 print("Total clients:", db.clients.countDocuments({}));
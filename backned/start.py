@@ -23,6 +23,9 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Seconds a worker may stay silent before gunicorn restarts it (LLM calls can be slow)
+WORKER_TIMEOUT = int(os.environ.get("WORKER_TIMEOUT", 120))
+
 def check_environment():
     """Check if all required environment variables are set"""
     required_vars = ["OPENAI_API_KEY"]
@@ -45,6 +48,35 @@ def check_environment():
     logger.info("Environment check passed")
     return True
 
+def run_workers(host, port, workers):
+    """Serve with several worker processes forked from a master that preloaded the app"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # uvicorn spawns fresh interpreters, so each worker warms up on its own
+        logger.warning("gunicorn not installed - starting uvicorn workers without preloading")
+        import uvicorn
+        uvicorn.run("main:app", host=host, port=port, workers=workers, log_level="info", access_log=True)
+        return
+
+    class PreloadedApplication(BaseApplication):
+        """gunicorn application that imports and warms main.py once, before forking"""
+
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("timeout", WORKER_TIMEOUT)
+            self.cfg.set("accesslog", "-")
+
+        def load(self):
+            from main import app, preload_workers
+            preload_workers()
+            return app
+
+    PreloadedApplication().run()
+
 def main():
     """Main startup function"""
     logger.info("Starting Valuefy AI Portfolio Assistant...")
@@ -56,12 +88,19 @@ def main():
     
     # Import and run the app
     try:
-        import uvicorn
-        from main import app
+        from core.shared_state import WEB_CONCURRENCY
         
         port = int(os.environ.get("PORT", 8000))
         host = os.environ.get("HOST", "0.0.0.0")
         
+        if WEB_CONCURRENCY > 1:
+            logger.info(f"Starting {WEB_CONCURRENCY} workers on {host}:{port}")
+            run_workers(host, port, WEB_CONCURRENCY)
+            return
+        
+        import uvicorn
+        from main import app
+        
         logger.info(f"Starting server on {host}:{port}")
         
         uvicorn.run(
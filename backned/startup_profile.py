@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Valuefy AI Portfolio Assistant backend:
+an import-time profile of main.py (python -X importtime, summarized) and
+the time from launching start.py until the port accepts connections.
+"""
+
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+# Seconds from process start until the port must accept connections
+TARGET_SECONDS = float(os.environ.get("STARTUP_TARGET", 1.0))
+TOP_MODULES = int(os.environ.get("STARTUP_TOP", 15))
+# Packages that belong in the background warm-up, not on the startup path
+DEFERRED_PACKAGES = (
+    "langchain", "langchain_core", "langchain_openai", "langchain_community", "langsmith",
+    "openai", "pymongo", "motor", "mysql", "sqlalchemy", "sqlglot", "numpy", "duckdb",
+)
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def profile_imports():
+    """Return [(module, depth, self_us, cumulative_us)] for `import main`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    if result.returncode != 0:
+        print(f"❌ import main failed:\n{result.stderr[-2000:]}")
+    return modules
+
+
+def report_imports(modules):
+    """Print total time, the slowest modules and time per top-level package"""
+    total_us = sum(cumulative for _, depth, _, cumulative in modules if depth == 0)
+    main_us = next((cumulative for name, _, _, cumulative in modules if name == "main"), 0)
+    print(f"📦 {len(modules)} modules imported in {total_us / 1e6:.2f}s ({main_us / 1e6:.2f}s for main)")
+
+    print(f"\nSlowest {TOP_MODULES} modules (self time):")
+    for name, _, self_us, cumulative_us in sorted(modules, key=lambda m: m[2], reverse=True)[:TOP_MODULES]:
+        print(f"  {self_us / 1000:8.1f}ms  (cumulative {cumulative_us / 1000:8.1f}ms)  {name}")
+
+    packages = defaultdict(int)
+    for name, _, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+    print(f"\nSlowest {TOP_MODULES} packages (sum of self times):")
+    for package, self_us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:TOP_MODULES]:
+        print(f"  {self_us / 1000:8.1f}ms  {package}")
+
+    eager = [package for package in DEFERRED_PACKAGES if package in packages]
+    if eager:
+        print(f"\n❌ Imported on the startup path: {', '.join(eager)}")
+    else:
+        print("\n✅ LangChain, OpenAI and database drivers are deferred to the warm-up")
+    return not eager
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_bind(timeout=30.0):
+    """Launch start.py and return the seconds until its port accepts connections"""
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), HOST="127.0.0.1", WEB_CONCURRENCY="1")
+    # Nothing is called during the benchmark; start.py only checks that a key is set
+    env.setdefault("OPENAI_API_KEY", "sk-startup-benchmark")
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "start.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                return None
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        return None
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    print("⏱️  Valuefy backend startup profile")
+    print("=" * 50)
+    deferred = report_imports(profile_imports())
+
+    print("\n" + "=" * 50)
+    elapsed = time_to_bind()
+    if elapsed is None:
+        print("❌ start.py did not bind its port")
+        sys.exit(1)
+    within = elapsed <= TARGET_SECONDS
+    print(f"{'✅' if within else '❌'} Port bound {elapsed:.2f}s after launch (target {TARGET_SECONDS:.2f}s)")
+    sys.exit(0 if within and deferred else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# test_answer_cache.py
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from agents import mongo_agent
+from core import answer_cache as answer_cache_module
+from core.answer_cache import AnswerCache, normalize_question
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_normalize_question():
+    assert normalize_question("  How many clients?? ") == normalize_question("how many CLIENTS")
+    assert normalize_question("Total in ₹ crore") == "total in ₹ crore"
+
+
+def test_least_recently_used_entry_is_evicted():
+    async def main_():
+        cache = AnswerCache(max_entries=2)
+        await cache.put("q1", "a1")
+        await cache.put("q2", "a2")
+        await cache.get("q1")
+        await cache.put("q3", "a3")
+        return [(await cache.get(question))[0] for question in ("q1", "q2", "q3")], cache.stats()
+
+    values, stats = _run(main_())
+    assert values == ["a1", None, "a3"]
+    assert stats["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    async def main_():
+        cache = AnswerCache(ttl=0.05)
+        await cache.put("q", "a")
+        fresh, _ = await cache.get("q")
+        await asyncio.sleep(0.06)
+        expired, _ = await cache.get("q")
+        return fresh, expired, cache.stats()
+
+    fresh, expired, stats = _run(main_())
+    assert (fresh, expired) == ("a", None)
+    assert stats["entries"] == 0
+
+
+def test_a_new_data_version_clears_the_cache(monkeypatch):
+    monkeypatch.setattr(answer_cache_module, "DATA_VERSION_TTL", 0)
+    version = {"value": (10, "2024-01-01")}
+
+    async def current_version():
+        return version["value"]
+
+    async def main_():
+        cache = AnswerCache(version_provider=current_version)
+        await cache.get("q")
+        await cache.put("q", "a")
+        same, _ = await cache.get("q")
+        version["value"] = (11, "2024-01-02")
+        changed, _ = await cache.get("q")
+        return same, changed, cache.stats()
+
+    same, changed, stats = _run(main_())
+    assert (same, changed) == ("a", None)
+    assert stats["invalidations"] == 1
+    assert stats["data_version"] == (11, "2024-01-02")
+
+
+def test_semantic_match_above_the_threshold():
+    vectors = {
+        "how many high risk clients": [1.0, 0.0],
+        "count of high risk clients": [0.99, 0.05],
+        "total invested in reliance": [0.0, 1.0],
+    }
+
+    async def embed(text):
+        return vectors[text]
+
+    async def main_():
+        cache = AnswerCache(embedder=embed, similarity=0.95)
+        _, embedding = await cache.get("How many high risk clients?")
+        await cache.put("How many high risk clients?", "3", embedding)
+        similar, _ = await cache.get("Count of high risk clients")
+        different, _ = await cache.get("Total invested in Reliance")
+        return similar, different, cache.stats()
+
+    similar, different, stats = _run(main_())
+    assert (similar, different) == ("3", None)
+    assert stats["semantic_hits"] == 1
+
+
+def test_embedding_failure_is_a_plain_miss():
+    async def embed(text):
+        raise RuntimeError("embeddings API down")
+
+    assert _run(AnswerCache(embedder=embed).get("q")) == (None, None)
+
+
+@pytest.mark.parametrize("ok", [True, False])
+def test_only_successful_answers_are_cached(monkeypatch, ok):
+    cache = AnswerCache()
+    monkeypatch.setattr(main, "answer_cache", cache)
+
+    async def aquery_mongo(question):
+        return {"answer": "3 clients" if ok else "Error querying MongoDB: timed out", "ok": ok}
+
+    monkeypatch.setattr(main, "mongo_agent", SimpleNamespace(aquery_mongo=aquery_mongo))
+    route = {"fast_path": False, "store": "mongo"}
+
+    payload = _run(main.compute_answer("How many clients?", route))
+    assert payload["ok"] is ok
+    cached, _ = _run(cache.get("How many clients?"))
+    assert cached == (payload if ok else None)
+
+
+class FakeClients:
+    """Async collection stand-in that fails on any write or DDL"""
+
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    async def estimated_document_count(self):
+        return 7
+
+    async def index_information(self):
+        return self.indexes
+
+    async def find_one(self, query, projection=None, sort=None):
+        return {"created_at": "2024-01-07"}
+
+    async def create_index(self, *args, **kwargs):
+        raise AssertionError("the watermark probe must not create indexes")
+
+
+@pytest.mark.parametrize("indexes, watermark", [
+    ({"_id_": {"key": [("_id", 1)]}, "created_at_-1": {"key": [("created_at", -1)]}}, (7, "2024-01-07")),
+    ({"_id_": {"key": [("_id", 1)]}}, (7, None)),
+])
+def test_clients_watermark_only_reads(monkeypatch, indexes, watermark):
+    monkeypatch.setattr(mongo_agent, "MONGODB_AVAILABLE", True)
+    monkeypatch.setattr(mongo_agent, "_created_at_indexed", None)
+    monkeypatch.setattr(mongo_agent, "get_async_mongo_collection", lambda: FakeClients(indexes))
+    assert _run(mongo_agent.aget_clients_watermark()) == watermark
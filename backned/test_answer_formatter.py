@@ -0,0 +1,61 @@
+# test_answer_formatter.py
+
+from datetime import date
+from decimal import Decimal
+
+from agents.answer_formatter import (
+    MAX_LISTED_ROWS, NO_DATA_ANSWER, format_rows, format_value, money_columns, normalize_chart_hint, render_answer,
+)
+
+
+def test_money_columns_follow_the_sql_not_the_alias():
+    sql_query = ("SELECT rm_name, COUNT(*) AS total_investments, SUM(amount_invested) AS value "
+                 "FROM transactions GROUP BY rm_name")
+    assert money_columns(sql_query) == {"value"}
+    assert money_columns("SELECT * FROM transactions") is None
+    assert money_columns(None) is None
+
+
+def test_counts_are_never_rupees():
+    # Regression: a COUNT aliased total_investments was shown as ₹12.00
+    assert format_value("total_investments", 12) == "12"
+    assert format_value("total_investments", Decimal("12"), money=set()) == "12"
+    assert format_value("amount_invested", Decimal("1500000.5")) == "₹1,500,000.50"
+
+
+def test_plain_values():
+    assert format_value("date_", date(2024, 3, 1)) == "2024-03-01"
+    assert format_value("client_id", None) == "N/A"
+    assert format_value("ratio", 0.125) == "0.12"
+
+
+def test_format_rows_shapes():
+    assert format_rows([]) == NO_DATA_ANSWER
+    assert format_rows([{"clients": 42}]) == "42"
+    assert format_rows([{"client_id": "C001", "amount_invested": Decimal("10.5")}]) == \
+        "client_id: C001, amount_invested: ₹10.50"
+    rows = [{"stock_name": f"S{i}", "amount_invested": Decimal(i)} for i in range(MAX_LISTED_ROWS + 2)]
+    lines = format_rows(rows).splitlines()
+    assert lines[1] == "2. S1 - ₹1.00"
+    assert lines[-1] == "... and 2 more"
+
+
+def test_render_answer_fills_the_template():
+    rows = [{"total": Decimal("2500.00")}]
+    sql_query = "SELECT SUM(amount_invested) AS total FROM transactions"
+    assert render_answer("Total invested: {value}", rows, sql_query) == "Total invested: ₹2,500.00"
+    listed = [{"stock_name": "A"}, {"stock_name": "B"}]
+    assert render_answer("{count} stocks:\n{rows}", listed) == "2 stocks:\n1. A\n2. B"
+
+
+def test_render_answer_falls_back_to_the_formatter():
+    rows = [{"stock_name": "A", "n": 1}, {"stock_name": "B", "n": 2}]
+    assert render_answer("Top stock is {stock_name}", rows) == "1. A - 1\n2. B - 2"
+    assert render_answer("Value {unknown}", rows[:1]) == "stock_name: A, n: 1"
+    assert render_answer("Broken {", rows[:1]) == "stock_name: A, n: 1"
+
+
+def test_chart_hint():
+    assert normalize_chart_hint(" Bar ") == "bar"
+    assert normalize_chart_hint("scatter") == "table"
+    assert normalize_chart_hint(None) == "none"
@@ -0,0 +1,109 @@
+# test_federated.py
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from agents import federated
+from agents.federated import _describe, _format, _probe, answer_federated, client_filter
+
+CLIENTS = {"C001": {"client_id": "C001", "name": "Asha"}, "C002": {"client_id": "C002", "name": "Ravi"}}
+TRANSACTIONS = [
+    ("T1", "C001", "Reliance", 100.0, "2024-01-05", "Anita Rao"),
+    ("T2", "C002", "Infosys", 50.0, "2024-01-06", "Anita Rao"),
+    ("T3", "C003", "Reliance", 75.0, "2024-01-07", "Vikram Shah"),
+    ("T4", "C001", "Infosys", 20.0, "2024-01-08", "Vikram Shah"),
+]
+
+
+def test_client_filter_and_label():
+    slots = {"risk": "High", "preference": "Bonds", "rm_id": 101, "stock_name": "Reliance"}
+    assert client_filter(slots) == {"risk_appetite": "High", "investment_preferences": "Bonds", "rm_id": 101}
+    assert _describe(slots) == "High risk clients preferring Bonds of RM 101 in Reliance"
+
+
+def test_probe_keeps_matching_rows_up_to_the_limit():
+    assert _probe(iter(TRANSACTIONS), CLIENTS, key=1) == [TRANSACTIONS[0], TRANSACTIONS[1], TRANSACTIONS[3]]
+    assert _probe(iter(TRANSACTIONS), CLIENTS, key=1, limit=1) == [TRANSACTIONS[0]]
+
+
+def test_format_aggregates_the_joined_rows():
+    per_client = [("C001", 2, 120.0), ("C002", 1, 50.0)]
+    slots = {"risk": "High", "limit": 1}
+    assert _format("total_invested", slots, CLIENTS, per_client)["answer"] == \
+        "Total amount invested by High risk clients: ₹170.00 across 2 client(s)"
+    assert _format("transaction_count", slots, CLIENTS, per_client)["answer"] == \
+        "Total transactions for High risk clients: 3 across 2 client(s)"
+    assert _format("client_count", slots, CLIENTS, per_client)["answer"] == "2 High risk clients have transactions."
+    assert _format("top_clients", slots, CLIENTS, per_client)["answer"] == \
+        "Top 1 High risk clients by amount invested:\n1. Asha (C001): ₹120.00"
+
+    per_stock = [("C001", "Reliance", 1, 100.0), ("C001", "Infosys", 1, 20.0), ("C002", "Infosys", 1, 50.0)]
+    assert _format("top_stocks", {"limit": 2}, CLIENTS, per_stock)["answer"] == \
+        "Top 2 stocks among clients:\n1. Reliance: ₹100.00\n2. Infosys: ₹70.00"
+    assert _format("top_clients", {}, CLIENTS, [])["answer"] == "No transactions found for clients."
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'transactions.sqlite3'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE transactions (transaction_id TEXT, client_id TEXT, stock_name TEXT, "
+                          "amount_invested REAL, date_ TEXT, rm_name TEXT)"))
+        conn.execute(text("INSERT INTO transactions VALUES (:id, :client, :stock, :amount, :date, :rm)"),
+                     [dict(zip(("id", "client", "stock", "amount", "date", "rm"), row)) for row in TRANSACTIONS])
+    monkeypatch.setattr(federated.mongo_agent, "MONGODB_AVAILABLE", True)
+    monkeypatch.setattr(federated.sql_agent, "get_sql_agent", lambda: SimpleNamespace(db=SimpleNamespace(_engine=engine)))
+    monkeypatch.setattr(federated, "_rollup_rows", lambda shape, filters: None)
+
+    async def load_clients(slots):
+        return CLIENTS
+
+    monkeypatch.setattr(federated, "_load_clients", load_clients)
+
+
+def test_joins_mongo_clients_with_mysql_transactions(sources):
+    route = {"intent": "total_invested", "slots": {"risk": "High", "stock_name": "Reliance"}}
+    response = asyncio.run(answer_federated(route))
+    assert response["ok"]
+    assert response["answer"] == "Total amount invested by High risk clients in Reliance: ₹100.00 across 1 client(s)"
+
+
+def test_lists_transactions_of_matching_clients(sources):
+    response = asyncio.run(answer_federated({"intent": "client_transactions", "slots": {"risk": "High"}}))
+    assert response["result"]["data"][0] == ["T4", "T2", "T1"]
+
+
+def test_unsupported_intents_fall_back():
+    assert asyncio.run(answer_federated({"intent": "monthly_invested", "slots": {}})) is None
+
+
+def test_cancelled_request_releases_the_transactions_side(sources, monkeypatch):
+    # Regression: the worker thread waited on clients_future forever, holding a MySQL connection
+    finished = threading.Event()
+    stream = federated._stream_transactions
+
+    def stream_transactions(*args):
+        try:
+            return stream(*args)
+        finally:
+            finished.set()
+
+    async def never(slots):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(federated, "_stream_transactions", stream_transactions)
+    monkeypatch.setattr(federated, "_load_clients", never)
+
+    async def main():
+        task = asyncio.ensure_future(answer_federated({"intent": "total_invested", "slots": {"risk": "High"}}))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await asyncio.get_running_loop().run_in_executor(None, finished.wait, 2)
+
+    assert asyncio.run(main())
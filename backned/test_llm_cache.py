@@ -0,0 +1,55 @@
+# test_llm_cache.py
+
+import pytest
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+
+from core.llm_cache import LLMCacheMiss, PersistentLLMCache
+from core.llm_client import GatewayChatOpenAI
+
+PROMPT = [HumanMessage(content="How many clients have high risk appetite?")]
+
+
+def _generation(text):
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+
+def _model(cache):
+    return GatewayChatOpenAI(model="gpt-3.5-turbo", temperature=0, api_key="sk-test", cache=cache)
+
+
+def test_round_trip_and_modes(tmp_path):
+    path = tmp_path / "completions.sqlite3"
+    PersistentLLMCache(path, mode="record").update("prompt", "llm", _generation("recorded"))
+
+    assert PersistentLLMCache(path, mode="record").lookup("prompt", "llm") is None
+    assert PersistentLLMCache(path, mode="off").lookup("prompt", "llm") is None
+    replay = PersistentLLMCache(path, mode="replay")
+    assert replay.lookup("prompt", "llm")[0].text == "recorded"
+    assert replay.lookup("prompt", "other model settings") is None
+
+    replay.update("new prompt", "llm", _generation("ignored"))
+    assert PersistentLLMCache(path).lookup("new prompt", "llm") is None
+
+
+def test_eviction_keeps_the_cache_under_its_bound(tmp_path):
+    cache = PersistentLLMCache(tmp_path / "completions.sqlite3", max_mb=0.01)
+    for index in range(20):
+        cache.update(f"prompt {index}", "llm", _generation("x" * 1000))
+    assert cache.evict() > 0
+    assert cache.stats()["size_kb"] <= 10
+    assert cache.lookup("prompt 19", "llm") is not None
+
+
+def test_replay_answers_recorded_prompts_without_the_api(tmp_path):
+    path = tmp_path / "completions.sqlite3"
+    model = _model(PersistentLLMCache(path, mode="replay"))
+    PersistentLLMCache(path, mode="record").update(dumps(PROMPT), model._get_llm_string(), _generation("3 clients"))
+    assert model.invoke(PROMPT).content == "3 clients"
+
+
+def test_replay_miss_fails_instead_of_calling_the_api(tmp_path):
+    model = _model(PersistentLLMCache(tmp_path / "completions.sqlite3", mode="replay"))
+    with pytest.raises(LLMCacheMiss):
+        model.invoke([HumanMessage(content="A prompt nobody recorded")])
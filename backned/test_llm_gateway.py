@@ -0,0 +1,191 @@
+# test_llm_gateway.py
+
+import asyncio
+from uuid import uuid4
+
+import pytest
+from langchain_core.callbacks.manager import AsyncCallbackManagerForLLMRun
+
+from core import llm_gateway as gateway_module
+from core.llm_client import _hedge_run_manager
+from core.llm_gateway import LLMGateway, LLMOverloaded, TokenBucket
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_AFTER", 0)
+    monkeypatch.setattr(gateway_module, "LLM_BACKOFF_BASE", 0)
+    return LLMGateway()
+
+
+def test_token_bucket_take_refund_and_drain():
+    bucket = TokenBucket(60)
+    assert bucket.try_take(60) == 0.0
+    assert bucket.try_take(1) == pytest.approx(1.0, abs=0.05)
+    bucket.refund(30)
+    assert bucket.try_take(30) == 0.0
+    bucket.drain()
+    assert bucket.level <= 0.0
+    # Larger than the bucket: wait for a full bucket instead of forever
+    assert TokenBucket(60).try_take(1000) == 0.0
+    assert TokenBucket(0).try_take(1000) == 0.0
+
+
+def test_waiting_callers_are_admitted_by_priority(monkeypatch, gateway):
+    monkeypatch.setattr(gateway_module, "LLM_MAX_CONCURRENCY", 1)
+
+    async def main():
+        order = []
+        await gateway.acquire(1, "interactive")
+
+        async def caller(priority):
+            await gateway.acquire(1, priority)
+            order.append(priority)
+            gateway.release()
+
+        waiters = [asyncio.ensure_future(caller(priority)) for priority in ("background", "batch", "interactive")]
+        await asyncio.sleep(0.01)
+        assert gateway.stats()["queued"] == {"background": 1, "batch": 1, "interactive": 1}
+        gateway.release()
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(main()) == ["interactive", "batch", "background"]
+
+
+def test_empty_request_bucket_holds_the_queue(gateway):
+    async def main():
+        gateway._requests = TokenBucket(60)
+        gateway._requests.level = 0.0
+        start = asyncio.get_running_loop().time()
+        await gateway.acquire(1)
+        gateway.release()
+        return asyncio.get_running_loop().time() - start
+
+    assert asyncio.run(main()) >= 0.9
+
+
+def test_queue_timeout_sheds_the_caller(monkeypatch, gateway):
+    monkeypatch.setattr(gateway_module, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(gateway_module, "LLM_QUEUE_TIMEOUT", 0.05)
+
+    async def main():
+        await gateway.acquire(1)
+        with pytest.raises(LLMOverloaded):
+            await gateway.acquire(1)
+
+    asyncio.run(main())
+    assert gateway.stats()["timed_out"] == 1
+
+
+def test_rate_limits_are_retried(gateway):
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited()
+        return "ok"
+
+    assert asyncio.run(gateway.call(flaky, 10)) == "ok"
+    stats = gateway.stats()
+    assert (stats["retries"], stats["rate_limited"], stats["inflight"]) == (2, 2, 0)
+
+
+def test_other_errors_are_not_retried(gateway):
+    attempts = []
+
+    async def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(gateway.call(broken, 10))
+    assert len(attempts) == 1
+
+
+def _delayed(result, delay, calls=None):
+    async def call():
+        if calls is not None:
+            calls.append(result)
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return call
+
+
+def test_slow_call_is_hedged_and_the_duplicate_can_win(monkeypatch, gateway):
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_AFTER", 0.02)
+    calls = []
+    result = asyncio.run(gateway.call(_delayed("primary", 0.5, calls), 10, hedge=_delayed("hedge", 0.01, calls)))
+    assert (result, calls) == ("hedge", ["primary", "hedge"])
+    stats = gateway.stats()
+    assert (stats["hedges"], stats["hedge_wins"], stats["inflight"]) == (1, 1, 0)
+
+
+def test_a_failed_hedge_does_not_fail_the_call(monkeypatch, gateway):
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_AFTER", 0.02)
+    result = asyncio.run(gateway.call(_delayed("primary", 0.1), 10, hedge=_delayed(ValueError("hedge"), 0.01)))
+    assert result == "primary"
+    assert gateway.stats()["hedge_wins"] == 0
+
+
+def test_a_failed_primary_waits_for_the_hedge(monkeypatch, gateway):
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_AFTER", 0.02)
+    result = asyncio.run(gateway.call(_delayed(ValueError("primary"), 0.05), 10, hedge=_delayed("hedge", 0.1)))
+    assert result == "hedge"
+
+
+def test_both_failing_raises_the_primary_error(monkeypatch, gateway):
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_AFTER", 0.02)
+    with pytest.raises(ValueError, match="primary"):
+        asyncio.run(gateway.call(_delayed(ValueError("primary"), 0.05), 10, hedge=_delayed(ValueError("hedge"), 0.01)))
+    assert gateway.stats()["inflight"] == 0
+
+
+def test_no_hedge_without_spare_capacity(monkeypatch, gateway):
+    monkeypatch.setattr(gateway_module, "LLM_HEDGE_AFTER", 0.01)
+    monkeypatch.setattr(gateway_module, "LLM_MAX_CONCURRENCY", 1)
+    calls = []
+    assert asyncio.run(gateway.call(_delayed("primary", 0.05, calls), 10, hedge=_delayed("hedge", 0, calls))) == "primary"
+    assert calls == ["primary"]
+    assert gateway.stats()["hedges"] == 0
+
+
+def test_hedge_gets_its_own_child_run():
+    run_manager = AsyncCallbackManagerForLLMRun(run_id=uuid4(), handlers=[object()], inheritable_handlers=[], tags=["sql"])
+    child = _hedge_run_manager(run_manager)
+    assert child.parent_run_id == run_manager.run_id
+    assert child.run_id != run_manager.run_id
+    assert (child.handlers, child.tags) == ([], ["sql"])
+    assert _hedge_run_manager(None) is None
+
+
+def test_cancelled_waiters_do_not_fill_the_queue(monkeypatch, gateway):
+    # Regression: dead entries stayed queued and counted against LLM_MAX_QUEUE
+    monkeypatch.setattr(gateway_module, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(gateway_module, "LLM_MAX_QUEUE", 3)
+    monkeypatch.setattr(gateway_module, "LLM_QUEUE_TIMEOUT", 0.05)
+
+    async def main():
+        await gateway.acquire(1)
+        waiters = [asyncio.ensure_future(gateway.acquire(1)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        with pytest.raises(LLMOverloaded):
+            await gateway.acquire(1)
+        assert gateway._queue == []
+
+        caller = asyncio.ensure_future(gateway.acquire(1))
+        await asyncio.sleep(0.01)
+        gateway.release()
+        return await caller
+
+    assert asyncio.run(main())
+    assert gateway.stats()["shed"] == 0
@@ -0,0 +1,104 @@
+# test_mongo_pipeline.py
+
+from types import SimpleNamespace
+
+import pytest
+
+from agents import mongo_agent
+from agents.mongo_pipeline import (
+    MONGO_PIPELINE_LIMIT, format_aggregate, summarize_explain, validate_filter, validate_pipeline,
+)
+from db.mongo_conn import set_mongo_client
+
+CLIENTS = [
+    {"client_id": "C001", "name": "Asha", "risk_appetite": "High", "investment_preferences": ["Stocks"], "rm_id": 101},
+    {"client_id": "C002", "name": "Ravi", "risk_appetite": "High", "investment_preferences": ["Bonds"], "rm_id": 102},
+    {"client_id": "C003", "name": "Meera", "risk_appetite": "Low", "investment_preferences": ["Bonds"], "rm_id": 101},
+]
+
+
+def test_pipeline_gets_a_server_side_limit():
+    pipeline, error = validate_pipeline([{"$match": {"risk_appetite": "High"}}])
+    assert error is None
+    assert pipeline[-1] == {"$limit": MONGO_PIPELINE_LIMIT}
+
+    pipeline, _ = validate_pipeline([{"$sort": {"rm_id": 1}}, {"$limit": 10 ** 6}])
+    assert pipeline[-1] == {"$limit": MONGO_PIPELINE_LIMIT}
+
+
+@pytest.mark.parametrize("pipeline, error", [
+    ([], "Aggregation pipeline must be a non-empty list of stages"),
+    ([{"$out": "stolen"}], "Pipeline stage $out is not allowed"),
+    ([{"$match": {"$where": "sleep(1000)"}}], "Pipeline operator $where is not allowed"),
+    ([{"$group": {"_id": None, "x": {"$accumulator": {}}}}], "Pipeline operator $accumulator is not allowed"),
+    ([{"$match": {}, "$limit": 1}], "Invalid pipeline stage"),
+    ([{"$limit": -1}], "Invalid $limit: -1"),
+])
+def test_rejected_pipelines(pipeline, error):
+    validated, reason = validate_pipeline(pipeline)
+    assert validated is None
+    assert reason.startswith(error)
+
+
+def test_find_filters_are_checked_for_forbidden_operators():
+    assert validate_filter({"risk_appetite": "High"}) == ({"risk_appetite": "High"}, None)
+    assert validate_filter({"$where": "this.rm_id == 101"})[1] == "Filter operator $where is not allowed"
+    nested = {"$and": [{"$expr": {"$function": {"body": "return true", "args": [], "lang": "js"}}}]}
+    assert validate_filter(nested)[1] == "Filter operator $function is not allowed"
+    assert validate_filter("risk_appetite")[1] == "MongoDB filter must be a JSON object, got str"
+
+
+def test_summarize_explain_ignores_rejected_plans():
+    explain = {"queryPlanner": {
+        "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "risk_appetite_1"}},
+        "rejectedPlans": [{"stage": "COLLSCAN"}],
+    }}
+    assert summarize_explain(explain) == {"stages": ["IXSCAN"], "indexes": ["risk_appetite_1"], "collscan": False}
+
+
+def test_format_aggregate():
+    rows = [{"_id": "High", "clients": 2}, {"_id": {"rm": 101, "risk": "Low"}, "avg": 1500.5}, {"_id": None, "n": 3}]
+    assert format_aggregate(rows) == (
+        "Results (3 group(s)):\nHigh - clients: 2\nrm=101, risk=Low - avg: 1,500.50\nAll - n: 3"
+    )
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    client = mongomock.MongoClient()
+    client["valuefy"]["clients"].insert_many([dict(doc) for doc in CLIENTS])
+    monkeypatch.setenv("MONGODB_URI", "mongodb://localhost:27017")
+    monkeypatch.setattr(mongo_agent, "MONGODB_AVAILABLE", True)
+    monkeypatch.setattr(mongo_agent, "_schema_text", mongo_agent.DEFAULT_SCHEMA)
+    set_mongo_client(client)
+    yield client["valuefy"]["clients"]
+    set_mongo_client(None)
+
+
+def _answer_with(monkeypatch, llm_output: str, question: str):
+    fake_llm = SimpleNamespace(invoke=lambda prompt: SimpleNamespace(content=llm_output))
+    monkeypatch.setattr(mongo_agent, "get_llm", lambda: fake_llm)
+    return mongo_agent.query_mongo(question)
+
+
+def test_query_mongo_runs_a_validated_pipeline(monkeypatch, collection):
+    response = _answer_with(
+        monkeypatch,
+        '[{"$group": {"_id": "$risk_appetite", "clients": {"$sum": 1}}}, {"$sort": {"clients": -1}}]',
+        "How many clients per risk appetite?",
+    )
+    assert response["ok"]
+    assert response["answer"] == "Results (2 group(s)):\nHigh - clients: 2\nLow - clients: 1"
+
+
+def test_query_mongo_runs_a_find_filter(monkeypatch, collection):
+    response = _answer_with(monkeypatch, '{"investment_preferences": "Bonds"}', "How many clients prefer bonds?")
+    assert response["ok"]
+    assert response["answer"] == "Found 2 client(s): Ravi (ID: C002, Risk: High), Meera (ID: C003, Risk: Low)"
+
+
+def test_query_mongo_rejects_forbidden_find_filters(monkeypatch, collection):
+    response = _answer_with(monkeypatch, '{"$where": "sleep(1000) || true"}', "Show all clients")
+    assert not response["ok"]
+    assert response["answer"] == "Filter operator $where is not allowed"
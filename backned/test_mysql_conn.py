@@ -0,0 +1,42 @@
+# test_mysql_conn.py
+
+import sqlite3
+
+import pytest
+from sqlalchemy import exc
+
+from db import mysql_conn
+from db.mysql_conn import InstrumentedQueuePool, get_pool_stats
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(mysql_conn, "_pool_stats", {key: 0 for key in mysql_conn._pool_stats})
+
+
+def test_timed_out_checkouts_are_not_counted_as_waits():
+    pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.05)
+    held = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    held.close()
+    pool.connect().close()
+
+    stats = get_pool_stats()
+    assert stats["checkouts"] == 2
+    assert stats["checkout_timeouts"] == 1
+    # The 50ms timeout must not leak into the wait metrics
+    assert stats["max_wait_ms"] < 50
+
+
+def test_failed_connects_are_counted_separately():
+    def refuse():
+        raise sqlite3.OperationalError("connection refused")
+
+    pool = InstrumentedQueuePool(refuse, pool_size=1, max_overflow=0)
+    with pytest.raises(sqlite3.OperationalError):
+        pool.connect()
+
+    stats = get_pool_stats()
+    assert stats["checkouts"] == 0
+    assert stats["checkout_failures"] == 1
@@ -0,0 +1,69 @@
+# test_plan_cache.py
+
+from core.plan_cache import PlanCache
+
+
+def _cache():
+    cache = PlanCache(max_entries=4)
+    cache.set_vocabulary({"stock_name": ["Reliance", "HDFC Bank", "HDFC"], "rm_name": ["Anita Rao"]})
+    return cache
+
+
+def test_template_round_trip_binds_new_literals():
+    cache = _cache()
+    assert cache.store(
+        "total invested by C001 in Reliance since 2024-01-01",
+        "SELECT SUM(amount_invested) FROM transactions "
+        "WHERE client_id = 'C001' AND stock_name = 'Reliance' AND date_ >= '2024-01-01'",
+    )
+    sql_query = cache.lookup("Total invested by c042 in HDFC Bank since 2023-06-30?")
+    assert sql_query == (
+        "SELECT SUM(amount_invested) FROM transactions "
+        "WHERE client_id = 'C042' AND stock_name = 'HDFC Bank' AND date_ >= '2023-06-30'"
+    )
+    assert cache.stats()["hits"] == 1
+
+
+def test_longest_vocabulary_name_wins():
+    shape, entities = _cache().extract_entities("clients holding HDFC Bank")
+    assert entities == [("stock_name", "HDFC Bank")]
+    assert shape == "clients holding __stock_name__"
+
+
+def test_number_slots_are_bound_unquoted():
+    cache = _cache()
+    assert cache.store("top 5 clients", "SELECT client_id FROM transactions LIMIT 5")
+    assert cache.lookup("top 12 clients") == "SELECT client_id FROM transactions LIMIT 12"
+
+
+def test_string_literals_are_escaped_when_bound():
+    cache = _cache()
+    cache.set_vocabulary({"rm_name": ["Anita Rao", "D'Souza"]})
+    assert cache.store("clients of Anita Rao", "SELECT client_id FROM transactions WHERE rm_name = 'Anita Rao'")
+    assert cache.lookup("clients of D'Souza") == "SELECT client_id FROM transactions WHERE rm_name = 'D''Souza'"
+
+
+def test_ambiguous_literal_is_not_cached():
+    cache = _cache()
+    assert not cache.store("top 5 clients", "SELECT client_id FROM transactions WHERE amount_invested > 5 LIMIT 5")
+    assert cache.lookup("top 7 clients") is None
+    assert cache.stats()["uncacheable"] == 1
+
+
+def test_answer_template_mentioning_a_literal_is_dropped():
+    cache = _cache()
+    cache.store("how much did C001 invest", "SELECT SUM(amount_invested) FROM transactions WHERE client_id = 'C001'",
+                answer_template="C001 invested {total}")
+    assert cache.lookup_plan("how much did C002 invest")["answer_template"] is None
+
+    cache.store("how much did C001 invest", "SELECT SUM(amount_invested) FROM transactions WHERE client_id = 'C001'",
+                answer_template="Total invested: {total}")
+    assert cache.lookup_plan("how much did C002 invest")["answer_template"] == "Total invested: {total}"
+
+
+def test_least_recently_used_template_is_evicted():
+    cache = PlanCache(max_entries=1)
+    cache.store("top 5 clients", "SELECT client_id FROM transactions LIMIT 5")
+    cache.store("top 5 stocks", "SELECT stock_name FROM transactions LIMIT 5")
+    assert cache.lookup("top 3 clients") is None
+    assert cache.lookup("top 3 stocks") == "SELECT stock_name FROM transactions LIMIT 3"
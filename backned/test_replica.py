@@ -0,0 +1,96 @@
+# test_replica.py
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from agents.sql_guard import parse_read_only
+from db.replica import TransactionsReplica
+
+pytest.importorskip("duckdb")
+
+ROWS = [
+    ("T1", "C001", "Reliance", 100.0, "2024-01-05", "Anita Rao", "2024-02-01 10:00:00"),
+    ("T2", "C001", "HDFC Bank", 50.0, "2024-01-20", "Anita Rao", "2024-02-01 10:00:00"),
+    ("T3", "C002", "Reliance", 25.0, "2024-02-03", "Vikram Shah", "2024-02-01 10:00:01"),
+]
+
+
+def _insert(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO transactions VALUES (:id, :client, :stock, :amount, :date, :rm, :created)"),
+                     [dict(zip(("id", "client", "stock", "amount", "date", "rm", "created"), row)) for row in rows])
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'transactions.sqlite3'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE transactions (transaction_id TEXT, client_id TEXT, stock_name TEXT, "
+                          "amount_invested REAL, date_ TEXT, rm_name TEXT, created_at TEXT)"))
+    _insert(engine, ROWS)
+    return engine
+
+
+@pytest.fixture
+def replica(engine):
+    replica = TransactionsReplica()
+    assert replica.refresh(engine)["mode"] == "full"
+    return replica
+
+
+def _query(replica, sql_query, timeout_ms=None):
+    return replica.query(parse_read_only(sql_query), timeout_ms)
+
+
+def test_load_and_query(replica):
+    assert replica.row_count == 3
+    rows = _query(replica, "SELECT stock_name, SUM(amount_invested) AS total FROM transactions "
+                           "GROUP BY stock_name ORDER BY total DESC")
+    assert rows == [{"stock_name": "Reliance", "total": 125.0}, {"stock_name": "HDFC Bank", "total": 50.0}]
+
+
+def test_refresh_appends_new_rows_once(engine, replica):
+    assert replica.refresh(engine)["mode"] == "unchanged"
+    _insert(engine, [
+        ("T4", "C002", "Reliance", 10.0, "2024-02-10", "Vikram Shah", "2024-02-01 10:00:01"),
+        ("T5", "C003", "Infosys", 5.0, "2024-03-01", "Anita Rao", "2024-02-02 09:00:00"),
+    ])
+    assert replica.refresh(engine)["mode"] == "incremental"
+    assert _query(replica, "SELECT COUNT(*) AS n FROM transactions") == [{"n": 5}]
+
+
+def test_deleted_rows_force_a_reload(engine, replica):
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM transactions WHERE transaction_id = 'T1'"))
+    _insert(engine, [("T6", "C004", "Infosys", 1.0, "2024-03-02", "Anita Rao", "2024-03-02 00:00:00")])
+    assert replica.refresh(engine)["mode"] == "full"
+    assert replica.row_count == 3
+
+
+def test_strings_compare_like_mysql(replica):
+    assert _query(replica, "SELECT COUNT(*) AS n FROM transactions WHERE stock_name = 'reliance '") == [{"n": 2}]
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT * FROM clients",
+    "SELECT COUNT(*) FROM transactions a JOIN transactions b ON a.client_id = b.client_id",
+    "SELECT COUNT(*) FROM transactions, (SELECT 1 AS x) y",
+    "WITH t AS (SELECT * FROM transactions) SELECT COUNT(*) FROM t a JOIN t b ON a.client_id = b.client_id",
+    "SELECT no_such_column FROM transactions",
+])
+def test_queries_the_replica_should_not_run_go_to_mysql(replica, sql_query):
+    assert _query(replica, sql_query) is None
+
+
+def test_slow_queries_are_interrupted(replica):
+    # One table reference, but a long-running scan all the same
+    sql_query = ("WITH RECURSIVE r AS (SELECT 1 AS x UNION ALL SELECT x + 1 FROM r WHERE x < 100000000) "
+                 "SELECT COUNT(*) FROM transactions WHERE (SELECT MAX(x) FROM r) > 0")
+    assert replica.query(parse_read_only(sql_query), timeout_ms=100) is None
+    assert replica.stats()["interrupted"] == 1
+
+
+def test_stale_replica_is_bypassed(replica):
+    replica.refreshed_at -= 3600
+    assert _query(replica, "SELECT COUNT(*) FROM transactions") is None
+    assert TransactionsReplica().query(parse_read_only("SELECT 1 FROM transactions")) is None
@@ -0,0 +1,43 @@
+# test_result_set.py
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from core.result_set import ResultSet
+
+ROWS = [
+    {"client_id": "C001", "amount_invested": Decimal("100.50"), "date_": date(2024, 1, 5), "transactions": 2},
+    {"client_id": "C002", "amount_invested": None, "date_": date(2024, 1, 6), "transactions": 1, "note": {"a": 1}},
+]
+
+
+def test_from_rows_pivots_into_typed_columns():
+    result_set = ResultSet.from_rows(ROWS)
+    assert result_set.columns == ["client_id", "amount_invested", "date_", "transactions", "note"]
+    assert result_set.dtypes == ["string", "float64", "date", "int64", "object"]
+    assert result_set.data[1] == [Decimal("100.50"), None]
+    assert result_set.row_count == 2
+
+
+def test_explicit_columns_fill_missing_fields():
+    result_set = ResultSet.from_rows([{"name": "Asha"}], columns=["name", "client_id"])
+    assert result_set.data == [["Asha"], [None]]
+    assert result_set.dtypes == ["string", "null"]
+    assert result_set.rows() == [{"name": "Asha", "client_id": None}]
+
+
+def test_to_json_is_json_ready():
+    payload = ResultSet.from_rows([{"at": datetime(2024, 1, 5, 9, 30), "total": Decimal("1.5"), "ok": True}]).to_json()
+    assert payload == {
+        "columns": ["at", "total", "ok"],
+        "dtypes": ["datetime", "float64", "bool"],
+        "data": [["2024-01-05T09:30:00"], [1.5], [True]],
+        "row_count": 1,
+    }
+
+
+def test_to_text_previews_rows():
+    result_set = ResultSet.from_rows([{"n": index, "v": None} for index in range(3)])
+    assert result_set.to_text(max_rows=2) == "n\tv\n0\t\n1\t\n... 1 more rows"
+    assert ResultSet.from_rows([]).to_text() == ""
+    assert ResultSet.from_rows([]).row_count == 0
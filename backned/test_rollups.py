@@ -0,0 +1,99 @@
+# test_rollups.py
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from db.rollups import RollupStore, match_aggregate_sql
+
+ROWS = [
+    ("T1", "C001", "Reliance", "Anita Rao", "2024-01-05", 100.0, "2024-02-01 10:00:00"),
+    ("T2", "C001", "HDFC Bank", "Anita Rao", "2024-01-20", 50.0, "2024-02-01 10:00:00"),
+    ("T3", "C002", "Reliance", "Vikram Shah", "2024-02-03", 25.0, "2024-02-01 10:00:01"),
+]
+
+
+def _insert(engine, rows):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO transactions VALUES (:id, :client, :stock, :rm, :date, :amount, :created)"),
+                     [dict(zip(("id", "client", "stock", "rm", "date", "amount", "created"), row)) for row in rows])
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'transactions.sqlite3'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE transactions (transaction_id TEXT, client_id TEXT, stock_name TEXT, "
+                          "rm_name TEXT, date_ TEXT, amount_invested REAL, created_at TEXT)"))
+    _insert(engine, ROWS)
+    return engine
+
+
+def _total(store, **filters):
+    return store.aggregate(filters)[()]
+
+
+def test_refresh_applies_only_new_rows(engine):
+    store = RollupStore()
+    assert store.refresh(engine)["mode"] == "full"
+    assert store.refresh(engine)["mode"] == "unchanged"
+
+    # One row shares the previous high-water second, one is newer
+    _insert(engine, [
+        ("T4", "C002", "Reliance", "Vikram Shah", "2024-02-10", 10.0, "2024-02-01 10:00:01"),
+        ("T5", "C003", "Infosys", "Anita Rao", "2024-03-01", 5.0, "2024-02-02 09:00:00"),
+    ])
+    assert store.refresh(engine)["mode"] == "incremental"
+    assert store.row_count == 5
+    assert _total(store, stock_name="Reliance") == [3, 135.0]
+    assert store.aggregate({"client_id": "C001"}, ("month",)) == {("2024-01",): [2, 150.0]}
+
+
+def test_deleted_rows_force_a_rebuild(engine):
+    store = RollupStore()
+    store.refresh(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM transactions WHERE transaction_id = 'T1'"))
+    _insert(engine, [("T6", "C004", "Infosys", "Anita Rao", "2024-03-02", 1.0, "2024-03-02 00:00:00")])
+    assert store.refresh(engine)["mode"] == "full"
+    assert _total(store) == [3, 76.0]
+
+
+def test_filters_match_like_mysql_collation(engine):
+    store = RollupStore()
+    store.refresh(engine)
+    assert _total(store, stock_name="reliance ") == [2, 125.0]
+    assert _total(store, stock_name="Wipro") == [0, 0.0]
+
+
+def test_answer_sql_from_rollups(engine):
+    store = RollupStore()
+    store.refresh(engine)
+    columns, rows = store.answer_sql(
+        "SELECT stock_name, SUM(amount_invested) AS total, COUNT(*) FROM transactions "
+        "WHERE rm_name = 'Anita Rao' GROUP BY stock_name ORDER BY total DESC LIMIT 1"
+    )
+    assert columns == ["stock_name", "total", "COUNT(*)"]
+    assert rows == [("Reliance", 100.0, 1)]
+    assert store.answer_sql("SELECT AVG(amount_invested) FROM transactions WHERE client_id = 'C001'") == \
+        (["AVG(amount_invested)"], [(75.0,)])
+
+
+def test_stale_rollups_do_not_answer(engine):
+    store = RollupStore()
+    assert store.answer_sql("SELECT COUNT(*) FROM transactions") is None
+    store.refresh(engine)
+    store.refreshed_at -= 3600
+    assert store.answer_sql("SELECT COUNT(*) FROM transactions") is None
+
+
+@pytest.mark.parametrize("sql_query", [
+    "SELECT COUNT(*) FROM transactions t JOIN clients c ON c.client_id = t.client_id",
+    "SELECT SUM(amount_invested) FROM transactions WHERE date_ >= '2024-01-01'",
+    "SELECT COUNT(DISTINCT client_id) FROM transactions",
+    "SELECT client_id, SUM(amount_invested) FROM transactions GROUP BY client_id HAVING SUM(amount_invested) > 10",
+    "SELECT stock_name, COUNT(*) FROM transactions",
+    "SELECT client_id FROM transactions GROUP BY client_id",
+    "SELECT COUNT(*) FROM transactions WHERE client_id = 'C001' OR client_id = 'C002'",
+])
+def test_match_aggregate_sql_leaves_other_queries_to_mysql(sql_query):
+    assert match_aggregate_sql(sql_query) is None
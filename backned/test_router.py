@@ -0,0 +1,95 @@
+# test_router.py
+
+import pytest
+
+from agents.router import KeywordAutomaton, QuestionRouter
+
+
+@pytest.fixture
+def router():
+    router = QuestionRouter()
+    router.set_vocabulary({"stock_name": ["Reliance", "HDFC Bank"], "rm_name": ["Anita Rao"]})
+    return router
+
+
+def test_automaton_prefers_the_longest_phrase():
+    automaton = KeywordAutomaton({"risk": ("feature", "attr_risk"), "risk appetite": ("feature", "attr_risk_full")})
+    assert automaton.scan(["high", "risk", "appetite"]) == [(1, 3, ("feature", "attr_risk_full"))]
+
+
+@pytest.mark.parametrize("question, intent, store", [
+    ("How many clients have high risk appetite?", "client_count", "mongo"),
+    ("Show clients who prefer bonds", "filter_clients", "mongo"),
+    ("Top 5 stocks by amount invested", "top_stocks", "sql"),
+    ("How many transactions are there?", "transaction_count", "sql"),
+    ("Total amount invested in Reliance", "total_invested", "sql"),
+    ("Monthly investments in HDFC Bank", "monthly_invested", "sql"),
+    ("Top 5 high risk clients by amount invested", "top_clients", "federated"),
+])
+def test_intents(router, question, intent, store):
+    result = router.classify(question)
+    assert (result["intent"], result["store"]) == (intent, store)
+    assert result["fast_path"]
+
+
+def test_slots(router):
+    slots = router.classify("Top 3 clients of Anita Rao investing in HDFC Bank")["slots"]
+    assert slots == {"limit": 3, "rm_name": "Anita Rao", "stock_name": "HDFC Bank"}
+    assert router.classify("clients with rm id 101")["slots"] == {"rm_id": 101}
+    assert router.classify("transactions of c007")["slots"] == {"client_id": "C007"}
+
+
+def test_clients_filtered_by_stock_are_counted_from_transactions(router):
+    # Regression: used to hit the MongoDB client_count path and count every client
+    result = router.classify("How many clients invested in Reliance?")
+    assert (result["intent"], result["store"]) == ("investor_count", "sql")
+    assert result["slots"] == {"stock_name": "Reliance"}
+
+
+def test_count_with_client_and_transaction_filters_is_federated(router):
+    result = router.classify("How many high risk clients invested in Reliance?")
+    assert (result["intent"], result["store"]) == ("client_count", "federated")
+
+
+def test_top_clients_by_client_attribute_only_is_not_fast_pathed(router):
+    # Regression: "top 5" was dropped and every high-risk client was listed
+    result = router.classify("Top 5 clients with high risk")
+    assert result["intent"] is None
+    assert not result["fast_path"]
+
+
+def test_time_filters_and_unknown_words_leave_the_fast_path(router):
+    assert router.classify("Total amount invested in March")["intent"] is None
+    result = router.classify("How many clients churned after the merger?")
+    assert result["confidence"] < 0.8
+    assert not result["fast_path"]
+
+
+def test_risk_words_need_a_risk_context(router):
+    slots = router.classify("Clients with high total investment")["slots"]
+    assert "risk" not in slots
+
+
+@pytest.mark.parametrize("question, store", [
+    ("How many clients per risk appetite?", "mongo"),
+    ("count clients by investment preference", "mongo"),
+    ("total invested per client", "sql"),
+    ("total invested by stock", "sql"),
+    ("How many transactions per stock?", "sql"),
+    ("Total invested by each RM", "sql"),
+])
+def test_grouped_questions_are_not_answered_as_one_number(router, question, store):
+    # Regression: per/by/each were stopwords, so these came back as scalar fast-path intents
+    result = router.classify(question)
+    assert (result["intent"], result["store"]) == (None, store)
+    assert not result["fast_path"]
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("Top 5 stocks by amount invested", "top_stocks"),
+    ("How many transactions by Anita Rao?", "transaction_count"),
+    ("Total invested by C001", "total_invested"),
+    ("Total invested per month", "monthly_invested"),
+])
+def test_by_a_measure_or_a_value_is_not_a_grouping(router, question, intent):
+    assert router.classify(question)["intent"] == intent
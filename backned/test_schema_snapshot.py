@@ -0,0 +1,92 @@
+# test_schema_snapshot.py
+
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+
+from db import schema_snapshot
+from db.schema_snapshot import introspect_mysql, render_mysql_schema
+
+COLUMNS = [
+    ("transactions", "transaction_id", "varchar(20)", "PRI"),
+    ("transactions", "stock_name", "varchar(100)", "MUL"),
+    ("transactions", "rm_name", "varchar(100)", ""),
+    ("transactions", "amount_invested", "decimal(15,2)", ""),
+    ("transactions", "date_", "date", "MUL"),
+    ("audit_log", "entry", "text", ""),
+]
+SAMPLE = [
+    (f"T{index}", "Reliance" if index % 2 else "Infosys", "Anita Rao", 100 + index, date(2024, 1, 1 + index))
+    for index in range(4)
+]
+
+
+class FakeResult(list):
+    def fetchall(self):
+        return list(self)
+
+    def fetchone(self):
+        return self[0]
+
+
+class FakeConnection:
+    """Answers the introspection queries and records every statement"""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        sql_query = str(statement)
+        self.statements.append(sql_query)
+        if "information_schema.columns" in sql_query:
+            return FakeResult(COLUMNS)
+        if "information_schema.tables" in sql_query:
+            return FakeResult([("transactions", 250000), ("audit_log", 9000000)])
+        if "information_schema.statistics" in sql_query:
+            return FakeResult([("transactions", "transaction_id", 250000), ("transactions", "stock_name", 2),
+                               ("transactions", "date_", 400)])
+        if sql_query.startswith("SELECT DISTINCT `stock_name`"):
+            return FakeResult([("HDFC Bank",), ("Infosys",), ("Reliance",)])
+        if sql_query.startswith("SELECT MIN(`date_`)"):
+            return FakeResult([(date(2023, 1, 1), date(2024, 6, 30))])
+        if sql_query.startswith("SELECT `transaction_id`"):
+            return FakeResult(SAMPLE[:params["limit"]])
+        raise AssertionError(f"unexpected query: {sql_query}")
+
+
+@pytest.fixture
+def connection():
+    return FakeConnection()
+
+
+def _engine(conn):
+    @contextmanager
+    def connect():
+        yield conn
+    return type("Engine", (), {"connect": staticmethod(connect)})
+
+
+def test_small_tables_are_profiled_from_the_sample(connection):
+    tables = introspect_mysql(_engine(connection), include_tables=["transactions"])["tables"]
+    columns = {column["name"]: column for column in tables["transactions"]["columns"]}
+    assert tables["transactions"]["rows"] == 4
+    assert columns["stock_name"]["values"] == ["Infosys", "Reliance"]
+    assert columns["amount_invested"]["range"] == ["100", "103"]
+    assert "audit_log" not in tables
+    assert not any("COUNT" in statement for statement in connection.statements)
+
+
+def test_large_tables_use_estimates_and_index_lookups(connection, monkeypatch):
+    monkeypatch.setattr(schema_snapshot, "SCHEMA_SAMPLE_ROWS", 4)
+    snapshot = introspect_mysql(_engine(connection), include_tables=["transactions"])
+    columns = {column["name"]: column for column in snapshot["tables"]["transactions"]["columns"]}
+    assert snapshot["tables"]["transactions"]["rows"] == 250000
+    # Indexed columns: loose index scan for values, MIN/MAX for ranges
+    assert columns["stock_name"]["values"] == ["HDFC Bank", "Infosys", "Reliance"]
+    assert columns["date_"]["range"] == ["2023-01-01", "2024-06-30"]
+    # Unindexed columns are judged from the sample alone
+    assert columns["amount_invested"]["range"] == ["100", "103"]
+    assert not any("COUNT(" in statement or "MIN(`amount_invested`)" in statement
+                   for statement in connection.statements)
+    assert render_mysql_schema(snapshot).startswith("transactions (~250000 rows): transaction_id varchar(20) PK, ")
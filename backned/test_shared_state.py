@@ -0,0 +1,74 @@
+# test_shared_state.py
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.answer_cache import AnswerCache
+from core.llm_gateway import SharedTokenBucket
+from core.shared_state import SharedState
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedState(tmp_path / "shared.sqlite3")
+
+
+def test_answers_are_keyed_by_data_version(shared):
+    shared.put_answer("how many clients", "v1", {"answer": "3"})
+    assert shared.get_answer("how many clients", "v1", ttl=60) == {"answer": "3"}
+    assert shared.get_answer("how many clients", "v2", ttl=60) is None
+    assert shared.get_answer("how many clients", "v1", ttl=-1) is None
+
+
+def test_trim_keeps_the_newest_answers(shared):
+    for index in range(5):
+        shared.put_answer(f"q{index}", "v1", index)
+    shared.trim_answers(max_entries=2, ttl=60)
+    assert [shared.get_answer(f"q{index}", "v1", 60) for index in range(5)] == [None, None, None, 3, 4]
+
+
+def test_bucket_takes_are_atomic_across_threads(shared):
+    # Threads stand in for workers: each gets its own connection
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        waits = list(pool.map(lambda _: shared.take_bucket("requests", 5, 5 / 60, 1), range(20)))
+    assert waits.count(0.0) == 5
+    assert all(wait > 0 for wait in waits if wait)
+
+
+def test_bucket_refund_and_drain(shared):
+    assert shared.take_bucket("tokens", 60, 1, 60) == 0.0
+    assert shared.take_bucket("tokens", 60, 1, 30) == pytest.approx(30, abs=0.1)
+    shared.refund_bucket("tokens", 60, 30)
+    assert shared.take_bucket("tokens", 60, 1, 30) == 0.0
+    shared.refund_bucket("tokens", 60, 60)
+    shared.drain_bucket("tokens")
+    assert shared.take_bucket("tokens", 60, 1, 1) == pytest.approx(1, abs=0.1)
+
+
+def test_workers_see_each_others_answers(shared):
+    async def main():
+        worker_a, worker_b = AnswerCache(shared=shared), AnswerCache(shared=shared)
+        await worker_a.put("How many clients?", {"answer": "3"})
+        value, _ = await worker_b.get("how many clients")
+        await worker_b.clear()
+        return value, worker_b.stats()
+
+    value, stats = asyncio.run(main())
+    assert value == {"answer": "3"}
+    assert stats["shared_hits"] == 1
+    assert shared.get_answer("how many clients", "None", 60) is None
+
+
+def test_shared_bucket_falls_back_to_the_local_one(tmp_path):
+    (tmp_path / "blocked").write_text("")
+    # The store cannot be opened under a regular file, so every call fails
+    bucket = SharedTokenBucket("requests", 60, SharedState(tmp_path / "blocked" / "shared.sqlite3"))
+
+    async def main():
+        return await bucket.atry_take(60), await bucket.atry_take(1)
+
+    taken, wait = asyncio.run(main())
+    assert taken == 0.0
+    assert wait == pytest.approx(1.0, abs=0.05)
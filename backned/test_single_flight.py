@@ -0,0 +1,121 @@
+# test_single_flight.py
+
+import asyncio
+
+import pytest
+
+from core.shared_state import SharedState
+from core.single_flight import SingleFlight
+
+
+def _slow(calls, result="answer", delay=0.05):
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return result
+    return compute
+
+
+def test_concurrent_callers_share_one_computation():
+    async def main():
+        flight, calls = SingleFlight(), []
+        results = await asyncio.gather(*(flight.do("q", _slow(calls)) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(main())
+    assert results == ["answer"] * 5
+    assert len(calls) == 1
+    stats = flight.stats()
+    assert (stats["leaders"], stats["collapsed"], stats["inflight"]) == (1, 4, 0)
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_work():
+    async def main():
+        flight, calls = SingleFlight(), []
+        first = asyncio.ensure_future(flight.do("q", _slow(calls)))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do("q", _slow(calls)))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, calls
+
+    result, calls = asyncio.run(main())
+    assert result == "answer"
+    assert len(calls) == 1
+
+
+def test_failure_reaches_every_waiter_and_is_not_kept():
+    async def main():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(flight.do("q", fail), flight.do("q", fail), return_exceptions=True)
+        assert flight.join("q") is None
+        return results
+
+    assert [str(result) for result in asyncio.run(main())] == ["boom", "boom"]
+
+
+def test_join_without_a_computation():
+    assert SingleFlight().join("q") is None
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedState(tmp_path / "shared.sqlite3")
+
+
+def test_workers_share_a_computation_through_the_store(shared):
+    async def main():
+        # Two instances stand in for two worker processes
+        worker_a, worker_b, calls = SingleFlight(shared), SingleFlight(shared), []
+        leader = asyncio.ensure_future(worker_a.do("q", _slow(calls, delay=0.2)))
+        await asyncio.sleep(0.05)
+        follower = await worker_b.do("q", _slow(calls, result="recomputed"))
+        return await leader, follower, calls, worker_b.stats()
+
+    leader, follower, calls, stats = asyncio.run(main())
+    assert (leader, follower) == ("answer", "answer")
+    assert len(calls) == 1
+    assert stats["remote_collapsed"] == 1
+
+
+def test_followers_compute_when_the_leader_fails(shared):
+    async def main():
+        worker_a, worker_b, calls = SingleFlight(shared), SingleFlight(shared), []
+
+        async def fail():
+            await asyncio.sleep(0.1)
+            raise ValueError("boom")
+
+        leader = asyncio.ensure_future(worker_a.do("q", fail))
+        await asyncio.sleep(0.03)
+        follower = await worker_b.do("q", _slow(calls, result="recomputed"))
+        with pytest.raises(ValueError):
+            await leader
+        return follower, calls
+
+    follower, calls = asyncio.run(main())
+    assert follower == "recomputed"
+    assert len(calls) == 1
+
+
+def test_failed_answers_are_not_published_to_other_workers(shared):
+    # Regression: an ok=False payload was handed out for SHARED_FLIGHT_RETENTION seconds
+    def publish(payload):
+        return payload["ok"]
+
+    async def main():
+        worker_a, worker_b = SingleFlight(shared, publish), SingleFlight(shared, publish)
+        failed = await worker_a.do("q", _slow([], {"answer": "MySQL is down", "ok": False}, delay=0))
+        retried = await worker_a.do("q", _slow([], {"answer": "3 clients", "ok": True}, delay=0))
+        reused = await worker_b.do("q", _slow([], {"answer": "recomputed", "ok": True}, delay=0))
+        return failed, retried, reused
+
+    failed, retried, reused = asyncio.run(main())
+    assert not failed["ok"]
+    assert retried == {"answer": "3 clients", "ok": True}
+    assert reused == retried
@@ -0,0 +1,61 @@
+# test_sql_guard.py
+
+import pytest
+from sqlalchemy import create_engine
+
+from agents.sql_guard import (
+    SQL_MAX_ROWS, QueryRejected, apply_limits, check_plan, guard_query, parse_read_only,
+)
+
+
+def _guard(sql_query: str) -> str:
+    return apply_limits(parse_read_only(sql_query)).sql(dialect="mysql")
+
+
+@pytest.mark.parametrize("sql_query, reason", [
+    ("DELETE FROM transactions", "DELETE statements are not allowed"),
+    ("DROP TABLE transactions", "DROP statements are not allowed"),
+    ("SELECT 1; DELETE FROM transactions", "expected one statement, got 2"),
+    ("SELECT SLEEP(5)", "SLEEP() is not allowed"),
+    ("SELECT * FROM transactions FOR UPDATE", "locking reads are not allowed"),
+    ("SELEC * FROM transactions", "unparseable SQL"),
+])
+def test_rejects_anything_but_one_read(sql_query, reason):
+    with pytest.raises(QueryRejected) as rejected:
+        parse_read_only(sql_query)
+    assert rejected.value.reason.startswith(reason)
+
+
+def test_injects_limit_and_execution_hint():
+    assert _guard("SELECT * FROM transactions") == \
+        f"SELECT /*+ MAX_EXECUTION_TIME(10000) */ * FROM transactions LIMIT {SQL_MAX_ROWS}"
+
+
+def test_lowers_an_oversized_limit_and_keeps_a_small_one():
+    assert _guard("SELECT * FROM transactions LIMIT 999999").endswith(f"LIMIT {SQL_MAX_ROWS}")
+    assert _guard("SELECT * FROM transactions LIMIT 10").endswith("LIMIT 10")
+
+
+def test_hint_goes_on_the_first_select_of_a_union():
+    guarded = _guard("SELECT client_id FROM transactions UNION SELECT client_id FROM transactions")
+    assert guarded.startswith("SELECT /*+ MAX_EXECUTION_TIME(10000) */ client_id")
+    assert guarded.count("MAX_EXECUTION_TIME") == 1
+
+
+def test_existing_hint_is_kept():
+    guarded = _guard("SELECT /*+ MAX_EXECUTION_TIME(500) */ * FROM transactions")
+    assert "MAX_EXECUTION_TIME(500)" in guarded
+    assert "MAX_EXECUTION_TIME(10000)" not in guarded
+
+
+def test_plan_budgets():
+    assert check_plan([{"id": 1, "table": "transactions", "type": "ref", "rows": 40}]) is None
+    assert check_plan([{"id": 1, "table": "transactions", "type": "ALL", "rows": 500000}]).startswith("full scan")
+    # Joined tables in one block multiply
+    joined = [{"id": 1, "table": "a", "type": "ref", "rows": 2000}, {"id": 1, "table": "b", "type": "ref", "rows": 2000}]
+    assert check_plan(joined).startswith("estimated 4,000,000 rows")
+
+
+def test_guard_query_skips_explain_outside_mysql():
+    engine = create_engine("sqlite://")
+    assert guard_query(engine, "SELECT 1;").endswith(f"LIMIT {SQL_MAX_ROWS}")
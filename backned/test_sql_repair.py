@@ -0,0 +1,49 @@
+# test_sql_repair.py
+
+import pytest
+
+from agents.sql_repair import SQLRepairer, closest_name, edit_distance
+
+SCHEMA = {"transactions": ["transaction_id", "client_id", "stock_name", "amount_invested", "date_", "rm_name"]}
+
+
+@pytest.fixture
+def repairer():
+    return SQLRepairer(SCHEMA)
+
+
+def test_edit_distance():
+    assert edit_distance("stok_name", "stock_name") == 1
+    assert edit_distance("", "abc") == 3
+
+
+def test_closest_name_uses_synonyms_then_typos():
+    columns = SCHEMA["transactions"]
+    assert closest_name("Amount", columns) == "amount_invested"
+    assert closest_name("trade_date", columns) == "date_"
+    assert closest_name("clent_id", columns) == "client_id"
+    assert closest_name("portfolio", columns) is None
+
+
+def test_repairs_table_and_column_names(repairer):
+    assert repairer.repair("SELECT SUM(amount) FROM transaction WHERE stok_name = 'Reliance'") == \
+        "SELECT SUM(amount_invested) FROM transactions WHERE stock_name = 'Reliance'"
+
+
+def test_output_aliases_are_not_renamed(repairer):
+    assert repairer.repair("SELECT client_id, SUM(amount_invested) AS total FROM transactions ORDER BY total") is None
+
+
+def test_syntax_errors_are_reread_in_other_dialects(repairer):
+    assert repairer.repair("SELECT TOP 5 client_id FROM transactions", "1064 (42000): You have an error in your SQL syntax") == \
+        "SELECT client_id FROM transactions LIMIT 5"
+    assert repairer.repair("SELECT strftime('%Y', date_) FROM transactions", "1305 FUNCTION strftime does not exist") == \
+        "SELECT DATE_FORMAT(date_, '%Y') FROM transactions"
+
+
+def test_foreign_dialects_need_a_syntax_error(repairer):
+    assert repairer.repair("SELECT TOP 5 client_id FROM transactions", "1054 Unknown column") is None
+
+
+def test_nothing_to_fix(repairer):
+    assert repairer.repair("select client_id from transactions;") is None
@@ -90,6 +90,11 @@ const ChatInterface = () => {
         setShowVisualization(true);
       }
       
+      // Answers that came back with result rows can always be charted
+      if (response.data.visualization_data?.result) {
+        setShowVisualization(true);
+      }
+      
       setQueryType(newQueryType);
       setVisualizationData(response.data);
       toast.success("Response received!");
@@ -63,6 +63,28 @@ const DataVisualization = ({ data, queryType, isLoading }) => {
     return value.toLocaleString();
   };
 
+  // Columnar result (columns, dtypes, one array per column) -> chart rows
+  const chartFromResult = (result, title) => {
+    if (!result || !result.row_count) return null;
+    const isNumeric = (i) => ['int64', 'float64'].includes(result.dtypes[i]);
+    const valueIndex = result.columns.findIndex((_, i) => isNumeric(i));
+    const labelIndex = result.columns.findIndex((_, i) => !isNumeric(i));
+    if (valueIndex === -1 || labelIndex === -1) return null;
+
+    const chartData = Array.from({ length: result.row_count }, (_, row) =>
+      Object.fromEntries(result.columns.map((column, i) => [column, result.data[i][row]]))
+    );
+    return {
+      chartData,
+      chartConfig: {
+        dataKey: result.columns[valueIndex],
+        nameKey: result.columns[labelIndex],
+        title: title || 'Query Result',
+        format: formatLargeNumber
+      }
+    };
+  };
+
   const renderChart = () => {
     let chartData = [];
     let chartConfig = {};
@@ -114,6 +136,14 @@ const DataVisualization = ({ data, queryType, isLoading }) => {
         };
     }
 
+    // Prefer the rows the backend actually returned for this question
+    const result = data?.visualization_data?.result;
+    const resultChart = chartFromResult(result, data?.visualization_data?.query);
+    if (resultChart) {
+      chartData = resultChart.chartData;
+      chartConfig = resultChart.chartConfig;
+    }
+
     switch (chartType) {
       case 'bar':
         return (